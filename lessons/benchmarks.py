@@ -0,0 +1,250 @@
+import contextlib
+import datetime
+import io
+import statistics
+import subprocess
+import time
+import tracemalloc
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from .data_reset import reset_data
+from .lesson_calendar import get_calendar_token
+from .models import User, Child, Request, Booking, Invoice, SchoolTerm, INVOICE_NUMBER_REGEX
+
+BENCHMARK_STUDENT_COUNTS = [1000, 10000, 100000]
+BENCHMARK_SEED = 1
+BENCHMARK_REPEAT = 5
+# Slowdown of the median time of a view, compared to a baseline, that counts as a regression
+BENCHMARK_TIME_TOLERANCE = 0.2
+
+# Users created by the seed command
+STUDENT_EMAIL = 'john.doe@example.org'
+ADMIN_EMAIL = 'petra.pickles@example.org'
+DIRECTOR_EMAIL = 'marty.major@example.org'
+
+
+class BenchmarkedView:
+    '''
+    A page visited by the benchmarks, with the seeded user who visits it and the queries of its url
+    '''
+    def __init__(self, url_name, email=None, get_query=None, get_kwargs=None):
+        self.url_name = url_name
+        self.email = email
+        self.get_query = get_query or (lambda data: {})
+        self.get_kwargs = get_kwargs or (lambda data: {})
+
+
+BENCHMARKED_VIEWS = [
+    BenchmarkedView('home'),
+    BenchmarkedView('log_in'),
+    BenchmarkedView('sign_up'),
+    BenchmarkedView('student_page', STUDENT_EMAIL),
+    BenchmarkedView('request_list', STUDENT_EMAIL),
+    BenchmarkedView('booking_list', STUDENT_EMAIL),
+    BenchmarkedView('request_view', STUDENT_EMAIL, lambda data: {'request_id': data['request_id']}),
+    BenchmarkedView('booking_view', STUDENT_EMAIL, lambda data: {'booking_id': data['booking_id']}),
+    BenchmarkedView('invoice_view', STUDENT_EMAIL, lambda data: {'invoice_id': data['invoice_id']}),
+    BenchmarkedView('new_request_view', STUDENT_EMAIL),
+    BenchmarkedView('children_list', STUDENT_EMAIL),
+    BenchmarkedView('child_page', STUDENT_EMAIL, lambda data: {'relation_id': data['relation_id']}),
+    BenchmarkedView('child_view', STUDENT_EMAIL, lambda data: {'relation_id': data['relation_id']}),
+    BenchmarkedView('child_request_list', STUDENT_EMAIL, lambda data: {'relation_id': data['relation_id']}),
+    BenchmarkedView('child_booking_list', STUDENT_EMAIL, lambda data: {'relation_id': data['relation_id']}),
+    BenchmarkedView('new_child_view', STUDENT_EMAIL),
+    BenchmarkedView('lesson_list_student', STUDENT_EMAIL),
+    BenchmarkedView('lesson_list_child', STUDENT_EMAIL, lambda data: {'relation_id': data['relation_id']}),
+    BenchmarkedView('lesson_calendar_feed', get_kwargs=lambda data: {'token': data['calendar_token']}),
+    BenchmarkedView('transaction_list_student', STUDENT_EMAIL),
+    BenchmarkedView('invoice_list_student', STUDENT_EMAIL),
+    BenchmarkedView('student_term_view', STUDENT_EMAIL),
+    BenchmarkedView('profile', STUDENT_EMAIL, lambda data: {'user_id': data['student_id']}),
+    BenchmarkedView('change_password', STUDENT_EMAIL),
+    BenchmarkedView('admin_page', ADMIN_EMAIL),
+    BenchmarkedView('lesson_list_admin', ADMIN_EMAIL),
+    BenchmarkedView('transaction_admin_view', ADMIN_EMAIL),
+    BenchmarkedView('transaction_import_view', ADMIN_EMAIL),
+    BenchmarkedView('transaction_list_admin', ADMIN_EMAIL),
+    BenchmarkedView('balance_list_admin', ADMIN_EMAIL),
+    BenchmarkedView('invoice_list_admin', ADMIN_EMAIL),
+    BenchmarkedView('admin_request_list', ADMIN_EMAIL),
+    BenchmarkedView('admin_booking_list', ADMIN_EMAIL),
+    BenchmarkedView('export_csv', ADMIN_EMAIL, get_kwargs=lambda data: {'export_name': 'bookings'}),
+    BenchmarkedView('fulfil_request', ADMIN_EMAIL, lambda data: {'request_id': data['unfulfilled_request_id']}),
+    BenchmarkedView('propose_timetable_view', ADMIN_EMAIL),
+    BenchmarkedView('admin_term_view', ADMIN_EMAIL),
+    BenchmarkedView('term_view', ADMIN_EMAIL, lambda data: {'term_id': data['term_id']}),
+    BenchmarkedView('new_term_view', ADMIN_EMAIL),
+    BenchmarkedView('term_deletion_confirmation_view', ADMIN_EMAIL, lambda data: {'term_name': data['term_name']}),
+    BenchmarkedView('admin_user_list', DIRECTOR_EMAIL),
+    BenchmarkedView('create_admin_user', DIRECTOR_EMAIL),
+    BenchmarkedView('create_director_user', DIRECTOR_EMAIL),
+]
+
+
+def get_benchmark_data():
+    '''
+    Returns the ids of the seeded records the benchmarked views are visited with
+    '''
+    student = User.objects.get(email=STUDENT_EMAIL)
+    child = Child.objects.filter(parent=student).order_by('id').first()
+    term = SchoolTerm.objects.order_by('start_date').first()
+    return {
+        'student_id': student.id,
+        'relation_id': child.id,
+        'request_id': Request.objects.filter(user=student).order_by('id').first().id,
+        'booking_id': Booking.objects.filter(user=student).order_by('id').first().id,
+        'invoice_id': Invoice.objects.filter(student__user=student).order_by('invoice_number').first().invoice_number,
+        'unfulfilled_request_id': Request.objects.filter(fulfilled=False).order_by('id').first().id,
+        'calendar_token': get_calendar_token(student.id),
+        'term_id': term.id,
+        'term_name': term.term_name,
+    }
+
+
+def get_response(client, url, query):
+    response = client.get(url, query)
+    if response.streaming:
+        # Streamed responses only run their queries as their content is read
+        b''.join(response.streaming_content)
+    return response
+
+
+def get_view_client(view):
+    '''
+    Returns a test client logged in as the seeded user who visits the view
+    '''
+    client = Client()
+    if view.email:
+        client.force_login(User.objects.get(email=view.email))
+    return client
+
+
+def benchmark_view(view, data, repeat=BENCHMARK_REPEAT):
+    '''
+    Visits a view repeatedly, and returns its median wall time, its number of queries and its peak memory
+    '''
+    client = get_view_client(view)
+    url = reverse(view.url_name, kwargs=view.get_kwargs(data))
+    query = view.get_query(data)
+
+    # The first visit fills the caches and indexes that later visits read from
+    response = get_response(client, url, query)
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        get_response(client, url, query)
+        timings.append(time.perf_counter() - start)
+
+    # Queries and memory are measured on visits of their own, so that their overhead is not timed
+    with CaptureQueriesContext(connection) as queries:
+        get_response(client, url, query)
+    # The log of the queries is emptied by the next visit, so they are counted straight away
+    query_count = len(queries)
+    tracemalloc.start()
+    try:
+        get_response(client, url, query)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'view': view.url_name,
+        'url': url,
+        'user': view.email,
+        'status_code': response.status_code,
+        'median_seconds': statistics.median(timings),
+        'min_seconds': min(timings),
+        'queries': query_count,
+        'peak_memory_bytes': peak_memory,
+    }
+
+
+def seed_benchmark_dataset(number_of_students, seed=BENCHMARK_SEED):
+    '''
+    Replaces the data of the database with a seeded dataset of the number of students, and returns how long it took
+    '''
+    start = time.perf_counter()
+    reset_data()
+    with contextlib.redirect_stdout(io.StringIO()):
+        call_command('seed', '--fast', '--students', str(number_of_students), '--seed', str(seed))
+    # The seeded terms are in the past, and the pages that fulfil requests need a term to book lessons in
+    today = timezone.now().date()
+    SchoolTerm.objects.create(term_name='Benchmark term', start_date=today + datetime.timedelta(days=30),
+                              end_date=today + datetime.timedelta(days=100))
+    return time.perf_counter() - start
+
+
+def check_seeded_invoice_numbers():
+    '''
+    Raises a ValueError if any seeded invoice number is invalid, as the timings of a broken dataset are meaningless
+    '''
+    invalid_numbers = list(Invoice.objects.exclude(invoice_number__regex=INVOICE_NUMBER_REGEX)
+                           .values_list('invoice_number', flat=True)[:5])
+    if invalid_numbers:
+        raise ValueError(f'The seeded dataset has invalid invoice numbers: {", ".join(invalid_numbers)}')
+
+
+def get_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(student_counts=BENCHMARK_STUDENT_COUNTS, views=BENCHMARKED_VIEWS, repeat=BENCHMARK_REPEAT,
+                   seed=BENCHMARK_SEED, log=print):
+    '''
+    Seeds a dataset of each number of students in turn and benchmarks the views on it.
+    Returns the results as a dictionary that can be saved as JSON.
+    '''
+    datasets = []
+    for number_of_students in student_counts:
+        log(f'Seeding {number_of_students} students...')
+        seed_seconds = seed_benchmark_dataset(number_of_students, seed)
+        check_seeded_invoice_numbers()
+        data = get_benchmark_data()
+        results = []
+        for view in views:
+            result = benchmark_view(view, data, repeat)
+            log(f'{number_of_students} students, {result["view"]}: {result["median_seconds"] * 1000:.1f} ms, '
+                f'{result["queries"]} queries, {result["peak_memory_bytes"] / 1024:.0f} KiB')
+            results.append(result)
+        datasets.append({'students': number_of_students, 'seed_seconds': seed_seconds, 'views': results})
+
+    return {
+        'commit': get_commit(),
+        'created_at': timezone.now().isoformat(),
+        'seed': seed,
+        'repeat': repeat,
+        'datasets': datasets,
+    }
+
+
+def find_regressions(baseline, results, time_tolerance=BENCHMARK_TIME_TOLERANCE):
+    '''
+    Returns a description of each view that runs more queries, or is slower by more than the tolerance,
+    than in the baseline results for the same number of students
+    '''
+    baseline_views = {
+        (dataset['students'], view['view']): view for dataset in baseline['datasets'] for view in dataset['views']
+    }
+    regressions = []
+    for dataset in results['datasets']:
+        for view in dataset['views']:
+            baseline_view = baseline_views.get((dataset['students'], view['view']))
+            if baseline_view is None:
+                continue
+            if view['queries'] > baseline_view['queries']:
+                regressions.append(f'{view["view"]} with {dataset["students"]} students runs {view["queries"]} '
+                                   f'queries instead of {baseline_view["queries"]}')
+            if view['median_seconds'] > baseline_view['median_seconds'] * (1 + time_tolerance):
+                regressions.append(f'{view["view"]} with {dataset["students"]} students takes '
+                                   f'{view["median_seconds"] * 1000:.1f} ms instead of '
+                                   f'{baseline_view["median_seconds"] * 1000:.1f} ms')
+    return regressions
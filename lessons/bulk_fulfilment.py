@@ -0,0 +1,148 @@
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from .forms import FulfilAssignmentForm
+from .forms_functions import generate_invoice_numbers
+from .models import Request, Booking, Invoice, Student, StudentLedger, get_child_id
+from .reference_data import get_days_of_the_week
+from .student_dashboard import invalidate_student_dashboards
+from .term_index import get_term_index
+from .teacher_schedule import TeacherScheduleIndex, get_teacher_schedule_index, update_teacher_schedule
+
+CENT = Decimal('0.01')
+
+
+def validate_fulfil_assignments(assignments):
+    '''
+    Validates a batch of fulfilment assignments together.
+    Returns the cleaned assignments and a dictionary of errors keyed by the position of the assignment in the batch.
+    '''
+    errors = {}
+    cleaned_assignments = []
+    for position, assignment in enumerate(assignments):
+        form = FulfilAssignmentForm(data=assignment)
+        if form.is_valid():
+            cleaned_assignments.append((position, form.cleaned_data))
+        else:
+            errors[position] = [f'{field}: {message}' for field, messages in form.errors.items() for message in messages]
+
+    request_ids = [assignment['request_id'] for _, assignment in cleaned_assignments]
+    requests = Request.objects.prefetch_related('availability').in_bulk(request_ids)
+    students = {student.user_id: student for student in Student.objects.filter(
+        user_id__in={request.user_id for request in requests.values()}
+    )}
+    term_index = get_term_index()
+    schedule_index = get_teacher_schedule_index()
+    # Slots of the assignments accepted so far, keyed by negative positions so they never clash with booking ids
+    batch_schedule_index = TeacherScheduleIndex()
+
+    valid_assignments = []
+    seen_request_ids = set()
+    for position, assignment in cleaned_assignments:
+        request_id = assignment['request_id']
+        request = requests.get(request_id)
+        assignment_errors = []
+
+        if request is None:
+            assignment_errors.append(f'Request {request_id} does not exist.')
+        else:
+            if request.fulfilled:
+                assignment_errors.append(f'Request {request_id} is already fulfilled.')
+            if request_id in seen_request_ids:
+                assignment_errors.append(f'Request {request_id} is assigned more than once.')
+            if request.user_id not in students:
+                assignment_errors.append(f'The user of request {request_id} is not a student.')
+            available_days = [day.day for day in request.availability.all()]
+            if assignment['day_of_the_week'] not in available_days:
+                assignment_errors.append(f'The student is not available on {assignment["day_of_the_week"]}.')
+
+            slot = (assignment['teacher'], assignment['day_of_the_week'], assignment['time_of_lesson'],
+                    request.duration_of_lessons, assignment['start_date'], request.interval_between_lessons,
+                    request.number_of_lessons)
+            if schedule_index.has_conflict(*slot):
+                assignment_errors.append(f'{assignment["teacher"]} already has a lesson at this time.')
+            elif batch_schedule_index.has_conflict(*slot):
+                assignment_errors.append(f'{assignment["teacher"]} has another assignment at this time.')
+
+        term = term_index.find_term(assignment['start_date']) or term_index.find_next_term(assignment['start_date'])
+        if term is None:
+            assignment_errors.append('There is no term on or after the start date.')
+
+        seen_request_ids.add(request_id)
+        if assignment_errors:
+            errors[position] = assignment_errors
+        else:
+            batch_schedule_index.add(-(position + 1), *slot)
+            valid_assignments.append((assignment, request, students[request.user_id], term))
+
+    return valid_assignments, errors
+
+def fulfil_requests(assignments):
+    '''
+    Fulfils a batch of requests in a single transaction, creating their invoices and bookings in bulk.
+    Each assignment is a dictionary with the request_id, day_of_the_week, time_of_lesson, teacher,
+    start_date, end_date and hourly_cost of a booking.
+    Raises a ValidationError, without fulfilling any request, if any assignment is invalid or any of the requests
+    was fulfilled by someone else while the batch was being validated.
+    '''
+    valid_assignments, errors = validate_fulfil_assignments(assignments)
+    if errors:
+        raise ValidationError({
+            f'Assignment {position + 1}': messages for position, messages in sorted(errors.items())
+        })
+
+    days = {day.day: day for day in get_days_of_the_week()}
+
+    with transaction.atomic():
+        # The requests are claimed before anything is created, and only if they are still unfulfilled, so that two
+        # fulfilments of the same request cannot both commit. The update holds the rows until the transaction ends.
+        request_ids = [request.id for _, request, _, _ in valid_assignments]
+        if Request.objects.filter(id__in=request_ids, fulfilled=False).update(fulfilled=True) < len(request_ids):
+            raise ValidationError('Some of the requests were fulfilled while the batch was being validated.')
+
+        invoice_counts = {}
+        for _, _, student, _ in valid_assignments:
+            invoice_counts[student] = invoice_counts.get(student, 0) + 1
+        invoice_numbers = generate_invoice_numbers(invoice_counts)
+
+        invoices = []
+        bookings = []
+        for assignment, request, student, term in valid_assignments:
+            full_amount = (assignment['hourly_cost'] * request.number_of_lessons
+                           * request.duration_of_lessons / 60).quantize(CENT)
+            invoice = Invoice(
+                invoice_number=invoice_numbers[student.pk].pop(0),
+                student=student,
+                full_amount=full_amount,
+                paid_amount=0,
+                fully_paid=full_amount == 0
+            )
+            invoices.append(invoice)
+            bookings.append(Booking(
+                invoice=invoice,
+                term_id=term,
+                day_of_the_week=days[assignment['day_of_the_week']],
+                time_of_the_day=assignment['time_of_lesson'],
+                user_id=request.user_id,
+                relation_id=request.relation_id,
+                child_id=get_child_id(request.relation_id),
+                teacher=assignment['teacher'],
+                start_date=assignment['start_date'],
+                end_date=assignment['end_date'],
+                duration_of_lessons=request.duration_of_lessons,
+                interval_between_lessons=request.interval_between_lessons,
+                number_of_lessons=request.number_of_lessons,
+                further_information=request.further_information
+            ))
+
+        Invoice.objects.bulk_create(invoices)
+        bookings = Booking.objects.bulk_create(bookings)
+        invoiced = {}
+        for invoice in invoices:
+            invoiced[invoice.student.pk] = invoiced.get(invoice.student.pk, 0) + invoice.full_amount
+        StudentLedger.add_to_totals({student_id: (amount, 0) for student_id, amount in invoiced.items()})
+        invalidate_student_dashboards(student.user_id for student in invoice_counts)
+        # Bulk created bookings are not signalled, and the index reloads itself if their ids are not returned
+        update_teacher_schedule(booking.id for booking in bookings if booking.id is not None)
+
+    return bookings
@@ -0,0 +1,62 @@
+from django.contrib.admin.models import LogEntry
+from django.contrib.sessions.models import Session
+from django.core.management.color import no_style
+from django.db import connection
+from .models import User, Student, StudentLedger, SchoolTerm, DayOfTheWeek, Child, Invoice, Request, Booking, \
+    BankTransaction
+from .fragment_cache import invalidate_term_fragments
+from .student_dashboard import invalidate_student_dashboards, get_student_dashboard_cache_timeout
+from .reference_data import invalidate_school_terms, invalidate_days_of_the_week
+from .term_index import invalidate_term_index
+from .teacher_schedule import invalidate_teacher_schedule_index
+
+# Models emptied by a reset, each listed before the models it refers to. Sessions are emptied too, as the ids of the
+# users logged in by them are given to new users once the sequences are reset.
+RESET_MODELS = [
+    LogEntry,
+    Session,
+    BankTransaction,
+    Booking,
+    Request.availability.through,
+    Request,
+    StudentLedger,
+    Invoice,
+    Child,
+    Student,
+    User.groups.through,
+    User.user_permissions.through,
+    User,
+    SchoolTerm,
+    DayOfTheWeek,
+]
+
+
+def get_reset_tables():
+    return [model._meta.db_table for model in RESET_MODELS]
+
+
+def reset_data():
+    '''
+    Empties the tables of the school's data and resets their id sequences, keeping the groups and permissions.
+    Each table is emptied by a single statement of the database (TRUNCATE, or DELETE without a WHERE clause)
+    in one transaction, instead of loading the rows and their cascades into memory.
+    '''
+    tables = get_reset_tables()
+    # The ids of the users are read before they are deleted, to drop their cached dashboards
+    user_ids = []
+    if get_student_dashboard_cache_timeout():
+        user_ids = list(User.objects.values_list('id', flat=True))
+    # The backend disables or defers its foreign key checks as needed to empty the tables together
+    connection.ops.execute_sql_flush(connection.ops.sql_flush(no_style(), tables, reset_sequences=True))
+
+    # Signals are not sent for the deleted rows, so everything derived from them is dropped too. Only the keys of
+    # the school's data are deleted from the caches, which may be shared with other applications. The teacher
+    # schedule and the term fragments are dropped for every process. Other processes keep the rest of what they
+    # cached in memory until it expires, unless the default cache is shared between them.
+    invalidate_school_terms()
+    invalidate_days_of_the_week()
+    invalidate_term_index()
+    invalidate_teacher_schedule_index()
+    invalidate_term_fragments()
+    invalidate_student_dashboards(user_ids)
+    return tables
@@ -0,0 +1,86 @@
+import csv
+from .models import BankTransaction, Invoice, Booking
+
+# Rows fetched from the database at a time, so that exports use constant memory however many rows they have
+EXPORT_CHUNK_SIZE = 2000
+# First characters that make spreadsheets read a cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class Echo:
+    '''
+    File-like object that returns what is written to it instead of storing it, so that a csv writer
+    produces each row as a string that can be streamed straight away
+    '''
+    def write(self, value):
+        return value
+
+
+class Export:
+    '''
+    A table that can be exported as CSV, with the columns to export and the date field that filters it
+    '''
+    def __init__(self, model, header, fields, date_field, order_by):
+        self.model = model
+        self.header = header
+        self.fields = fields
+        self.date_field = date_field
+        self.order_by = order_by
+
+    def get_rows(self, date_from=None, date_to=None):
+        '''
+        Lazily yields the rows of the export between the dates, fetching them from the database in chunks
+        '''
+        rows = self.model.objects.order_by(self.order_by)
+        if date_from:
+            rows = rows.filter(**{f'{self.date_field}__gte': date_from})
+        if date_to:
+            rows = rows.filter(**{f'{self.date_field}__lte': date_to})
+        return rows.values_list(*self.fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+# Rows are ordered by primary key, which the database reads in order without sorting the whole table
+EXPORTS = {
+    'transactions': Export(
+        BankTransaction,
+        ['id', 'date', 'student_email', 'invoice_number', 'amount'],
+        ['id', 'date', 'student__user__email', 'invoice_id', 'amount'],
+        date_field='date',
+        order_by='id',
+    ),
+    # Invoices are dated by the start date of the booking they were issued for
+    'invoices': Export(
+        Invoice,
+        ['invoice_number', 'student_email', 'booking_start_date', 'full_amount', 'paid_amount', 'fully_paid'],
+        ['invoice_number', 'student__user__email', 'booking__start_date', 'full_amount', 'paid_amount', 'fully_paid'],
+        date_field='booking__start_date',
+        order_by='invoice_number',
+    ),
+    'bookings': Export(
+        Booking,
+        ['id', 'student_email', 'relation_id', 'day_of_the_week', 'time_of_the_day', 'teacher', 'start_date',
+         'end_date', 'duration_of_lessons', 'interval_between_lessons', 'number_of_lessons', 'invoice_number'],
+        ['id', 'user__email', 'relation_id', 'day_of_the_week__day', 'time_of_the_day', 'teacher', 'start_date',
+         'end_date', 'duration_of_lessons', 'interval_between_lessons', 'number_of_lessons', 'invoice_id'],
+        date_field='start_date',
+        order_by='id',
+    ),
+}
+
+
+def escape_csv_value(value):
+    '''
+    Prefixes text that a spreadsheet would read as a formula with a quote, so that it is shown as text instead
+    '''
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return f"'{value}"
+    return value
+
+def stream_csv(header, rows):
+    '''
+    Lazily yields the lines of a CSV file of the header and rows, with their text escaped from spreadsheet formulas
+    '''
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([escape_csv_value(value) for value in row])
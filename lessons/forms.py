@@ -1,15 +1,33 @@
 import decimal
 
 from django import forms
+from django.db import transaction
+from django.utils import timezone
 from django.core.validators import RegexValidator, MinValueValidator
 from django.contrib.auth.models import Group
 from .models import User, Child, DayOfTheWeek, Request, BankTransaction, Student, Invoice, SchoolTerm, Booking
 from .forms_functions import create_invoice, find_term_from_date
+from .teacher_schedule import get_teacher_schedule_index, update_teacher_schedule
+from .reference_data import SCHOOL_TERMS, DAYS_OF_THE_WEEK, ReferenceDataChoiceField, ReferenceDataMultipleChoiceField
 
 
 class DateInput(forms.DateInput):
     input_type = 'date'
 
+def check_teacher_is_free(form, day, time_of_the_day, exclude_booking_id=None):
+    '''
+    Adds an error to the teacher of a booking form if the teacher already has lessons at the time of the booking
+    '''
+    fields = [form.cleaned_data.get(field) for field in ('teacher', 'duration_of_lessons', 'start_date',
+                                                        'interval_between_lessons', 'number_of_lessons')]
+    if day is None or time_of_the_day is None or None in fields:
+        return
+
+    teacher, duration_of_lessons, start_date, interval_between_lessons, number_of_lessons = fields
+    if get_teacher_schedule_index().has_conflict(teacher, day, time_of_the_day, duration_of_lessons, start_date,
+                                                 interval_between_lessons, number_of_lessons, exclude_booking_id):
+        form.add_error('teacher', 'This teacher already has a lesson at this time.')
+
 class NewChildForm(forms.ModelForm):
     class Meta:
         model = Child
@@ -64,8 +82,8 @@ class NewRequestForm(forms.ModelForm):
                   'interval_between_lessons', 'duration_of_lessons', 'further_information']
         widgets = {'further_information':forms.Textarea(attrs={'style': "width:100%;"})}
 
-    availability = forms.ModelMultipleChoiceField(
-        queryset=DayOfTheWeek.objects.all(),
+    availability = ReferenceDataMultipleChoiceField(
+        DAYS_OF_THE_WEEK,
         label="Available Days",
         widget=forms.CheckboxSelectMultiple
     )
@@ -92,8 +110,8 @@ class RequestEditForm(forms.ModelForm):
                   'duration_of_lessons', 'further_information', 'fulfilled']
         widgets = {'further_information':forms.Textarea(attrs={'style': "width:100%;"})}
 
-    availability = forms.ModelMultipleChoiceField(
-        queryset=DayOfTheWeek.objects.all(),
+    availability = ReferenceDataMultipleChoiceField(
+        DAYS_OF_THE_WEEK,
         label="Available Days",
         widget=forms.CheckboxSelectMultiple
     )
@@ -151,8 +169,8 @@ class FulfilRequestForm(forms.ModelForm):
                 widget=forms.Select
             )
 
-    availability = forms.ModelChoiceField(
-        queryset=DayOfTheWeek.objects.all(),
+    availability = ReferenceDataChoiceField(
+        DAYS_OF_THE_WEEK,
         label="Day of lessons:",
         widget=forms.Select
     )
@@ -187,6 +205,10 @@ class FulfilRequestForm(forms.ModelForm):
         )
     )
 
+    def clean(self):
+        super().clean()
+        check_teacher_is_free(self, self.cleaned_data.get('availability'), self.cleaned_data.get('time_of_lesson'))
+
     def save(self):
         super().save(commit=False)
         req = Request.objects.get(id=self.request_id)
@@ -219,6 +241,24 @@ class FulfilRequestForm(forms.ModelForm):
 
 
 
+class FulfilAssignmentForm(forms.Form):
+    '''Validates one row of a batch fulfilment, without querying the database'''
+    request_id = forms.IntegerField(min_value=1)
+    day_of_the_week = forms.ChoiceField(choices=DayOfTheWeek.Day.choices)
+    time_of_lesson = forms.TimeField()
+    teacher = forms.CharField(max_length=100)
+    start_date = forms.DateField()
+    end_date = forms.DateField()
+    hourly_cost = forms.DecimalField(min_value=decimal.Decimal('0.01'), decimal_places=2)
+
+    def clean(self):
+        super().clean()
+        start_date = self.cleaned_data.get('start_date')
+        end_date = self.cleaned_data.get('end_date')
+        if start_date and end_date and end_date < start_date:
+            self.add_error('end_date', 'End date must not be before start date.')
+
+
 class LogInForm(forms.Form):
     email = forms.CharField(label='Email')
     password = forms.CharField(label='Password', widget=forms.PasswordInput())
@@ -364,6 +404,31 @@ class TransactionSubmitForm(forms.ModelForm):
         pass
 
 
+class BankStatementUploadForm(forms.Form):
+    statement = forms.FileField(label='Bank statement (CSV or OFX)')
+
+
+class TimetableProposalForm(forms.Form):
+    term = ReferenceDataChoiceField(SCHOOL_TERMS, label='Term')
+    teachers = forms.CharField(label='Teachers (one per line)', widget=forms.Textarea(attrs={'rows': 4}))
+    day_start = forms.TimeField(label='First lesson from', widget=forms.TimeInput(attrs={'type': 'time'}))
+    day_end = forms.TimeField(label='Last lesson until', widget=forms.TimeInput(attrs={'type': 'time'}))
+    hourly_cost = forms.DecimalField(min_value=decimal.Decimal('0.01'), decimal_places=2)
+
+    def clean_teachers(self):
+        teachers = [teacher.strip() for teacher in self.cleaned_data.get('teachers').splitlines() if teacher.strip()]
+        if not teachers:
+            raise forms.ValidationError('Enter at least one teacher.')
+        return teachers
+
+    def clean(self):
+        super().clean()
+        day_start = self.cleaned_data.get('day_start')
+        day_end = self.cleaned_data.get('day_end')
+        if day_start and day_end and day_end <= day_start:
+            self.add_error('day_end', 'Lessons must end after they start.')
+
+
 class BookingEditForm(forms.ModelForm):
     class Meta:
         model = Booking
@@ -376,8 +441,8 @@ class BookingEditForm(forms.ModelForm):
                    'duration_of_lessons', 'interval_between_lessons', 'number_of_lessons',
                    'teacher', 'further_information', 'hourly_cost']
 
-    day_of_the_week = forms.ModelChoiceField(
-        queryset=DayOfTheWeek.objects.all(),
+    day_of_the_week = ReferenceDataChoiceField(
+        DAYS_OF_THE_WEEK,
         label="Day of lessons:",
         widget=forms.Select
     )
@@ -427,42 +492,53 @@ class BookingEditForm(forms.ModelForm):
         self.fields['further_information'].disabled = True
         self.fields['hourly_cost'].disabled = True
 
-    def save(self):
-        instance_set = Booking.objects.filter(id=self.instance_id)
-        super().save(commit=False)
-
-        instance_set.update(
-            day_of_the_week = self.cleaned_data.get('day_of_the_week'),
-            time_of_the_day = self.cleaned_data.get('time_of_the_day'),
-            teacher = self.cleaned_data.get('teacher'),
-            start_date = self.cleaned_data.get('start_date'),
-            end_date = self.cleaned_data.get('end_date'),
-            duration_of_lessons = self.cleaned_data.get('duration_of_lessons'),
-            interval_between_lessons = self.cleaned_data.get('interval_between_lessons'),
-            number_of_lessons = self.cleaned_data.get('number_of_lessons'),
-            further_information = self.cleaned_data.get('further_information')
-        )
-
+    def clean(self):
+        super().clean()
+        check_teacher_is_free(self, self.cleaned_data.get('day_of_the_week'), self.cleaned_data.get('time_of_the_day'),
+                              int(self.instance_id) if self.instance_id else None)
 
-        # Update invoice
-        student = Student.objects.get(user=instance_set[0].user)
-        invoice = instance_set[0].invoice
-        new_cost = instance_set[0].duration_of_lessons * float(self.cleaned_data.get('hourly_cost')) * instance_set[0].number_of_lessons / 60
-        invoice.full_amount = new_cost
-
-        if invoice.paid_amount > invoice.full_amount:
-            student.balance = student.balance + decimal.Decimal(
-                (invoice.paid_amount - decimal.Decimal(invoice.full_amount)))
-            invoice.paid_amount = invoice.full_amount
-            invoice.fully_paid = True
-            student.save()
-        elif invoice.paid_amount == invoice.full_amount:
-            invoice.fully_paid = True
-        else:
-            invoice.fully_paid = False
+    def save(self):
+        with transaction.atomic():
+            instance_set = Booking.objects.filter(id=self.instance_id)
+            super().save(commit=False)
+
+            instance_set.update(
+                day_of_the_week = self.cleaned_data.get('day_of_the_week'),
+                time_of_the_day = self.cleaned_data.get('time_of_the_day'),
+                teacher = self.cleaned_data.get('teacher'),
+                start_date = self.cleaned_data.get('start_date'),
+                end_date = self.cleaned_data.get('end_date'),
+                duration_of_lessons = self.cleaned_data.get('duration_of_lessons'),
+                interval_between_lessons = self.cleaned_data.get('interval_between_lessons'),
+                number_of_lessons = self.cleaned_data.get('number_of_lessons'),
+                further_information = self.cleaned_data.get('further_information'),
+                # Updates do not set auto_now fields, and the calendar feeds are validated by the update time
+                updated_at = timezone.now()
+            )
 
-        invoice.save()
 
+            # Update invoice
+            student = Student.objects.get(user=instance_set[0].user)
+            invoice = instance_set[0].invoice
+            new_cost = instance_set[0].duration_of_lessons * float(self.cleaned_data.get('hourly_cost')) * instance_set[0].number_of_lessons / 60
+            invoice.full_amount = new_cost
+
+            if invoice.paid_amount > invoice.full_amount:
+                student.balance = student.balance + decimal.Decimal(
+                    (invoice.paid_amount - decimal.Decimal(invoice.full_amount)))
+                invoice.paid_amount = invoice.full_amount
+                invoice.fully_paid = True
+                student.save()
+            elif invoice.paid_amount == invoice.full_amount:
+                invoice.fully_paid = True
+            else:
+                invoice.fully_paid = False
+
+            invoice.save()
+
+            # The booking is updated in place, so its changes are not signalled. The version of its teacher is changed
+            # in the same transaction as the booking.
+            update_teacher_schedule([instance_set[0].id])
         return instance_set[0]
 
 
@@ -475,3 +551,24 @@ class TermEditForm(forms.ModelForm):
             'start_date': DateInput(),
             'end_date': DateInput()
         }
+
+
+class RequestFilterForm(forms.Form):
+    FULFILLED_CHOICES = [('', 'All'), ('true', 'Fulfilled'), ('false', 'Unfulfilled')]
+
+    fulfilled = forms.ChoiceField(label='Status', choices=FULFILLED_CHOICES, required=False)
+    date_from = forms.DateField(label='From', widget=DateInput(), required=False)
+    date_to = forms.DateField(label='To', widget=DateInput(), required=False)
+    student = forms.CharField(label='Student', required=False)
+
+
+class BookingFilterForm(forms.Form):
+    date_from = forms.DateField(label='Starting from', widget=DateInput(), required=False)
+    date_to = forms.DateField(label='Starting until', widget=DateInput(), required=False)
+    student = forms.CharField(label='Student', required=False)
+    teacher = forms.CharField(label='Teacher', required=False)
+
+
+class ExportFilterForm(forms.Form):
+    date_from = forms.DateField(label='From', widget=DateInput(), required=False)
+    date_to = forms.DateField(label='To', widget=DateInput(), required=False)
@@ -1,52 +1,90 @@
-from .models import Student, Invoice, SchoolTerm
+from django.db import transaction
+from .models import Student, Invoice
+from .term_index import get_term_index
 
 def create_invoice(booking, hourly_cost):
     '''Creates invoice for the user contained in Booking with hourly cost hourly_cost'''
 
     user = Student.objects.get(user__email=booking.user)
 
-    invoice_number = generate_invoice_number(user)
-
     # Calculate amount to pay
     total_required = (float(hourly_cost) * booking.number_of_lessons * booking.duration_of_lessons / 60)
 
     # Create invoice
-    invoice = Invoice.objects.create(
-        invoice_number=invoice_number,
-        student=user,
-        full_amount=total_required,
-        paid_amount=0,
-        fully_paid=False
-    )
-    invoice.full_clean()
-    invoice.save()
+    with transaction.atomic():
+        invoice_number = generate_invoice_number(user)
+        invoice = Invoice.objects.create(
+            invoice_number=invoice_number,
+            student=user,
+            full_amount=total_required,
+            paid_amount=0,
+            fully_paid=False
+        )
+        invoice.full_clean()
+        invoice.save()
 
     return invoice_number
 
 
+def format_invoice_number(student_id, sequence):
+    '''Formats an invoice number as xxxx-yyy from a student id and an invoice sequence number'''
+    return f'{student_id:04d}-{sequence:03d}'
+
+
 def generate_invoice_number(user):
-    '''Generates and returns a new unique invoice number for user'''
-    invoice_number = ""
-    user_id = user.id
-    number_of_invoices_for_user = Invoice.objects.all().filter(student=user).count() + 1
-    for i in range(4-len(str(user_id))):
-        invoice_number += "0"
-    invoice_number = invoice_number + str(user_id) + "-"
-    for i in range(3-len(str(number_of_invoices_for_user))):
-        invoice_number += "0"
-    invoice_number += str(number_of_invoices_for_user)
-    return invoice_number
+    '''Allocates and returns a new unique invoice number for user'''
+    with transaction.atomic():
+        # Lock the student row so that concurrent fulfilments get different sequence numbers
+        student = Student.objects.select_for_update().only('invoice_sequence').get(pk=user.pk)
+        sequence = student.invoice_sequence + 1
+
+        # Skip numbers already taken by invoices created outside of the sequence
+        while Invoice.objects.filter(invoice_number=format_invoice_number(user.id, sequence)).exists():
+            sequence += 1
+
+        Student.objects.filter(pk=user.pk).update(invoice_sequence=sequence)
+
+    user.invoice_sequence = sequence
+    return format_invoice_number(user.id, sequence)
+
+
+def generate_invoice_numbers(invoice_counts):
+    '''Allocates invoice_counts[student] new unique invoice numbers for each student, in a single batch of queries'''
+    allocated = {}
+    with transaction.atomic():
+        students = Student.objects.select_for_update().only('invoice_sequence').in_bulk(
+            [student.pk for student in invoice_counts]
+        )
+
+        for student, count in invoice_counts.items():
+            first_sequence = students[student.pk].invoice_sequence + 1
+            allocated[student.pk] = list(range(first_sequence, first_sequence + count))
+
+        # Skip numbers already taken by invoices created outside of the sequence
+        while True:
+            candidates = {
+                format_invoice_number(student_id, sequence): student_id
+                for student_id, sequences in allocated.items() for sequence in sequences
+            }
+            taken = set(Invoice.objects.filter(invoice_number__in=candidates).values_list('invoice_number', flat=True))
+            if not taken:
+                break
+            for student_id, sequences in allocated.items():
+                kept = [sequence for sequence in sequences if format_invoice_number(student_id, sequence) not in taken]
+                next_sequence = sequences[-1] + 1
+                allocated[student_id] = kept + list(range(next_sequence, next_sequence + len(sequences) - len(kept)))
+
+        for student_id, sequences in allocated.items():
+            students[student_id].invoice_sequence = sequences[-1]
+        Student.objects.bulk_update(students.values(), ['invoice_sequence'])
+
+    return {
+        student_id: [format_invoice_number(student_id, sequence) for sequence in sequences]
+        for student_id, sequences in allocated.items()
+    }
 
 
 def find_term_from_date(date):
-    '''Returns the term of the date'''
-    term = SchoolTerm.objects.all().filter(end_date__gte=date).filter(start_date__lte=date).first()
-    if not term:
-        school_terms_starting_later = SchoolTerm.objects.filter(start_date__gte=date)
-        min_start_date = school_terms_starting_later[0].start_date
-        term = school_terms_starting_later[0]
-        for term_in_list in school_terms_starting_later:
-            if term.start_date < min_start_date:
-                min_start_date = term_in_list.start_date
-                term = term_in_list
-    return term
\ No newline at end of file
+    '''Returns the term of the date, or the next term if the date falls in a holiday'''
+    term_index = get_term_index()
+    return term_index.find_term(date) or term_index.find_next_term(date)
@@ -0,0 +1,67 @@
+import uuid
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+
+FRAGMENT_VERSION_KEY_PREFIX = 'fragment_version'
+# Fragments whose content depends on the school terms, whose version changes with every change of a term
+TERM_FRAGMENTS = ['terms_table']
+
+
+def get_fragment_cache():
+    '''
+    Returns the cache template fragments are stored in, the file based one shared by every process by default
+    '''
+    return caches[getattr(settings, 'FRAGMENT_CACHE_ALIAS', 'fragments_file')]
+
+def get_fragment_cache_timeout():
+    '''
+    Returns how long template fragments are cached for in seconds, 0 if they are not cached
+    '''
+    return getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 0)
+
+def get_fragment_version_key(fragment_name):
+    return f'{FRAGMENT_VERSION_KEY_PREFIX}:{fragment_name}'
+
+def get_fragment_version(fragment_name):
+    '''
+    Returns the version of the data a fragment is rendered from, which is part of the keys of its cached renders
+    '''
+    fragment_cache = get_fragment_cache()
+    version_key = get_fragment_version_key(fragment_name)
+    version = fragment_cache.get(version_key)
+    if version is None:
+        # A new random version, rather than a counter starting again, so that an evicted version never matches
+        # the renders cached before it was evicted
+        version = uuid.uuid4().hex
+        fragment_cache.set(version_key, version, None)
+    return version
+
+def invalidate_fragments(fragment_names):
+    '''
+    Changes the version of the given fragments, so that their cached renders are no longer used
+    '''
+    if get_fragment_cache_timeout():
+        get_fragment_cache().delete_many([get_fragment_version_key(fragment_name) for fragment_name in fragment_names])
+
+def invalidate_term_fragments():
+    invalidate_fragments(TERM_FRAGMENTS)
+
+def get_fragment_cache_key(fragment_name, vary_on):
+    return make_template_fragment_key(fragment_name, [get_fragment_version(fragment_name), *vary_on])
+
+def get_cached_fragment(fragment_name, vary_on, render):
+    '''
+    Returns the render of a fragment for the values it varies on, from the cache if fragments are cached
+    '''
+    timeout = get_fragment_cache_timeout()
+    if not timeout:
+        return render()
+
+    fragment_cache = get_fragment_cache()
+    cache_key = get_fragment_cache_key(fragment_name, vary_on)
+    fragment = fragment_cache.get(cache_key)
+    if fragment is None:
+        fragment = render()
+        fragment_cache.set(cache_key, fragment, timeout)
+    return fragment
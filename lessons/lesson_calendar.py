@@ -0,0 +1,113 @@
+import datetime
+import hashlib
+from django.core import signing
+from .models import Booking
+from .term_index import get_term_index
+
+CALENDAR_TOKEN_SALT = 'lessons.lesson_calendar'
+PRODUCT_ID = '-//MSMS//Lessons//EN'
+# Lines of an iCalendar file must not be longer than 75 octets, excluding the line break
+MAX_LINE_OCTETS = 75
+
+
+def get_calendar_token(user_id, relation_id=-1):
+    '''
+    Returns the signed token identifying the lessons of a student or child in the URL of a calendar feed
+    '''
+    return signing.Signer(salt=CALENDAR_TOKEN_SALT).sign_object([user_id, int(relation_id)])
+
+def read_calendar_token(token):
+    '''
+    Returns the user id and relation id of a calendar feed token, or None if the token was not signed by us
+    '''
+    try:
+        user_id, relation_id = signing.Signer(salt=CALENDAR_TOKEN_SALT).unsign_object(token)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    return user_id, relation_id
+
+
+def get_calendar_bookings(user_id, relation_id):
+    return Booking.objects.filter(user_id=user_id, relation_id=relation_id)
+
+def get_calendar_etag(bookings):
+    '''
+    Returns the ETag of the feed of the bookings, from a single query on their ids and update times.
+    It also covers the terms, as lessons that fall in a holiday are excluded. There is no last modification time
+    that moves when a booking is deleted or a term changes, so the feed is only validated by its ETag.
+    '''
+    booking_versions = list(bookings.order_by('id').values_list('id', 'updated_at'))
+    term_index = get_term_index()
+    fingerprint = repr((booking_versions, term_index.start_dates, term_index.end_dates))
+    return '"' + hashlib.md5(fingerprint.encode()).hexdigest() + '"'
+
+
+def escape_text(text):
+    return text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+
+def fold_line(line):
+    '''
+    Splits a content line into lines of at most MAX_LINE_OCTETS octets, continued lines starting with a space
+    '''
+    folded = []
+    current = ''
+    limit = MAX_LINE_OCTETS
+    for character in line:
+        if len((current + character).encode()) > limit:
+            folded.append(current)
+            current = ''
+            # Continuation lines start with a space that counts towards their length
+            limit = MAX_LINE_OCTETS - 1
+        current += character
+    folded.append(current)
+    return '\r\n '.join(folded)
+
+def format_local_datetime(value):
+    return value.strftime('%Y%m%dT%H%M%S')
+
+def format_utc_datetime(value):
+    return value.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+def get_holiday_lesson_datetimes(booking):
+    '''
+    Returns the datetimes of the lessons of a booking that fall outside of term time
+    '''
+    first_lesson_datetime = datetime.datetime.combine(booking.start_date, booking.time_of_the_day)
+    interval = datetime.timedelta(days=booking.interval_between_lessons)
+    lesson_datetimes = [first_lesson_datetime + interval * index for index in range(booking.number_of_lessons)]
+    lesson_terms = get_term_index().classify_dates(lesson_datetimes)
+    return [lesson_datetime for lesson_datetime, term in zip(lesson_datetimes, lesson_terms) if term is None]
+
+def get_booking_event_lines(booking, student_name):
+    '''
+    Returns the lines of a single recurring event for all the lessons of a booking
+    '''
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:booking-{booking.id}@msms',
+        f'DTSTAMP:{format_utc_datetime(booking.updated_at)}',
+        f'DTSTART:{format_local_datetime(datetime.datetime.combine(booking.start_date, booking.time_of_the_day))}',
+        f'DURATION:PT{booking.duration_of_lessons}M',
+        f'RRULE:FREQ=WEEKLY;INTERVAL={booking.interval_between_lessons // 7};COUNT={booking.number_of_lessons}',
+    ]
+    holiday_lesson_datetimes = get_holiday_lesson_datetimes(booking)
+    if holiday_lesson_datetimes:
+        lines.append('EXDATE:' + ','.join(format_local_datetime(value) for value in holiday_lesson_datetimes))
+    lines += [
+        f'SUMMARY:{escape_text(f"{student_name} lesson with {booking.teacher}")}',
+        f'DESCRIPTION:{escape_text(booking.further_information)}',
+        'END:VEVENT',
+    ]
+    return lines
+
+def render_lesson_calendar(bookings, student_name):
+    '''
+    Renders the lessons of the bookings as an iCalendar file, with one recurring event per booking
+    '''
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', f'PRODID:{PRODUCT_ID}', 'CALSCALE:GREGORIAN',
+             f'X-WR-CALNAME:{escape_text(f"{student_name} lessons")}']
+    for booking in bookings.order_by('start_date', 'id'):
+        lines += get_booking_event_lines(booking, student_name)
+    lines.append('END:VCALENDAR')
+    return ''.join(fold_line(line) + '\r\n' for line in lines)
+
@@ -0,0 +1,118 @@
+import datetime
+import heapq
+from itertools import islice
+from django.db.models import F, Value, ExpressionWrapper, DurationField, DateField
+from .utils import Lesson
+from .views_functions import get_first_future_lesson_index, get_full_names_for_clients
+
+LESSON_TIMELINE_PAGE_SIZE = 50
+CURSOR_SEPARATOR = '_'
+
+
+def encode_lesson_cursor(date_time, booking_id):
+    '''
+    Encodes a (datetime, booking id) position in the timeline as a query string value
+    '''
+    return f'{date_time.isoformat()}{CURSOR_SEPARATOR}{booking_id}'
+
+def decode_lesson_cursor(cursor):
+    '''
+    Decodes a cursor query string value, returns None if the cursor is missing or malformed
+    '''
+    if not cursor:
+        return None
+
+    date_time, _, booking_id = cursor.rpartition(CURSOR_SEPARATOR)
+    try:
+        return datetime.datetime.fromisoformat(date_time), int(booking_id)
+    except ValueError:
+        return None
+
+def generate_booking_lesson_keys(booking, start_datetime, after_booking_id=None):
+    '''
+    Lazily yields (datetime, booking id, booking) for each lesson of a booking from start_datetime onwards.
+    A lesson at exactly start_datetime is skipped when after_booking_id is given and the booking does not come after it.
+    '''
+    first_lesson_datetime = datetime.datetime.combine(booking.start_date, booking.time_of_the_day)
+    interval = datetime.timedelta(days=booking.interval_between_lessons)
+    index = get_first_future_lesson_index(booking, start_datetime)
+
+    if (after_booking_id is not None and index < booking.number_of_lessons
+            and first_lesson_datetime + interval * index == start_datetime and booking.id <= after_booking_id):
+        index += 1
+
+    for offset in range(index, booking.number_of_lessons):
+        yield first_lesson_datetime + interval * offset, booking.id, booking
+
+def get_bookings_with_lessons_from(bookings, date):
+    '''
+    Filters a queryset of bookings in SQL down to those whose last lesson is on or after the date,
+    ordered by the datetime of their first lesson
+    '''
+    last_lesson_date = ExpressionWrapper(
+        F('start_date') + ExpressionWrapper(
+            Value(datetime.timedelta(days=1)) * (F('interval_between_lessons') * (F('number_of_lessons') - 1)),
+            output_field=DurationField()
+        ),
+        output_field=DateField()
+    )
+    return bookings.alias(last_lesson_date=last_lesson_date).filter(last_lesson_date__gte=date) \
+        .order_by('start_date', 'time_of_the_day', 'id')
+
+def iterate_lesson_timeline(bookings, now=None, after=None):
+    '''
+    Lazily yields (datetime, booking id, booking) for the future lessons of a queryset of bookings in date order,
+    starting strictly after the (datetime, booking id) cursor if one is given.
+    Bookings that ended before the start are left out by the database, and the others are read in the order of
+    their first lesson, only once the timeline reaches it.
+    '''
+    start_datetime = now or datetime.datetime.today()
+    after_booking_id = None
+    if after and after[0] >= start_datetime:
+        start_datetime, after_booking_id = after
+
+    pending_bookings = get_bookings_with_lessons_from(bookings, start_datetime.date()).iterator()
+    next_booking = next(pending_bookings, None)
+    # Next lesson of each booking being merged, as (datetime, booking id, booking, lessons of the booking)
+    heap = []
+    while True:
+        # No lesson of a booking comes before its first one, so later bookings wait until the timeline reaches them
+        while next_booking is not None and (
+                not heap or datetime.datetime.combine(next_booking.start_date, next_booking.time_of_the_day) <= heap[0][0]):
+            lessons = generate_booking_lesson_keys(next_booking, start_datetime, after_booking_id)
+            lesson = next(lessons, None)
+            if lesson is not None:
+                heapq.heappush(heap, (*lesson, lessons))
+            next_booking = next(pending_bookings, None)
+        if not heap:
+            return
+
+        lesson_datetime, booking_id, booking, lessons = heapq.heappop(heap)
+        yield lesson_datetime, booking_id, booking
+        lesson = next(lessons, None)
+        if lesson is not None:
+            heapq.heappush(heap, (*lesson, lessons))
+
+def get_lesson_timeline_page(bookings, page_size=LESSON_TIMELINE_PAGE_SIZE, now=None, after=None):
+    '''
+    Returns a page of lessons in date order and the cursor of the next page, or None if it is the last page
+    '''
+    lesson_keys = list(islice(iterate_lesson_timeline(bookings, now, after), page_size + 1))
+    next_cursor = None
+    if len(lesson_keys) > page_size:
+        lesson_keys = lesson_keys[:page_size]
+        next_cursor = encode_lesson_cursor(lesson_keys[-1][0], lesson_keys[-1][1])
+
+    student_names = get_full_names_for_clients(booking for _, _, booking in lesson_keys)
+    lessons = []
+    for lesson_datetime, booking_id, booking in lesson_keys:
+        lessons.append(Lesson(
+            booking,
+            lesson_datetime,
+            student_names[(booking.user_id, int(booking.relation_id))],
+            booking.teacher,
+            str(booking.duration_of_lessons) + " mins",
+            booking.further_information
+        ))
+
+    return lessons, next_cursor
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from lessons.models import Student, StudentLedger
+
+
+class Command(BaseCommand):
+    help = 'Creates the ledgers of students that have none, such as students loaded from fixtures or with raw SQL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recompute', action='store_true',
+                            help='Also recompute the totals of the existing ledgers from the invoices')
+
+    def handle(self, *args, **options):
+        created = StudentLedger.backfill()
+        print(f'Created {created} missing ledgers.')
+        if options['recompute']:
+            student_ids = list(Student.objects.values_list('id', flat=True))
+            for start in range(0, len(student_ids), StudentLedger.UPDATE_BATCH_SIZE):
+                StudentLedger.refresh(student_ids[start:start + StudentLedger.UPDATE_BATCH_SIZE])
+            print(f'Recomputed {len(student_ids)} ledgers.')
@@ -0,0 +1,51 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from lessons.benchmarks import BENCHMARK_STUDENT_COUNTS, BENCHMARK_SEED, BENCHMARK_REPEAT, run_benchmarks, \
+    find_regressions
+
+
+class Command(BaseCommand):
+    help = 'Seeds datasets of increasing size in a separate test database and measures the time, queries and ' \
+           'memory of every page on each of them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, action='append',
+                            help=f'Number of students of a dataset, can be given several times '
+                                 f'(default: {", ".join(map(str, BENCHMARK_STUDENT_COUNTS))})')
+        parser.add_argument('--repeat', type=int, default=BENCHMARK_REPEAT,
+                            help='Number of timed visits of each page')
+        parser.add_argument('--seed', type=int, default=BENCHMARK_SEED, help='Seed of the datasets')
+        parser.add_argument('--output', default='benchmark.json', help='Path of the JSON file of the results')
+        parser.add_argument('--baseline', help='Path of the JSON results of a previous run to compare against')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as baseline_file:
+                baseline = json.load(baseline_file)
+
+        # The datasets are seeded in a test database, so that the data of the development database is kept
+        setup_test_environment(debug=False)
+        old_database_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = run_benchmarks(options['students'] or BENCHMARK_STUDENT_COUNTS, repeat=options['repeat'],
+                                     seed=options['seed'])
+        except ValueError as error:
+            raise CommandError(str(error))
+        finally:
+            connection.creation.destroy_test_db(old_database_name, verbosity=0)
+            teardown_test_environment()
+
+        with open(options['output'], 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+        print(f'Results written to {options["output"]}')
+
+        if baseline is not None:
+            regressions = find_regressions(baseline, results)
+            for regression in regressions:
+                print(regression)
+            if regressions:
+                raise CommandError(f'{len(regressions)} regressions since {baseline.get("commit") or "the baseline"}.')
+            print('No regressions!')
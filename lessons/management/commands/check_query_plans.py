@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from lessons.query_plans import explain_hot_queries, can_explain_hot_queries
+
+
+class Command(BaseCommand):
+    help = 'Explains the query plans of the queries run by every page visit, and fails if one does not use its index'
+
+    def handle(self, *args, **options):
+        if not can_explain_hot_queries():
+            print(f'Query plans of {connection.vendor} databases cannot be checked, only those of SQLite. Skipped.')
+            return
+
+        failures = []
+        for query_plan in explain_hot_queries():
+            print(f'{query_plan.query.name}:')
+            for line in query_plan.plan.splitlines():
+                print(f'    {line}')
+            if not query_plan.uses_index:
+                failures.append(f'{query_plan.query.name} does not use {query_plan.query.index_name}')
+            elif query_plan.sorts_rows:
+                failures.append(f'{query_plan.query.name} sorts its rows instead of reading them from '
+                                f'{query_plan.query.index_name}')
+
+        for failure in failures:
+            print(failure)
+        if failures:
+            raise CommandError(f'{len(failures)} queries do not use their index.')
+        print('All queries use their index!')
@@ -0,0 +1,28 @@
+import csv
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from lessons.bulk_fulfilment import fulfil_requests
+
+class Command(BaseCommand):
+    help = ('Fulfils many requests at once from a CSV file with the columns request_id, day_of_the_week, '
+            'time_of_lesson, teacher, start_date, end_date and hourly_cost')
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help='Path of the CSV file of assignments')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['csv_file'], newline='') as csv_file:
+                assignments = list(csv.DictReader(csv_file))
+        except OSError as error:
+            raise CommandError(f'Could not read {options["csv_file"]}: {error}')
+
+        try:
+            bookings = fulfil_requests(assignments)
+        except ValidationError as error:
+            for assignment, messages in error.message_dict.items():
+                for message in messages:
+                    print(f'{assignment}: {message}')
+            raise CommandError('No request was fulfilled as some assignments are invalid.')
+
+        print(f'{len(bookings)} requests fulfilled!')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from lessons.statement_import import import_bank_statement, get_statement_format
+
+class Command(BaseCommand):
+    help = 'Imports the payments of a CSV (date, amount, reference) or OFX bank statement'
+
+    def add_arguments(self, parser):
+        parser.add_argument('statement_file', help='Path of the bank statement')
+        parser.add_argument('--format', choices=['csv', 'ofx'], default=None,
+                            help='Format of the statement, guessed from the file extension by default')
+
+    def handle(self, *args, **options):
+        statement_format = options['format'] or get_statement_format(options['statement_file'])
+        try:
+            with open(options['statement_file'], newline='', encoding='utf-8-sig') as statement:
+                result = import_bank_statement(statement, statement_format)
+        except (OSError, UnicodeDecodeError) as error:
+            raise CommandError(f'Could not read {options["statement_file"]}: {error}')
+
+        for line_number, reason in result.rejected:
+            print(f'Line {line_number} not imported: {reason}')
+        print(f'{result.imported} transactions imported!')
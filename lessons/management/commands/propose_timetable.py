@@ -0,0 +1,76 @@
+import csv
+import datetime
+from decimal import Decimal, InvalidOperation
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from lessons.models import SchoolTerm
+from lessons.timetable_solver import propose_timetable, apply_timetable_proposal, DEFAULT_DAY_START, DEFAULT_DAY_END
+from lessons.views_functions import get_upcoming_term
+
+ASSIGNMENT_COLUMNS = ['request_id', 'day_of_the_week', 'time_of_lesson', 'teacher', 'start_date', 'end_date',
+                      'hourly_cost']
+
+
+def parse_time(value):
+    try:
+        return datetime.time.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f'{value} is not a time, use HH:MM.')
+
+class Command(BaseCommand):
+    help = ('Proposes a day, time and teacher for every unfulfilled request in a term, without clashing with '
+            'existing bookings, and optionally writes the proposal as a fulfil_requests CSV file or fulfils it')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teacher', action='append', required=True, dest='teachers',
+                            help='Name of a teacher who can take lessons, repeat for every teacher')
+        parser.add_argument('--term', default=None, help='Name of the term to schedule, the upcoming term by default')
+        parser.add_argument('--day-start', default=DEFAULT_DAY_START.strftime('%H:%M'),
+                            help='Earliest start time of a lesson (HH:MM)')
+        parser.add_argument('--day-end', default=DEFAULT_DAY_END.strftime('%H:%M'),
+                            help='Latest end time of a lesson (HH:MM)')
+        parser.add_argument('--hourly-cost', default=None, help='Hourly cost of the proposed lessons')
+        parser.add_argument('--output', default=None, help='Path of a CSV file to write the proposal to')
+        parser.add_argument('--apply', action='store_true', help='Fulfil the proposed requests')
+
+    def handle(self, *args, **options):
+        if options['term']:
+            term = SchoolTerm.objects.filter(term_name=options['term']).first()
+        else:
+            term = get_upcoming_term()
+        if term is None:
+            raise CommandError('There is no term to schedule.')
+
+        hourly_cost = None
+        if options['output'] or options['apply']:
+            try:
+                hourly_cost = Decimal(options['hourly_cost'] or '')
+            except InvalidOperation:
+                raise CommandError('--hourly-cost is required to write or fulfil a proposal.')
+
+        proposal = propose_timetable(options['teachers'], term, parse_time(options['day_start']),
+                                     parse_time(options['day_end']))
+        print(f'{len(proposal.bookings)} requests scheduled in {term.term_name}, '
+              f'{len(proposal.unscheduled)} could not be scheduled.')
+        for request in proposal.unscheduled:
+            print(f'Request {request.id} could not be scheduled.')
+
+        if options['output']:
+            try:
+                with open(options['output'], 'w', newline='') as csv_file:
+                    writer = csv.DictWriter(csv_file, fieldnames=ASSIGNMENT_COLUMNS)
+                    writer.writeheader()
+                    writer.writerows(booking.as_assignment(hourly_cost) for booking in proposal.bookings)
+            except OSError as error:
+                raise CommandError(f'Could not write {options["output"]}: {error}')
+            print(f'Proposal written to {options["output"]}.')
+
+        if options['apply']:
+            try:
+                bookings = apply_timetable_proposal(proposal, hourly_cost)
+            except ValidationError as error:
+                for assignment, messages in error.message_dict.items():
+                    for message in messages:
+                        print(f'{assignment}: {message}')
+                raise CommandError('No request was fulfilled as some proposed bookings are invalid.')
+            print(f'{len(bookings)} requests fulfilled!')
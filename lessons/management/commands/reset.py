@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from lessons.data_reset import reset_data
+
+
+class Command(BaseCommand):
+    help = 'Deletes all the users, lessons and payments in a few statements and resets their ids, keeping the groups'
+
+    def handle(self, *args, **options):
+        print('Resetting data...')
+        tables = reset_data()
+        print(f'Emptied {len(tables)} tables.')
+        print('Running server processes may show cached data until it expires. Restart them to drop it now.')
+        print('Done!')
@@ -1,8 +1,14 @@
 from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import Group, Permission
+from django.db import transaction
 from faker import Faker
-from lessons.models import User, Student, SchoolTerm, DayOfTheWeek, Request, Invoice, Booking, BankTransaction, Child
+from lessons.models import User, Student, SchoolTerm, DayOfTheWeek, Request, Invoice, Booking, BankTransaction, Child, \
+    StudentLedger
+from lessons.forms_functions import format_invoice_number
+from collections import defaultdict
 from datetime import datetime,date,timedelta
+from decimal import Decimal
 from django.utils import timezone
 import pytz
 from .create_groups import Command as GroupCreator
@@ -13,6 +19,8 @@ class Command(BaseCommand):
 
     PASSWORD_FOR_ALL = 'Password123'
     NUMBER_OF_STUDENTS_TO_CREATE = 100
+    # Students whose records are generated in memory and inserted together in fast mode
+    FAST_SEED_BATCH_SIZE = 1000
 
     SCHOOL_TERMS = {
         "Term one":[date(2022, 9, 1),date(2022, 10, 21)],
@@ -41,11 +49,23 @@ class Command(BaseCommand):
     def __init__(self):
         super().__init__()
         self.faker = Faker('en_GB')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=self.NUMBER_OF_STUDENTS_TO_CREATE,
+                            help='Number of random students to create')
+        parser.add_argument('--fast', action='store_true',
+                            help='Insert the random students and their records in bulk, with a single password hash')
+        parser.add_argument('--seed', type=int,
+                            help='Seed of the random generators, so that the same data is seeded every time')
         
     def handle(self, *args, **options):
         if not self.database_is_empty():
             print("WARNING: The database is currently not empty. Please unseed before attempting to seed again.")
         else:
+            if options.get('seed') is not None:
+                random.seed(options['seed'])
+                self.faker.seed_instance(options['seed'])
+            number_of_students = options.get('students', self.NUMBER_OF_STUDENTS_TO_CREATE)
             #Create groups  
             group_creator = GroupCreator()
             group_creator.handle()
@@ -54,15 +74,20 @@ class Command(BaseCommand):
             self._create_school_terms()
             self._create_days_of_the_week()
             self._create_required_records()
-            self._create_random_students_and_their_children()
+            if options.get('fast'):
+                self._bulk_create_random_students_and_their_children(number_of_students)
+            else:
+                self._create_random_students_and_their_children(number_of_students)
             print("Done!")
         
 
     def _create_school_terms(self):
+        self.school_terms = []
         for term_name in self.SCHOOL_TERMS.keys():
-            SchoolTerm(term_name=term_name, start_date=self.SCHOOL_TERMS[term_name][0], end_date=self.SCHOOL_TERMS[term_name][1]).save()
+            self.school_terms.append(SchoolTerm.objects.create(term_name=term_name, start_date=self.SCHOOL_TERMS[term_name][0], end_date=self.SCHOOL_TERMS[term_name][1]))
 
     def _create_days_of_the_week(self):
+        self.DAYS_OF_THE_WEEK_INSTANCES = []
         for day_of_the_week in self.DAYS_OF_WEEK_CREATION_DATA.keys():
             self.DAYS_OF_THE_WEEK_INSTANCES.append(DayOfTheWeek.objects.create(order=self.DAYS_OF_WEEK_CREATION_DATA[day_of_the_week], day=day_of_the_week))
 
@@ -96,9 +121,9 @@ class Command(BaseCommand):
 
         director = User.objects.create_superuser(email='marty.major@example.org', password=self.PASSWORD_FOR_ALL, first_name='Marty', last_name='Major')
     
-    def _create_random_students_and_their_children(self):
+    def _create_random_students_and_their_children(self, number_of_students):
         nb_students_created = 0
-        while nb_students_created < self.NUMBER_OF_STUDENTS_TO_CREATE:
+        while nb_students_created < number_of_students:
             _first_name = self.faker.first_name()
             _last_name = self.faker.last_name()
             created_user = User.objects.create_user(
@@ -111,25 +136,132 @@ class Command(BaseCommand):
             self.decide_and_create_child_for_random_user(created_user)
             nb_students_created += 1
 
-    def decide_and_create_child_for_random_user(self,user):
+    def _bulk_create_random_students_and_their_children(self, number_of_students):
+        # Hashing a password is deliberately slow, so all the random students share the same hash
+        password_hash = make_password(self.PASSWORD_FOR_ALL)
+        with transaction.atomic():
+            for batch_start in range(0, number_of_students, self.FAST_SEED_BATCH_SIZE):
+                batch_end = min(batch_start + self.FAST_SEED_BATCH_SIZE, number_of_students)
+                records = defaultdict(list)
+                for number in range(batch_start, batch_end):
+                    self._build_random_student_and_their_children(number, password_hash, records)
+                self._bulk_create_records(records)
+                print(f'Seeded {batch_end}/{number_of_students} students')
+
+    def _build_random_student_and_their_children(self, number, password_hash, records):
+        '''
+        Generates a random student and the records of their family in memory, the same way they are created one by one
+        '''
+        _first_name = self.faker.first_name()
+        _last_name = self.faker.last_name()
+        # The number keeps the emails of students with the same name unique
+        user = User(email=f"{_first_name.lower()}.{_last_name.lower()}{number}@example.org", password=password_hash,
+                    first_name=_first_name, last_name=_last_name)
+        student = Student(user=user)
+        records[User].append(user)
+        records[Student].append(student)
+        self._decide_and_build_request_for_random_student(student, None, records)
+        for _ in range(self.decide_number_of_children()):
+            child = Child(parent=user, first_name=self.faker.first_name(), last_name=self.faker.last_name())
+            records[Child].append(child)
+            self._decide_and_build_request_for_random_student(student, child, records)
+
+    def _decide_and_build_request_for_random_student(self, student, child, records):
+        if not self.decide_request():
+            return
+        request = self._build_random_request_for_user(student.user, -1, False)
+        request.child = child
+        records[Request].append(request)
+        records['availability'].append((request, self._pick_random_availability()))
+        if not self.decide_fulfilment():
+            return
+
+        request.fulfilled = True
+        student.invoice_sequence += 1
+        price_per_hour = randint(10,20)
+        invoice = Invoice(student=student, full_amount=self._get_full_amount(request, price_per_hour),
+                          paid_amount=0, fully_paid=False)
+        records[Invoice].append(invoice)
+        records['invoice_sequences'].append((invoice, student.invoice_sequence))
+        booking = self._build_booking_for_request(request, invoice, self._find_seeded_term(request.date.date()))
+        booking.child = child
+        records[Booking].append(booking)
+
+        amount_paid = self.decide_amount_paid(invoice)
+        if amount_paid is not None:
+            invoice.apply_payment(student, amount_paid)
+            records[BankTransaction].append(BankTransaction(date=timezone.now().date(), student=student,
+                                                            amount=amount_paid, invoice=invoice))
+
+    def _bulk_create_records(self, records):
+        '''
+        Inserts the records generated for a batch of students, each model in as few queries as possible
+        '''
+        User.objects.bulk_create(records[User])
+        student_group = Group.objects.get(name='Student')
+        User.groups.through.objects.bulk_create([
+            User.groups.through(user=user, group=student_group) for user in records[User]
+        ])
+        Student.objects.bulk_create(records[Student])
+        Child.objects.bulk_create(records[Child])
+
+        # Relation ids and invoice numbers refer to rows that only have an id once they are inserted
+        for request in records[Request]:
+            request.relation_id = request.child.id if request.child else -1
+        for booking in records[Booking]:
+            booking.relation_id = booking.child.id if booking.child else -1
+        for invoice, sequence in records['invoice_sequences']:
+            invoice.invoice_number = format_invoice_number(invoice.student.id, sequence)
+
+        Request.objects.bulk_create(records[Request])
+        Request.availability.through.objects.bulk_create([
+            Request.availability.through(request=request, dayoftheweek=day)
+            for request, days in records['availability'] for day in days
+        ])
+        Invoice.objects.bulk_create(records[Invoice])
+        Booking.objects.bulk_create(records[Booking])
+        BankTransaction.objects.bulk_create(records[BankTransaction])
+        StudentLedger.refresh([student.id for student in records[Student]])
+
+    def decide_number_of_children(self):
         # Create a child for 90% of users
-        if randint(0,10) <=9:
-            child = self.create_child_for_user(user,self.faker.first_name(), self.faker.last_name())
-            self.decide_and_create_request_for_random_user(user,child.id)
         # Create a second child for 70% of users (if no child as been created by previous block, it can be the first)
-        if randint(0,10) <=7:
+        return [randint(0,10) <= 9, randint(0,10) <= 7].count(True)
+
+    def decide_request(self):
+        # Create requests for 95% of students in average.
+        return randint(0,20) <= 19
+
+    def decide_fulfilment(self):
+        # Fulfill 90% of requests in average.
+        return randint(0,10) <= 9
+
+    def decide_amount_paid(self, invoice):
+        pay_decider = randint(0,100)
+        # Pay 45% of requests in average.
+        if pay_decider <=45:
+            return invoice.full_amount
+        # Overpay 20% of requests in average.
+        elif pay_decider <=65:
+            return invoice.full_amount + randint(5,100)
+        # Partially pay 20% of requests in average.
+        elif pay_decider <=85:
+            return invoice.full_amount - randint(0,int(invoice.full_amount-1))
+        #NOTE: 15% of requests in average will remain unpaid
+        return None
+
+    def decide_and_create_child_for_random_user(self,user):
+        for _ in range(self.decide_number_of_children()):
             child = self.create_child_for_user(user,self.faker.first_name(), self.faker.last_name())
             self.decide_and_create_request_for_random_user(user,child.id)
 
     def decide_and_create_request_for_random_user(self,random_user,relation_id):
-        # Create requests for 95% of students in average.
-        if randint(0,20) <= 19:
+        if self.decide_request():
                 user_request = self.create_random_request_for_user(random_user,relation_id,False)
                 self.decide_and_fulfill_request_for_random_user(user_request)
 
     def decide_and_fulfill_request_for_random_user(self,request):
-        # Fulfill 90% of requests in average.
-        if randint(0,10) <=9:
+        if self.decide_fulfilment():
             invoice = self._create_booking_for_request_and_return_invoice(request)
             request = Request.objects.get(id=request.id)
             request.fulfilled = True
@@ -137,19 +269,20 @@ class Command(BaseCommand):
             self.decide_and_pay_invoice_for_random_user(invoice)
     
     def decide_and_pay_invoice_for_random_user(self, invoice):
-        pay_decider = randint(0,100)
-        # Pay 45% of requests in average.
-        if pay_decider <=45:
-            self.pay_invoice(invoice)
-        # Overpay 20% of requests in average.
-        elif pay_decider <=65:
-            self.overpay_invoice(invoice)
-        # Partially pay 20% of requests in average.
-        elif pay_decider <=85:
-            self.underpay_invoice(invoice)
-        #NOTE: 15% of requests in average will remain unpaid
+        amount_paid = self.decide_amount_paid(invoice)
+        if amount_paid is not None:
+            self.pay_amount_of_invoice(invoice, amount_paid)
+
+    def _pick_random_availability(self):
+        return sample(self.DAYS_OF_THE_WEEK_INSTANCES, randint(1,len(self.DAYS_OF_THE_WEEK_INSTANCES)-1))
 
     def create_random_request_for_user(self,user,relation_id,is_fulfilled):
+        request = self._build_random_request_for_user(user,relation_id,is_fulfilled)
+        request.save()
+        request.availability.set(self._pick_random_availability())
+        return request
+
+    def _build_random_request_for_user(self,user,relation_id,is_fulfilled):
         _interval_between_lessons=self.TIMES_BETWEEN_LESSONS[randint(0,len(self.TIMES_BETWEEN_LESSONS)-1)],
         term_of_the_lesson = random.choice(list(self.SCHOOL_TERMS))
         _date = pytz.timezone('UTC').localize(datetime.combine(self.faker.date_between(self.SCHOOL_TERMS[term_of_the_lesson][0],self.SCHOOL_TERMS[term_of_the_lesson][1]), datetime.min.time()))
@@ -159,7 +292,7 @@ class Command(BaseCommand):
         _number_of_lessons = 1
         if max_number_of_lessons>=2:
             _number_of_lessons = randint(1,max_number_of_lessons-1)
-        request = Request.objects.create(
+        return Request(
                     user=user,
                     number_of_lessons=_number_of_lessons,
                     interval_between_lessons=_interval_between_lessons[0],
@@ -169,8 +302,6 @@ class Command(BaseCommand):
                     further_information='Lorem ipsum.',
                     date=_date
                     )
-        request.availability.set(sample(self.DAYS_OF_THE_WEEK_INSTANCES, randint(1,len(self.DAYS_OF_THE_WEEK_INSTANCES)-1)))
-        return request
     
 
     def _create_fulfilled_and_paid_request_for_john_doe(self):
@@ -186,9 +317,13 @@ class Command(BaseCommand):
     def _create_booking_for_request_and_return_invoice(self,request):
         price_per_hour=randint(10,20)
         _invoice = self.create_invoice(request,price_per_hour)
-        Booking.objects.create(
-            invoice= _invoice,
-            term_id= self.find_term_from_date(request.date),
+        self._build_booking_for_request(request, _invoice, self.find_term_from_date(request.date)).save()
+        return _invoice
+
+    def _build_booking_for_request(self, request, invoice, term):
+        return Booking(
+            invoice= invoice,
+            term_id= term,
             day_of_the_week= self.DAYS_OF_THE_WEEK_INSTANCES[randint(0,6)],
             time_of_the_day= f"{str(randint(0,11)).zfill(2)}:{str(randint(0,59)).zfill(2)}",
             user= request.user,
@@ -201,28 +336,11 @@ class Command(BaseCommand):
             number_of_lessons= request.number_of_lessons,
             further_information= request.further_information
         )
-        return _invoice
 
     def pay_invoice(self,invoice):
-        amount_paid = invoice.full_amount
-        BankTransaction.objects.create(
-            date = timezone.now(),
-            student = invoice.student,
-            amount = amount_paid,
-            invoice = invoice
-        )
-   
-    def overpay_invoice(self,invoice):
-        amount_paid = invoice.full_amount + randint(5,100)
-        BankTransaction.objects.create(
-            date = timezone.now(),
-            student = invoice.student,
-            amount = amount_paid,
-            invoice = invoice
-        )
+        self.pay_amount_of_invoice(invoice, invoice.full_amount)
 
-    def underpay_invoice(self,invoice):
-        amount_paid = invoice.full_amount - randint(0,int(invoice.full_amount-1))
+    def pay_amount_of_invoice(self, invoice, amount_paid):
         BankTransaction.objects.create(
             date = timezone.now(),
             student = invoice.student,
@@ -250,6 +368,9 @@ class Command(BaseCommand):
 
         return invoice
 
+    def _get_full_amount(self, request, hourly_cost):
+        return (Decimal(hourly_cost * request.number_of_lessons * request.duration_of_lessons) / 60).quantize(Decimal('0.01'))
+
     def generate_invoice_number(self,user):
         invoice_number = ""
         user_id = user.id
@@ -274,5 +395,8 @@ class Command(BaseCommand):
                     term = term_in_list
         return term
 
+    def _find_seeded_term(self, date):
+        return next(term for term in self.school_terms if term.start_date <= date <= term.end_date)
+
     def database_is_empty(self):
         return SchoolTerm.objects.all().count() + DayOfTheWeek.objects.all().count() + Request.objects.all().count() + Student.objects.all().count() + Booking.objects.all().count() + BankTransaction.objects.all().count() + Invoice.objects.all().count() + Child.objects.all().count() == 0
\ No newline at end of file
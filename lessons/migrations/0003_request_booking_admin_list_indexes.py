@@ -0,0 +1,21 @@
+# Generated by Django 4.1.3 on 2026-10-18 20:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0002_alter_booking_number_of_lessons_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['-start_date'], name='booking_start_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['fulfilled', '-date'], name='request_fulfilled_date_idx'),
+        ),
+    ]
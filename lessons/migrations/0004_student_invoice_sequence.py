@@ -0,0 +1,32 @@
+# Generated by Django 4.1.3 on 2026-10-18 20:51
+
+from django.db import migrations, models
+
+
+def backfill_invoice_sequences(apps, schema_editor):
+    Student = apps.get_model('lessons', 'Student')
+    Invoice = apps.get_model('lessons', 'Invoice')
+
+    last_sequences = {}
+    for student_id, invoice_number in Invoice.objects.values_list('student_id', 'invoice_number'):
+        sequence = int(invoice_number.split('-')[-1])
+        last_sequences[student_id] = max(sequence, last_sequences.get(student_id, 0))
+
+    for student_id, sequence in last_sequences.items():
+        Student.objects.filter(pk=student_id).update(invoice_sequence=sequence)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0003_request_booking_admin_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='invoice_sequence',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_invoice_sequences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.1.3 on 2026-10-18 21:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+from decimal import Decimal
+
+
+def backfill_student_ledgers(apps, schema_editor):
+    Student = apps.get_model('lessons', 'Student')
+    Invoice = apps.get_model('lessons', 'Invoice')
+    StudentLedger = apps.get_model('lessons', 'StudentLedger')
+
+    invoice_totals = {
+        totals['student_id']: totals for totals in Invoice.objects.values('student_id')
+        .annotate(invoiced=models.Sum('full_amount'), paid=models.Sum('paid_amount'))
+    }
+
+    ledgers = []
+    for student_id, balance in Student.objects.values_list('id', 'balance'):
+        totals = invoice_totals.get(student_id, {})
+        invoiced = totals.get('invoiced') or Decimal(0)
+        paid = totals.get('paid') or Decimal(0)
+        ledgers.append(StudentLedger(student_id=student_id, invoiced=invoiced, paid=paid,
+                                     outstanding=invoiced - paid, credit_balance=balance))
+    StudentLedger.objects.bulk_create(ledgers)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0004_student_invoice_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentLedger',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ledger', serialize=False, to='lessons.student')),
+                ('invoiced', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('paid', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('outstanding', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('credit_balance', models.DecimalField(decimal_places=2, default=0, max_digits=6)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='studentledger',
+            index=models.Index(fields=['-outstanding'], name='ledger_outstanding_idx'),
+        ),
+        migrations.RunPython(backfill_student_ledgers, migrations.RunPython.noop),
+    ]
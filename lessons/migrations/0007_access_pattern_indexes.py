@@ -0,0 +1,25 @@
+# Generated by Django 4.1.3 on 2026-10-18 21:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0006_booking_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='banktransaction',
+            index=models.Index(fields=['student', '-date'], name='transaction_student_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user', 'relation_id', '-start_date'], name='booking_user_relation_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['user', 'relation_id', '-date'], name='request_user_relation_date_idx'),
+        ),
+    ]
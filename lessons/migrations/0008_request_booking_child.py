@@ -0,0 +1,34 @@
+# Generated by Django 4.1.3 on 2026-10-18 21:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_children(apps, schema_editor):
+    Child = apps.get_model('lessons', 'Child')
+    # Rows whose relation id no longer matches a child keep no child, as a foreign key cannot point to it
+    child_ids = Child.objects.values('id')
+    for model_name in ['Request', 'Booking']:
+        model = apps.get_model('lessons', model_name)
+        model.objects.filter(relation_id__in=child_ids).update(child_id=models.F('relation_id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0007_access_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='child',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='lessons.child'),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='child',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='lessons.child'),
+        ),
+        migrations.RunPython(backfill_children, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.1.3 on 2026-10-18 23:18
+
+import uuid
+from django.db import migrations, models
+
+
+def create_teacher_schedule_version(apps, schema_editor):
+    DataVersion = apps.get_model('lessons', 'DataVersion')
+    DataVersion.objects.create(name='teacher_schedule', version=uuid.uuid4().hex)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0009_bank_transaction_statement_line_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('name', models.CharField(max_length=150, primary_key=True, serialize=False)),
+                ('version', models.CharField(max_length=32)),
+            ],
+        ),
+        migrations.RunPython(create_teacher_schedule_version, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.1.3 on 2026-10-19 00:07
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0010_data_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='invoice',
+            name='invoice_number',
+            field=models.CharField(max_length=16, primary_key=True, serialize=False, unique=True, validators=[django.core.validators.RegexValidator(message='Invoice number must follow the format xxxx-yyy where x is the student number, of at least four digits, and y is the invoice number.', regex='^\\d{4,12}-\\d{3}$')]),
+        ),
+    ]
@@ -1,11 +1,16 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Sum, F, Case, When, Value, OuterRef, Subquery
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, Group
 from django.core.validators import MinValueValidator, MaxValueValidator, RegexValidator
 from django.core.exceptions import ValidationError
 from django.utils import timezone
+from django.utils.functional import cached_property
 from datetime import date, datetime
 from .user_manager import UserManager
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
+
+# Invoice numbers are the student number, padded to four digits, and the number of the invoice of the student
+INVOICE_NUMBER_REGEX = r'^\d{4,12}-\d{3}$'
 
 
 class DayOfTheWeek(models.Model):
@@ -67,11 +72,21 @@ class User(AbstractBaseUser,PermissionsMixin):
         default=timezone.now,
     )
 
+    @cached_property
+    def group_names(self):
+        '''
+        Names of the groups of the user, queried once per instance or taken from a groups prefetch
+        '''
+        return [group.name for group in self.groups.all()]
+
+    def clear_group_cache(self):
+        self.__dict__.pop('group_names', None)
+
     def is_admin(self):
-        return self.groups.exists() and self.groups.all()[0].name == "Admin"
+        return bool(self.group_names) and self.group_names[0] == "Admin"
 
     def is_student(self):
-        return self.groups.exists() and self.groups.all()[0].name == "Student"
+        return bool(self.group_names) and self.group_names[0] == "Student"
     
     def is_admin_or_director(self):
         return self.is_admin() or self.is_superuser
@@ -98,12 +113,15 @@ class User(AbstractBaseUser,PermissionsMixin):
 class Student(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE,related_name='user_record', blank=False)
     balance = models.DecimalField(default=0,max_digits=6, decimal_places=2, blank=False)
+    # Sequence number of the last invoice issued to the student
+    invoice_sequence = models.PositiveIntegerField(default=0, blank=False)
 
     def save(self, *args, **kwargs):
         super(Student, self).save(*args, **kwargs)
-        if (not self.user.groups.exists() or self.user.groups.all()[0].name != "Student"):
+        if not self.user.is_student():
             student_group = Group.objects.get(name='Student')
             student_group.user_set.add(self.user)
+            self.user.clear_group_cache()
 
 
 class SchoolTerm(models.Model):
@@ -139,6 +157,15 @@ class Child(models.Model):
     last_name = models.CharField(max_length=50, blank=False)
 
 
+def get_child_id(relation_id):
+    '''
+    Returns the id of the child a relation id refers to, or None if it refers to the user themself
+    '''
+    if relation_id is None or int(relation_id) == -1:
+        return None
+    return int(relation_id)
+
+
 class Invoice(models.Model):
 
     def clean(self, *args, **kwargs):
@@ -161,11 +188,12 @@ class Invoice(models.Model):
     invoice_number = models.CharField(
         unique=True,
         primary_key=True,
-        max_length=8,
+        max_length=16,
         blank=False,
         validators=[RegexValidator(
-            regex=r'^\d{4}-\d{3}$',
-            message='Invoice number must follow the format xxxx-yyy where x is the student number and y is the invoice number.'
+            regex=INVOICE_NUMBER_REGEX,
+            message='Invoice number must follow the format xxxx-yyy where x is the student number, of at least four '
+                    'digits, and y is the invoice number.'
         )]
     )
     student = models.ForeignKey(Student, blank=False, on_delete=models.CASCADE)
@@ -173,6 +201,64 @@ class Invoice(models.Model):
     paid_amount = models.DecimalField(max_digits=8, decimal_places=2, blank=False, default='0.00')
     fully_paid = models.BooleanField(default=False, blank=False)
 
+    def apply_payment(self, student, amount):
+        '''
+        Applies a payment in memory, crediting any overpayment to the student's balance.
+        Returns True if the invoice is now fully paid, in which case the student has been changed too.
+        '''
+        self.paid_amount = Decimal(self.paid_amount) + Decimal(amount)
+        overpay = Decimal(self.paid_amount) - Decimal(self.full_amount)
+
+        if overpay >= 0:
+            self.fully_paid = True
+            self.paid_amount = self.full_amount
+            student.balance = Decimal(student.balance) + overpay
+            return True
+        return False
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        invoice = super().from_db(db, field_names, values)
+        invoice._ledger_totals = invoice.get_ledger_totals()
+        return invoice
+
+    def get_ledger_totals(self):
+        '''
+        Returns the student, full amount and paid amount of the invoice as they are stored,
+        or None if they are not all known
+        '''
+        if self.get_deferred_fields() & {'student_id', 'full_amount', 'paid_amount'}:
+            return None
+        try:
+            return (self.student_id, *(self._meta.get_field(name).to_python(getattr(self, name)).quantize(Decimal('0.01'))
+                                       for name in ('full_amount', 'paid_amount')))
+        except (AttributeError, TypeError, InvalidOperation, ValidationError):
+            # Amounts set to expressions are only known once they are read again
+            return None
+
+    def update_ledger(self, created=False, deleted=False):
+        '''
+        Adds the change of the amounts of the invoice, since it was read or last saved, to the ledger of its student.
+        The ledger is recomputed instead when the change is not known.
+        '''
+        previous_totals = None if created else getattr(self, '_ledger_totals', None)
+        totals = None if deleted else self.get_ledger_totals()
+        if deleted:
+            previous_totals = previous_totals or self.get_ledger_totals()
+            if previous_totals:
+                StudentLedger.add_to_totals({previous_totals[0]: (-previous_totals[1], -previous_totals[2])})
+            else:
+                StudentLedger.refresh([self.student_id])
+        elif totals is None or (previous_totals is None and not created):
+            StudentLedger.refresh([self.student_id])
+        elif created:
+            StudentLedger.add_to_totals({totals[0]: (totals[1], totals[2])})
+        elif previous_totals[0] != totals[0]:
+            StudentLedger.refresh([previous_totals[0], totals[0]])
+        else:
+            StudentLedger.add_to_totals({totals[0]: (totals[1] - previous_totals[1], totals[2] - previous_totals[2])})
+        self._ledger_totals = totals
+
 
 class Request(models.Model):
     class IntervalBetweenLessons(models.IntegerChoices):
@@ -201,6 +287,19 @@ class Request(models.Model):
     duration_of_lessons = models.PositiveIntegerField(choices=LessonDuration.choices)
     further_information = models.CharField(blank=False, max_length=500)
     fulfilled = models.BooleanField(blank=False, default=False)
+    # The child the lessons are for, or None if they are for the user themself. It is kept in step with
+    # relation_id on save, so that the child can be joined instead of being looked up from relation_id.
+    child = models.ForeignKey(Child, null=True, blank=True, on_delete=models.CASCADE)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fulfilled', '-date'], name='request_fulfilled_date_idx'),
+            models.Index(fields=['user', 'relation_id', '-date'], name='request_user_relation_date_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.child_id = get_child_id(self.relation_id)
+        super(Request, self).save(*args, **kwargs)
 
 
 class Booking(models.Model):
@@ -226,6 +325,124 @@ class Booking(models.Model):
     interval_between_lessons = models.PositiveIntegerField(choices=IntervalBetweenLessons.choices, blank=False)
     number_of_lessons = models.PositiveIntegerField(blank=False, validators=[MinValueValidator(1), MaxValueValidator(1000)])
     further_information = models.CharField(blank=False, max_length=500)
+    # The child the lessons are for, or None if they are for the user themself, kept in step with relation_id
+    child = models.ForeignKey(Child, null=True, blank=True, on_delete=models.CASCADE)
+    # Last change of the booking, used to tell calendar clients whether their copy of a lesson feed is up to date
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-start_date'], name='booking_start_date_idx'),
+            models.Index(fields=['user', 'relation_id', '-start_date'], name='booking_user_relation_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.child_id = get_child_id(self.relation_id)
+        super(Booking, self).save(*args, **kwargs)
+
+
+class StudentLedger(models.Model):
+    '''
+    Running totals of the invoices and payments of a student, kept up to date whenever they change.
+    Changes are added to the totals where invoices are written, and the totals are only recomputed from the invoices
+    when a ledger is missing or a change is not known.
+    '''
+    # Students whose totals are changed by one update, so its parameters stay within the limits of every database
+    UPDATE_BATCH_SIZE = 100
+
+    student = models.OneToOneField(Student, primary_key=True, on_delete=models.CASCADE, related_name='ledger')
+    invoiced = models.DecimalField(default=0, max_digits=10, decimal_places=2, blank=False)
+    paid = models.DecimalField(default=0, max_digits=10, decimal_places=2, blank=False)
+    outstanding = models.DecimalField(default=0, max_digits=10, decimal_places=2, blank=False)
+    credit_balance = models.DecimalField(default=0, max_digits=6, decimal_places=2, blank=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-outstanding'], name='ledger_outstanding_idx'),
+        ]
+
+    @classmethod
+    def refresh(cls, student_ids):
+        '''
+        Recomputes the ledgers of the given students from their invoices and balance
+        '''
+        student_ids = set(student_ids)
+        if not student_ids:
+            return
+
+        invoice_totals = {
+            totals['student_id']: totals for totals in Invoice.objects.filter(student_id__in=student_ids)
+            .values('student_id').annotate(invoiced=Sum('full_amount'), paid=Sum('paid_amount'))
+        }
+        existing_ledger_ids = set(cls.objects.filter(student_id__in=student_ids).values_list('student_id', flat=True))
+
+        new_ledgers = []
+        updated_ledgers = []
+        for student_id, balance in Student.objects.filter(id__in=student_ids).values_list('id', 'balance'):
+            totals = invoice_totals.get(student_id, {})
+            invoiced = totals.get('invoiced') or Decimal(0)
+            paid = totals.get('paid') or Decimal(0)
+            ledger = cls(student_id=student_id, invoiced=invoiced, paid=paid,
+                         outstanding=invoiced - paid, credit_balance=balance)
+            if student_id in existing_ledger_ids:
+                updated_ledgers.append(ledger)
+            else:
+                new_ledgers.append(ledger)
+
+        cls.objects.bulk_create(new_ledgers)
+        cls.objects.bulk_update(updated_ledgers, ['invoiced', 'paid', 'outstanding', 'credit_balance'])
+
+    @classmethod
+    def add_to_totals(cls, changes):
+        '''
+        Adds to the invoiced and paid totals of the ledgers of students, given as {student id: (invoiced, paid)},
+        in the database without reading them. Missing ledgers are created from the invoices instead.
+        '''
+        changes = {student_id: change for student_id, change in changes.items() if any(change)}
+        student_ids = list(changes)
+        for start in range(0, len(student_ids), cls.UPDATE_BATCH_SIZE):
+            batch = student_ids[start:start + cls.UPDATE_BATCH_SIZE]
+
+            def change_of(position):
+                return Case(*[When(student_id=student_id, then=Value(Decimal(changes[student_id][position])))
+                              for student_id in batch],
+                            default=Value(Decimal(0)), output_field=models.DecimalField(max_digits=10, decimal_places=2))
+
+            updated = cls.objects.filter(student_id__in=batch).update(
+                invoiced=F('invoiced') + change_of(0),
+                paid=F('paid') + change_of(1),
+                outstanding=F('outstanding') + change_of(0) - change_of(1)
+            )
+            if updated < len(batch):
+                cls.backfill(batch)
+
+    @classmethod
+    def set_credit_balances(cls, student_ids):
+        '''
+        Copies the stored balances of the given students to their ledgers. Missing ledgers are created instead.
+        '''
+        student_ids = set(student_ids)
+        if not student_ids:
+            return
+        updated = cls.objects.filter(student_id__in=student_ids).update(
+            credit_balance=Subquery(Student.objects.filter(pk=OuterRef('student_id')).values('balance')[:1])
+        )
+        if updated < len(student_ids):
+            cls.backfill(student_ids)
+
+    @classmethod
+    def backfill(cls, student_ids=None):
+        '''
+        Creates the missing ledgers of the given students, or of all students, such as those of students loaded from
+        fixtures or written in bulk. Returns the number of ledgers created.
+        '''
+        students = Student.objects.filter(ledger__isnull=True)
+        if student_ids is not None:
+            students = students.filter(id__in=list(student_ids))
+        missing_ids = list(students.values_list('id', flat=True))
+        for start in range(0, len(missing_ids), cls.UPDATE_BATCH_SIZE):
+            cls.refresh(missing_ids[start:start + cls.UPDATE_BATCH_SIZE])
+        return len(missing_ids)
 
 
 class BankTransaction(models.Model):
@@ -238,20 +455,28 @@ class BankTransaction(models.Model):
     student = models.ForeignKey(Student, blank=False, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=6, decimal_places=2, blank=False)
     invoice = models.ForeignKey(Invoice, blank=False, on_delete=models.CASCADE)
+    # Identifies the bank statement line a transaction was imported from, so that importing it again is skipped
+    statement_line_id = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
 
-    def save(self, *args, **kwargs):
-        super(BankTransaction, self).save(*args, **kwargs)
-        self.invoice.paid_amount = Decimal(self.invoice.paid_amount) + Decimal(self.amount)
-        overpay = Decimal(self.invoice.paid_amount) - Decimal(self.invoice.full_amount)
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', '-date'], name='transaction_student_date_idx'),
+        ]
 
-        if overpay >= 0:
-            self.invoice.fully_paid = True
-            self.invoice.paid_amount = self.invoice.full_amount
-            self.student.balance = Decimal(self.student.balance) + overpay
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super(BankTransaction, self).save(*args, **kwargs)
+            if self.invoice.apply_payment(self.student, self.amount):
+                self.invoice.save()
+                self.student.save()
+                return
             self.invoice.save()
-            self.student.save()
-            return
-        self.invoice.save()
-
 
 
+class DataVersion(models.Model):
+    '''
+    Version of data that processes keep in memory, changed in the transactions that change the data.
+    Names may end with the key of the part of the data they version, such as the name of a teacher.
+    '''
+    name = models.CharField(max_length=150, primary_key=True)
+    version = models.CharField(max_length=32, blank=False)
@@ -0,0 +1,111 @@
+import logging
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# Most queries each page may run when it is displayed, however much data there is, keyed by the name of its url.
+# A page over its budget most likely queries the database once per row it displays. Budgets leave room for the
+# term and teacher schedule indexes, which are loaded by the first page of a process that needs them.
+QUERY_BUDGETS = {
+    'home': 3,
+    'log_in': 3,
+    'sign_up': 3,
+    'student_page': 10,
+    'request_list': 8,
+    'booking_list': 8,
+    'request_view': 11,
+    'booking_view': 13,
+    'invoice_view': 10,
+    'new_request_view': 8,
+    'children_list': 8,
+    'child_page': 10,
+    'child_view': 9,
+    'child_request_list': 9,
+    'child_booking_list': 9,
+    'new_child_view': 7,
+    'lesson_list_student': 9,
+    'lesson_list_child': 9,
+    'lesson_calendar_feed': 5,
+    'transaction_list_student': 9,
+    'invoice_list_student': 9,
+    'student_term_view': 8,
+    'profile': 7,
+    'change_password': 5,
+    'admin_page': 8,
+    'lesson_list_admin': 6,
+    'transaction_admin_view': 5,
+    'transaction_import_view': 5,
+    'transaction_list_admin': 6,
+    'balance_list_admin': 6,
+    'invoice_list_admin': 6,
+    'admin_request_list': 9,
+    'admin_booking_list': 7,
+    'export_csv': 6,
+    'fulfil_request': 9,
+    'propose_timetable_view': 7,
+    'admin_term_view': 6,
+    'term_view': 7,
+    'new_term_view': 5,
+    'term_deletion_confirmation_view': 5,
+    'admin_user_list': 7,
+    'create_admin_user': 5,
+    'create_director_user': 5,
+}
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryRecorder:
+    '''
+    Execute wrapper of a database connection that records the SQL of every query it runs
+    '''
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+
+def get_query_budget(url_name):
+    return QUERY_BUDGETS.get(url_name)
+
+
+def check_query_budget(url_name, queries):
+    '''
+    Reports a page that ran more queries than its budget, by raising QueryBudgetExceeded if the
+    QUERY_BUDGETS_RAISE setting is true, or by logging a warning otherwise
+    '''
+    budget = get_query_budget(url_name)
+    if budget is None or len(queries) <= budget:
+        return
+
+    message = f'{url_name} ran {len(queries)} queries, over its budget of {budget}'
+    if getattr(settings, 'QUERY_BUDGETS_RAISE', False):
+        raise QueryBudgetExceeded(message + ':\n' + '\n'.join(queries))
+    logger.warning(message)
+
+
+class QueryBudgetMiddleware:
+    '''
+    Records the queries run by each page displayed, and checks them against the budget of its url.
+    Only used if the QUERY_BUDGETS_ENABLED setting is true, by default when DEBUG is.
+    '''
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGETS_ENABLED', settings.DEBUG):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+
+        # Forms that are submitted change data, so only the pages that are displayed have a budget
+        if request.method in ('GET', 'HEAD') and request.resolver_match is not None:
+            check_query_budget(request.resolver_match.url_name, recorder.queries)
+        return response
@@ -0,0 +1,60 @@
+from django.db import connection
+from .models import User, Student, BankTransaction
+from .views_functions import get_request_objects, get_booking_objects
+
+# Vendors of the databases whose plans are understood, as every database describes its plans differently
+SUPPORTED_VENDORS = ['sqlite']
+
+
+class HotQuery:
+    '''
+    A query run on every visit of a page, with the index it must use to stay fast as its table grows
+    '''
+    def __init__(self, name, get_queryset, index_name):
+        self.name = name
+        self.get_queryset = get_queryset
+        self.index_name = index_name
+
+
+def get_hot_queries():
+    # Unsaved objects are enough to build the queries, as only their primary keys are used.
+    # The terms are read from the reference data cache rather than queried on every visit.
+    user = User(id=1)
+    student = Student(id=1)
+    return [
+        HotQuery('requests of a student', lambda: get_request_objects(user, -1), 'request_user_relation_date_idx'),
+        HotQuery('requests of a child', lambda: get_request_objects(user, 1), 'request_user_relation_date_idx'),
+        HotQuery('bookings of a student', lambda: get_booking_objects(user, -1), 'booking_user_relation_idx'),
+        HotQuery('bookings of a child', lambda: get_booking_objects(user, 1), 'booking_user_relation_idx'),
+        HotQuery('transactions of a student',
+                 lambda: BankTransaction.objects.filter(student=student).order_by('-date'),
+                 'transaction_student_date_idx'),
+    ]
+
+
+class QueryPlan:
+    def __init__(self, query, plan):
+        self.query = query
+        self.plan = plan
+
+    @property
+    def uses_index(self):
+        return self.query.index_name in self.plan
+
+    @property
+    def sorts_rows(self):
+        '''
+        Whether the database sorts the matching rows itself rather than reading them in the order of an index,
+        which SQLite plans as a temporary B-tree
+        '''
+        return 'TEMP B-TREE' in self.plan.upper()
+
+
+def can_explain_hot_queries():
+    return connection.vendor in SUPPORTED_VENDORS
+
+def explain_hot_queries():
+    '''
+    Returns the plan the database chooses for each of the hot queries
+    '''
+    return [QueryPlan(query, query.get_queryset().explain()) for query in get_hot_queries()]
@@ -0,0 +1,166 @@
+import uuid
+from django import forms
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.forms.models import ModelChoiceIterator
+
+REFERENCE_DATA_KEY_PREFIX = 'reference_data'
+
+
+def get_reference_data_timeout():
+    '''
+    Returns how long the rows of reference data are cached for in seconds, which is how long a process may keep
+    using them after another process changed them when the cache is not shared between processes
+    '''
+    return getattr(settings, 'REFERENCE_DATA_TIMEOUT', 60)
+
+
+class ReferenceData:
+    '''
+    Read-through cache of all the rows of a small table that rarely changes, such as the school terms.
+    The rows are stored in the default cache under a version stamp, which changes whenever a row is saved or deleted
+    and expires after the reference data timeout, and each process keeps the rows of the latest version it read in
+    memory.
+    '''
+    def __init__(self, model_label):
+        self.model_label = model_label
+        self._version = None
+        self._rows = None
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    def get_version_key(self):
+        return f'{REFERENCE_DATA_KEY_PREFIX}:{self.model_label}:version'
+
+    def get_rows_key(self, version):
+        return f'{REFERENCE_DATA_KEY_PREFIX}:{self.model_label}:{version}'
+
+    def get_version(self):
+        version = cache.get(self.get_version_key())
+        if version is None:
+            # A new random stamp, rather than a counter starting again, so that an expired stamp never matches
+            # the rows stored before it expired
+            version = uuid.uuid4().hex
+            cache.set(self.get_version_key(), version, get_reference_data_timeout())
+        return version
+
+    def all(self):
+        '''
+        Returns all the rows of the table in its default order, reading them from the database only when their
+        version has changed or expired since they were last read
+        '''
+        # The version is read before the rows, so rows read before a change are never stored under a later version
+        version = self.get_version()
+        if version != self._version:
+            rows = cache.get(self.get_rows_key(version))
+            if rows is None:
+                rows = list(self.model.objects.all())
+                cache.set(self.get_rows_key(version), rows, get_reference_data_timeout())
+            self._version, self._rows = version, rows
+        return self._rows
+
+    def get(self, pk):
+        '''
+        Returns the row with the given primary key, or None if there is no such row
+        '''
+        return next((row for row in self.all() if str(row.pk) == str(pk)), None)
+
+    def clear(self):
+        version = cache.get(self.get_version_key())
+        if version is not None:
+            cache.delete_many([self.get_version_key(), self.get_rows_key(version)])
+        self._version, self._rows = None, None
+
+    def invalidate(self):
+        '''
+        Changes the version of the rows, so that they are read again from the database.
+        The version changes again once the change is committed, as rows read before the commit may have been cached
+        under the version in between.
+        '''
+        self.clear()
+        transaction.on_commit(self.clear)
+
+
+SCHOOL_TERMS = ReferenceData('lessons.SchoolTerm')
+DAYS_OF_THE_WEEK = ReferenceData('lessons.DayOfTheWeek')
+
+def get_school_terms():
+    return SCHOOL_TERMS.all()
+
+def get_days_of_the_week():
+    return DAYS_OF_THE_WEEK.all()
+
+def invalidate_school_terms():
+    SCHOOL_TERMS.invalidate()
+
+def invalidate_days_of_the_week():
+    DAYS_OF_THE_WEEK.invalidate()
+
+
+class ReferenceDataChoiceIterator(ModelChoiceIterator):
+    '''
+    Iterates over the choices of a reference data field from the cached rows, instead of querying them
+    '''
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        for row in self.field.reference_data.all():
+            yield self.choice(row)
+
+    def __len__(self):
+        return len(self.field.reference_data.all()) + (1 if self.field.empty_label is not None else 0)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.field.reference_data.all())
+
+
+class ReferenceDataChoiceField(forms.ModelChoiceField):
+    '''
+    Choice of a row of reference data, rendered and validated from the cached rows
+    '''
+    iterator = ReferenceDataChoiceIterator
+
+    def __init__(self, reference_data, **kwargs):
+        self.reference_data = reference_data
+        super().__init__(queryset=reference_data.model.objects.all(), **kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if isinstance(value, self.reference_data.model):
+            value = value.pk
+        row = self.reference_data.get(value)
+        if row is None:
+            raise forms.ValidationError(self.error_messages['invalid_choice'], code='invalid_choice',
+                                        params={'value': value})
+        return row
+
+
+class ReferenceDataMultipleChoiceField(forms.ModelMultipleChoiceField):
+    '''
+    Choice of several rows of reference data, rendered and validated from the cached rows.
+    Cleans to a list of rows rather than a queryset.
+    '''
+    iterator = ReferenceDataChoiceIterator
+
+    def __init__(self, reference_data, **kwargs):
+        self.reference_data = reference_data
+        super().__init__(queryset=reference_data.model.objects.all(), **kwargs)
+
+    def _check_values(self, value):
+        try:
+            value = frozenset(value)
+        except TypeError:
+            raise forms.ValidationError(self.error_messages['invalid_list'], code='invalid_list')
+        rows = []
+        for pk in value:
+            row = self.reference_data.get(pk)
+            if row is None:
+                raise forms.ValidationError(self.error_messages['invalid_choice'], code='invalid_choice',
+                                            params={'value': pk})
+            rows.append(row)
+        return sorted(rows, key=self.reference_data.all().index)
@@ -0,0 +1,185 @@
+import cProfile
+import logging
+import os
+import pstats
+import random
+import time
+import uuid
+from collections import defaultdict
+from django.conf import settings
+from django.db import connection
+from django.template.base import Template
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PROFILE_QUERY_FLAG = 'profile'
+PROFILE_HEADER = 'X-Profile'
+# Stacks are cut short at this depth, and branches of less time than this are left out of the collapsed stacks
+MAX_STACK_DEPTH = 120
+MIN_STACK_MICROSECONDS = 50
+
+_TEMPLATE_RENDER_CODE = Template.render.__code__
+TEMPLATE_RENDER_FUNCTION = (_TEMPLATE_RENDER_CODE.co_filename, _TEMPLATE_RENDER_CODE.co_firstlineno,
+                            _TEMPLATE_RENDER_CODE.co_name)
+
+
+class SqlTimer:
+    '''
+    Execute wrapper of a database connection that adds up the time spent running queries
+    '''
+    def __init__(self):
+        self.seconds = 0
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+def get_function_name(function):
+    '''
+    Returns the name of a function of a cProfile run, as a frame of a collapsed stack
+    '''
+    filename, line, name = function
+    if filename == '~':
+        return name
+    # Paths are shortened to the package or the project they belong to
+    for root in ('site-packages' + os.sep, str(settings.BASE_DIR) + os.sep, os.path.dirname(os.__file__) + os.sep):
+        if root in filename:
+            filename = filename.split(root, 1)[1]
+            break
+    return f'{name} ({filename}:{line})'.replace(';', ',')
+
+
+def get_collapsed_stacks(stats):
+    '''
+    Returns the time of each stack of a cProfile run in microseconds, keyed by its frames joined by semicolons,
+    as read by flamegraph tools. cProfile only records which function called which, so the time of a function
+    is split between its callers in proportion to the time each caller spent in it.
+    '''
+    entries = stats.stats
+    callees = defaultdict(dict)
+    for function, (_, _, _, _, callers) in entries.items():
+        for caller, (_, _, _, time_from_caller) in callers.items():
+            callees[caller][function] = time_from_caller
+
+    stacks = defaultdict(float)
+
+    def add_stack(function, frames, functions, share):
+        _, _, own_time, total_time, _ = entries[function]
+        frames = frames + [get_function_name(function)]
+        stacks[';'.join(frames)] += own_time * share * 1e6
+        if len(frames) >= MAX_STACK_DEPTH:
+            return
+        for callee, time_from_caller in callees[function].items():
+            callee_total_time = entries[callee][3]
+            # Recursive calls are already counted in the time of the outermost call
+            if callee in functions or not callee_total_time or time_from_caller * share * 1e6 < MIN_STACK_MICROSECONDS:
+                continue
+            add_stack(callee, frames, functions | {callee}, share * time_from_caller / callee_total_time)
+
+    for function, entry in entries.items():
+        if not entry[4]:
+            add_stack(function, [], {function}, 1)
+
+    return {stack: round(microseconds) for stack, microseconds in stacks.items() if round(microseconds) > 0}
+
+
+class RequestProfile:
+    '''
+    The cProfile run of a request, with the time it spent running queries and rendering templates
+    '''
+    def __init__(self, profiler, total_seconds, sql_timer):
+        self.stats = pstats.Stats(profiler)
+        self.total_seconds = total_seconds
+        self.sql_seconds = sql_timer.seconds
+        self.queries = sql_timer.queries
+        # Templates render others through Template.render, whose outermost calls cProfile times as a whole.
+        # The queries of querysets evaluated by templates are counted in both.
+        template_render = self.stats.stats.get(TEMPLATE_RENDER_FUNCTION)
+        self.template_seconds = template_render[3] if template_render else 0
+
+    @property
+    def python_seconds(self):
+        return self.total_seconds - self.sql_seconds
+
+    def get_server_timing(self):
+        '''
+        Returns the timings of the request as a Server-Timing header, which browsers show with the request
+        '''
+        return ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in [
+            ('total', self.total_seconds), ('sql', self.sql_seconds), ('python', self.python_seconds),
+            ('template', self.template_seconds)
+        ])
+
+    def save(self, directory, name):
+        '''
+        Writes the collapsed stacks of the request for flamegraph tools, and its cProfile stats for pstats viewers.
+        Returns the path of the collapsed stacks.
+        '''
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, name)
+        with open(f'{path}.collapsed', 'w') as collapsed_file:
+            for stack, microseconds in sorted(get_collapsed_stacks(self.stats).items()):
+                collapsed_file.write(f'{stack} {microseconds}\n')
+        self.stats.dump_stats(f'{path}.prof')
+        return f'{path}.collapsed'
+
+
+def get_profiling_sample_rate():
+    '''
+    Returns the share of requests that are profiled, 0 if only requests that ask for it are
+    '''
+    return getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+
+
+def get_profiling_output_dir():
+    return getattr(settings, 'PROFILING_OUTPUT_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+
+
+def should_profile(request):
+    '''
+    Returns whether to profile a request: either it is sampled, or an admin or director asked for it
+    with the profile query flag or the X-Profile header
+    '''
+    if request.GET.get(PROFILE_QUERY_FLAG) or request.headers.get(PROFILE_HEADER):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated and user.is_admin_or_director():
+            return True
+    sample_rate = get_profiling_sample_rate()
+    return sample_rate > 0 and random.random() < sample_rate
+
+
+class ProfilingMiddleware:
+    '''
+    Profiles the requests that are sampled or ask for it, writing a collapsed stack file for each of them
+    '''
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not should_profile(request):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        sql_timer = SqlTimer()
+        start = time.perf_counter()
+        with connection.execute_wrapper(sql_timer):
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        profile = RequestProfile(profiler, time.perf_counter() - start, sql_timer)
+
+        url_name = request.resolver_match.url_name if request.resolver_match else 'unresolved'
+        name = f'{timezone.now():%Y%m%d-%H%M%S}-{url_name}-{uuid.uuid4().hex[:8]}'
+        path = profile.save(get_profiling_output_dir(), name)
+        response['Server-Timing'] = profile.get_server_timing()
+        logger.info(f'Profiled {request.path} in {path}: {profile.get_server_timing()}')
+        return response
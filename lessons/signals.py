@@ -0,0 +1,93 @@
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from .models import SchoolTerm, DayOfTheWeek, User, Student, Invoice, StudentLedger, Request, Booking, BankTransaction
+from .student_dashboard import invalidate_student_dashboard, get_student_dashboard_cache_timeout
+from .term_index import invalidate_term_index
+from .fragment_cache import invalidate_term_fragments
+from .reference_data import invalidate_school_terms, invalidate_days_of_the_week
+from .teacher_schedule import update_teacher_schedule, start_deleting_bookings, remove_from_teacher_schedule
+
+
+@receiver([post_save, post_delete], sender=SchoolTerm)
+def school_term_changed(sender, **kwargs):
+    invalidate_school_terms()
+    invalidate_term_index()
+    invalidate_term_fragments()
+
+
+@receiver([post_save, post_delete], sender=DayOfTheWeek)
+def day_of_the_week_changed(sender, **kwargs):
+    invalidate_days_of_the_week()
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, **kwargs):
+    if isinstance(instance, User):
+        instance.clear_group_cache()
+
+
+@receiver(post_save, sender=Student)
+def student_changed(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if created:
+        StudentLedger.refresh([instance.pk])
+    elif update_fields is None or 'balance' in update_fields:
+        StudentLedger.set_credit_balances([instance.pk])
+
+
+@receiver(post_save, sender=Invoice)
+def invoice_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        instance.update_ledger(created=created)
+
+
+@receiver(post_delete, sender=Invoice)
+def invoice_deleted(sender, instance, origin=None, **kwargs):
+    # Deleting a student or user also deletes their ledger, so it must not be recreated here
+    origin_model = getattr(origin, 'model', type(origin))
+    if origin_model not in (Student, User):
+        instance.update_ledger(deleted=True)
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    invalidate_student_dashboard(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Request)
+@receiver([post_save, post_delete], sender=Booking)
+def user_request_or_booking_changed(sender, instance, **kwargs):
+    invalidate_student_dashboard(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Student)
+def student_balance_changed(sender, instance, **kwargs):
+    invalidate_student_dashboard(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Invoice)
+@receiver([post_save, post_delete], sender=BankTransaction)
+def student_invoice_or_transaction_changed(sender, instance, **kwargs):
+    if not get_student_dashboard_cache_timeout():
+        return
+    user_id = Student.objects.filter(pk=instance.student_id).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        invalidate_student_dashboard(user_id)
+
+
+@receiver(post_save, sender=Booking)
+def booking_saved(sender, instance, **kwargs):
+    update_teacher_schedule([instance.id])
+
+
+@receiver(pre_delete, sender=Booking)
+def booking_deleting(sender, instance, origin=None, **kwargs):
+    start_deleting_bookings(origin)
+
+
+@receiver(post_delete, sender=Booking)
+def booking_deleted(sender, instance, origin=None, **kwargs):
+    # Bookings deleted in a cascade each send this signal, so they are removed without reading them, and the stored
+    # version of each teacher is only changed for the first of their bookings
+    remove_from_teacher_schedule([instance], origin)
@@ -0,0 +1,207 @@
+import csv
+import datetime
+import hashlib
+import re
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from .models import BankTransaction, Invoice, Student, StudentLedger
+from .student_dashboard import invalidate_student_dashboards
+
+INVOICE_NUMBER_PATTERN = re.compile(r'\b\d{4,12}-\d{3}\b')
+OFX_FIELD_PATTERN = re.compile(r'<(\w+)>([^<\r\n]*)')
+BULK_BATCH_SIZE = 1000
+
+
+class StatementLine:
+    def __init__(self, line_number, date, amount, invoice_number, reference):
+        self.line_number = line_number
+        self.date = date
+        self.amount = amount
+        self.invoice_number = invoice_number
+        # The reference the bank gave the line, or its description if the bank gave it no identifier
+        self.reference = reference
+        self.line_id = None
+
+
+class StatementImportResult:
+    def __init__(self):
+        self.imported = 0
+        # (line number, reason) for every statement line that was not imported
+        self.rejected = []
+
+    def reject(self, line_number, reason):
+        self.rejected.append((line_number, reason))
+
+
+def _parse_date(value):
+    for date_format in ('%Y-%m-%d', '%d/%m/%Y', '%Y%m%d'):
+        try:
+            return datetime.datetime.strptime(value.strip(), date_format).date()
+        except ValueError:
+            continue
+    return None
+
+def _parse_amount(value):
+    try:
+        return Decimal(value.strip().replace(',', ''))
+    except InvalidOperation:
+        return None
+
+def _find_invoice_number(*texts):
+    for text in texts:
+        match = INVOICE_NUMBER_PATTERN.search(text or '')
+        if match:
+            return match.group()
+    return None
+
+def _statement_line(line_number, date, amount, reference, result, bank_reference=None):
+    '''
+    Builds a statement line from raw values, or records why it is rejected and returns None
+    '''
+    parsed_date = _parse_date(date or '')
+    parsed_amount = _parse_amount(amount or '')
+    invoice_number = _find_invoice_number(reference)
+
+    if parsed_date is None:
+        result.reject(line_number, 'Invalid date.')
+    elif parsed_amount is None:
+        result.reject(line_number, 'Invalid amount.')
+    elif parsed_amount <= 0:
+        result.reject(line_number, 'Not a payment.')
+    elif invoice_number is None:
+        result.reject(line_number, 'No invoice number in the reference.')
+    else:
+        return StatementLine(line_number, parsed_date, parsed_amount, invoice_number,
+                             ' '.join((bank_reference or reference or '').split()))
+    return None
+
+def set_statement_line_ids(statement_lines):
+    '''
+    Identifies each statement line by its date, amount and reference, which stay the same when a statement, or
+    statements that overlap, are imported again. Identical lines of one statement are told apart by their order.
+    '''
+    occurrences = {}
+    for statement_line in statement_lines:
+        key = (statement_line.date.isoformat(), str(statement_line.amount.quantize(Decimal('0.01'))),
+               statement_line.reference)
+        occurrences[key] = occurrences.get(key, 0) + 1
+        statement_line.line_id = hashlib.sha256('|'.join([*key, str(occurrences[key])]).encode()).hexdigest()
+
+def get_imported_line_ids(line_ids):
+    imported_line_ids = set()
+    line_ids = list(line_ids)
+    for start in range(0, len(line_ids), BULK_BATCH_SIZE):
+        imported_line_ids.update(BankTransaction.objects.filter(
+            statement_line_id__in=line_ids[start:start + BULK_BATCH_SIZE]
+        ).values_list('statement_line_id', flat=True))
+    return imported_line_ids
+
+def parse_csv_statement(lines, result):
+    '''
+    Lazily parses a CSV bank statement with date, amount and reference columns
+    '''
+    for line_number, row in enumerate(csv.DictReader(lines), start=2):
+        row = {(key or '').strip().lower(): value for key, value in row.items()}
+        statement_line = _statement_line(line_number, row.get('date'), row.get('amount'), row.get('reference'), result)
+        if statement_line:
+            yield statement_line
+
+def parse_ofx_statement(lines, result):
+    '''
+    Lazily parses the STMTTRN records of an OFX bank statement
+    '''
+    fields = None
+    for line_number, line in enumerate(lines, start=1):
+        for tag, value in OFX_FIELD_PATTERN.findall(line):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                fields = {'line_number': line_number}
+            elif fields is not None:
+                fields[tag] = value.strip()
+
+        if fields is not None and '</STMTTRN>' in line.upper():
+            # OFX dates may carry a time and a timezone after the YYYYMMDD date
+            statement_line = _statement_line(fields['line_number'], fields.get('DTPOSTED', '')[:8], fields.get('TRNAMT'),
+                                             ' '.join([fields.get('MEMO', ''), fields.get('NAME', '')]), result,
+                                             fields.get('FITID'))
+            fields = None
+            if statement_line:
+                yield statement_line
+
+def parse_statement(lines, statement_format, result):
+    '''
+    Lazily parses the lines of a bank statement in the given format ('csv' or 'ofx')
+    '''
+    if statement_format == 'ofx':
+        return parse_ofx_statement(lines, result)
+    return parse_csv_statement(lines, result)
+
+def get_statement_format(file_name):
+    '''
+    Guesses the format of a bank statement from its file name
+    '''
+    if file_name.lower().endswith(('.ofx', '.qfx')):
+        return 'ofx'
+    return 'csv'
+
+def import_bank_statement(lines, statement_format='csv'):
+    '''
+    Imports the payments of a bank statement, matching them to invoices by the invoice number in their reference.
+    All payments are applied in memory and written in bulk inside a single transaction.
+    Lines that were already imported, from this or an earlier statement, are skipped.
+    '''
+    result = StatementImportResult()
+    today = datetime.date.today()
+    statement_lines = []
+    for statement_line in parse_statement(lines, statement_format, result):
+        if statement_line.date > today:
+            result.reject(statement_line.line_number, 'Date is in the future.')
+        else:
+            statement_lines.append(statement_line)
+    set_statement_line_ids(statement_lines)
+
+    with transaction.atomic():
+        imported_line_ids = get_imported_line_ids(statement_line.line_id for statement_line in statement_lines)
+        invoices = Invoice.objects.select_for_update().in_bulk(
+            {statement_line.invoice_number for statement_line in statement_lines}
+        )
+        students = Student.objects.select_for_update().in_bulk(
+            {invoice.student_id for invoice in invoices.values()}
+        )
+        paid_before = {invoice.pk: invoice.paid_amount for invoice in invoices.values()}
+        student_balances_before = {student.pk: student.balance for student in students.values()}
+
+        transactions = []
+        for statement_line in statement_lines:
+            if statement_line.line_id in imported_line_ids:
+                result.reject(statement_line.line_number, 'Already imported.')
+                continue
+            invoice = invoices.get(statement_line.invoice_number)
+            if invoice is None:
+                result.reject(statement_line.line_number, f'Invoice {statement_line.invoice_number} does not exist.')
+                continue
+
+            student = students[invoice.student_id]
+            invoice.apply_payment(student, statement_line.amount)
+            transactions.append(BankTransaction(
+                date=statement_line.date,
+                student=student,
+                amount=statement_line.amount,
+                invoice=invoice,
+                statement_line_id=statement_line.line_id
+            ))
+
+        BankTransaction.objects.bulk_create(transactions, batch_size=BULK_BATCH_SIZE)
+        Invoice.objects.bulk_update(invoices.values(), ['paid_amount', 'fully_paid'], batch_size=BULK_BATCH_SIZE)
+        Student.objects.bulk_update(students.values(), ['balance'], batch_size=BULK_BATCH_SIZE)
+        paid = {}
+        for invoice in invoices.values():
+            paid[invoice.student_id] = paid.get(invoice.student_id, 0) + invoice.paid_amount - paid_before[invoice.pk]
+        StudentLedger.add_to_totals({student_id: (0, amount) for student_id, amount in paid.items()})
+        StudentLedger.set_credit_balances(student.pk for student in students.values()
+                                          if student.balance != student_balances_before[student.pk])
+        invalidate_student_dashboards(student.user_id for student in students.values())
+
+    result.imported = len(transactions)
+    result.rejected.sort()
+    return result
@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.core.cache import cache
+from .models import Request, Booking, Invoice, BankTransaction, Student
+from .views_functions import get_full_names_for_clients, format_request_for_display, format_booking_for_display
+
+DASHBOARD_SECTION_SIZE = 5
+DASHBOARD_CACHE_KEY_PREFIX = 'student_dashboard'
+
+
+class StudentDashboard:
+    '''
+    Snapshot of the most recent requests, bookings, invoices and transactions of a user, and their balance
+    '''
+    def __init__(self, requests, bookings, invoices, transactions, balance):
+        self.requests = requests
+        self.bookings = bookings
+        self.invoices = invoices
+        self.transactions = transactions
+        self.balance = balance
+
+
+def get_student_dashboard_cache_key(user_id):
+    return f'{DASHBOARD_CACHE_KEY_PREFIX}:{user_id}'
+
+def get_student_dashboard_cache_timeout():
+    '''
+    Returns how long dashboards are cached for in seconds, 0 if they are not cached
+    '''
+    return getattr(settings, 'STUDENT_DASHBOARD_CACHE_TIMEOUT', 0)
+
+def invalidate_student_dashboards(user_ids):
+    '''
+    Removes the cached dashboards of the given users
+    '''
+    if get_student_dashboard_cache_timeout():
+        cache.delete_many([get_student_dashboard_cache_key(user_id) for user_id in set(user_ids)])
+
+def invalidate_student_dashboard(user_id):
+    invalidate_student_dashboards([user_id])
+
+def build_student_dashboard(user, count=DASHBOARD_SECTION_SIZE):
+    '''
+    Queries the latest count rows of each section of the dashboard of a user,
+    resolving all student names with one batch of queries
+    '''
+    student = Student.objects.filter(user=user).only('id', 'balance').first()
+
+    requests = list(Request.objects.filter(user=user, relation_id=-1).select_related('user', 'child').order_by('-date')[:count])
+    bookings = list(Booking.objects.filter(user=user, relation_id=-1).select_related('day_of_the_week', 'user', 'child')
+                    .order_by('-start_date')[:count])
+    invoices = []
+    transactions = []
+    if student:
+        invoices = list(Invoice.objects.filter(student=student).select_related('student__user')
+                        .order_by('-invoice_number')[:count])
+        transactions = list(BankTransaction.objects.filter(student=student).select_related('student__user', 'invoice')
+                            .order_by('-date')[:count])
+
+    student_names = get_full_names_for_clients(requests + bookings)
+    return StudentDashboard(
+        requests=[format_request_for_display(request, student_names) for request in requests],
+        bookings=[format_booking_for_display(booking, student_names) for booking in bookings],
+        invoices=invoices,
+        transactions=transactions,
+        balance=student.balance if student else None
+    )
+
+def get_student_dashboard(user):
+    '''
+    Returns the dashboard of a user, from the cache if dashboards are cached
+    '''
+    timeout = get_student_dashboard_cache_timeout()
+    if not timeout:
+        return build_student_dashboard(user)
+
+    cache_key = get_student_dashboard_cache_key(user.id)
+    dashboard = cache.get(cache_key)
+    if dashboard is None:
+        dashboard = build_student_dashboard(user)
+        cache.set(cache_key, dashboard, timeout)
+    return dashboard
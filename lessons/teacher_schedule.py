@@ -0,0 +1,287 @@
+import datetime
+import math
+import threading
+import uuid
+from bisect import bisect_left, bisect_right
+from functools import reduce
+from operator import or_
+from django.db.models import Q, Case, When, Value
+from .models import Booking, DataVersion
+
+MAX_LESSON_DURATION = max(Booking.LessonDuration.values)
+TEACHER_SCHEDULE_VERSION = 'teacher_schedule'
+# Number of teachers whose stored versions are changed by each query
+VERSION_BATCH_SIZE = 100
+
+
+class ScheduledSlot:
+    '''
+    The time slot a booking occupies, in minutes since midnight, on the dates of its lessons
+    '''
+    def __init__(self, booking_id, start_minute, end_minute, start_date, interval_between_lessons, number_of_lessons):
+        self.booking_id = booking_id
+        self.start_minute = start_minute
+        self.end_minute = end_minute
+        self.start_date = start_date
+        self.interval_between_lessons = interval_between_lessons
+        self.number_of_lessons = number_of_lessons
+
+    def __lt__(self, other):
+        return (self.start_minute, self.booking_id) < (other.start_minute, other.booking_id)
+
+    def overlaps(self, start_minute, end_minute, start_date, interval_between_lessons, number_of_lessons):
+        return (self.start_minute < end_minute and start_minute < self.end_minute
+                and have_lesson_on_the_same_date(self.start_date, self.interval_between_lessons, self.number_of_lessons,
+                                                 start_date, interval_between_lessons, number_of_lessons))
+
+
+def get_teacher_key(teacher):
+    return ' '.join(teacher.split()).lower()
+
+def get_slot_minutes(time_of_the_day, duration_of_lessons):
+    start_minute = time_of_the_day.hour * 60 + time_of_the_day.minute
+    return start_minute, start_minute + duration_of_lessons
+
+def get_last_lesson_date(start_date, interval_between_lessons, number_of_lessons):
+    return start_date + datetime.timedelta(days=interval_between_lessons * (number_of_lessons - 1))
+
+def have_lesson_on_the_same_date(first_start_date, first_interval, first_number_of_lessons,
+                                 second_start_date, second_interval, second_number_of_lessons):
+    '''
+    Returns whether two series of lessons, each every interval days from its start date, have a lesson on the same date
+    '''
+    start_date = max(first_start_date, second_start_date)
+    last_date = min(get_last_lesson_date(first_start_date, first_interval, first_number_of_lessons),
+                    get_last_lesson_date(second_start_date, second_interval, second_number_of_lessons))
+    if start_date > last_date:
+        return False
+
+    # The first lesson of the first series on or after the start date, then the following lessons until their
+    # distance to the start of the second series has taken every value it can modulo its interval
+    first_index = -(-(start_date - first_start_date).days // first_interval)
+    for index in range(first_index, first_index + second_interval // math.gcd(first_interval, second_interval)):
+        lesson_date = first_start_date + datetime.timedelta(days=first_interval * index)
+        if lesson_date > last_date:
+            return False
+        if (lesson_date - second_start_date).days % second_interval == 0:
+            return True
+    return False
+
+
+class TeacherScheduleIndex:
+    '''
+    In-memory index of the weekly slots occupied by each teacher on each day of the week.
+    The slots of a teacher and day are kept sorted by start time, and as no lesson is longer than
+    MAX_LESSON_DURATION only the slots starting within that long before a lesson ends can overlap it,
+    which a binary search finds without looking at the other slots.
+    '''
+    def __init__(self, bookings=()):
+        # (teacher key, day) -> slots sorted by start minute, and their start minutes for bisection
+        self.slots = {}
+        self.start_minutes = {}
+        # booking id -> (teacher key, day) and slot of the booking
+        self.booking_slots = {}
+        for booking in bookings:
+            self.add(*booking)
+
+    def add(self, booking_id, teacher, day, time_of_the_day, duration_of_lessons,
+            start_date, interval_between_lessons, number_of_lessons):
+        '''
+        Adds the slot of a booking to the index, replacing the previous slot of the booking if there is one
+        '''
+        self.remove(booking_id)
+        key = (get_teacher_key(teacher), str(day))
+        start_minute, end_minute = get_slot_minutes(time_of_the_day, duration_of_lessons)
+        slot = ScheduledSlot(booking_id, start_minute, end_minute, start_date, interval_between_lessons,
+                             number_of_lessons)
+
+        slots = self.slots.setdefault(key, [])
+        index = bisect_right(slots, slot)
+        slots.insert(index, slot)
+        self.start_minutes.setdefault(key, []).insert(index, start_minute)
+        self.booking_slots[booking_id] = (key, slot)
+
+    def remove(self, booking_id):
+        key, slot = self.booking_slots.pop(booking_id, (None, None))
+        if key is None:
+            return
+
+        # Slots are ordered by start minute then booking id, so the slot is exactly where it would be inserted
+        index = bisect_left(self.slots[key], slot)
+        del self.slots[key][index]
+        del self.start_minutes[key][index]
+
+    def find_conflicts(self, teacher, day, time_of_the_day, duration_of_lessons, start_date,
+                       interval_between_lessons, number_of_lessons, exclude_booking_id=None):
+        '''
+        Returns the ids of the bookings of the teacher with a lesson on the day at the same time and date as one of
+        the lessons every interval days from the start date
+        '''
+        start_minute, end_minute = get_slot_minutes(time_of_the_day, duration_of_lessons)
+        return self.find_overlapping_bookings((get_teacher_key(teacher), str(day)), start_minute, end_minute,
+                                              start_date, interval_between_lessons, number_of_lessons,
+                                              exclude_booking_id)
+
+    def find_overlapping_bookings(self, key, start_minute, end_minute, start_date, interval_between_lessons,
+                                  number_of_lessons, exclude_booking_id=None):
+        '''
+        Returns the ids of the bookings of a (teacher key, day) whose slots overlap the minutes on a date of the lessons
+        '''
+        slots = self.slots.get(key)
+        if not slots:
+            return []
+
+        start_minutes = self.start_minutes[key]
+        first = bisect_right(start_minutes, start_minute - MAX_LESSON_DURATION)
+        last = bisect_left(start_minutes, end_minute)
+        return [
+            slot.booking_id for slot in slots[first:last]
+            if slot.booking_id != exclude_booking_id
+            and slot.overlaps(start_minute, end_minute, start_date, interval_between_lessons, number_of_lessons)
+        ]
+
+    def has_conflict(self, *args, **kwargs):
+        return bool(self.find_conflicts(*args, **kwargs))
+
+
+BOOKING_SLOT_FIELDS = ('id', 'teacher', 'day_of_the_week__day', 'time_of_the_day', 'duration_of_lessons',
+                       'start_date', 'interval_between_lessons', 'number_of_lessons')
+
+_teacher_schedule_index = None
+# The version of the whole schedule that the index of this process holds, and the version of the bookings of each
+# teacher that had a stored version when it was loaded or has changed them since
+_teacher_schedule_version = None
+_teacher_versions = {}
+# The deletion of bookings in progress in each thread. Its bookings are signalled one by one, but the stored version
+# of each of their teachers only needs to change once for all of them.
+_deletion = threading.local()
+
+def get_teacher_version_name(teacher_key):
+    return f'{TEACHER_SCHEDULE_VERSION}:{teacher_key}'
+
+def get_stored_teacher_schedule_version():
+    # The row is created by the migration of DataVersion
+    return DataVersion.objects.get(name=TEACHER_SCHEDULE_VERSION).version
+
+def get_stored_teacher_versions():
+    return dict(DataVersion.objects.filter(name__startswith=get_teacher_version_name(''))
+                .values_list('name', 'version'))
+
+def change_stored_teacher_versions(teacher_keys):
+    '''
+    Stores a new version of the bookings of each of the teachers, in the transaction that changes them, so that every
+    process reloads them. Only the rows of these teachers are locked, so bookings of other teachers can be changed
+    at the same time. Returns whether the index of this process held the previous versions, and so can be updated
+    in place.
+    '''
+    global _teacher_versions
+    if _teacher_schedule_index is None:
+        _teacher_versions = {}
+    held_previous_versions = _teacher_schedule_index is not None
+    names = sorted({get_teacher_version_name(teacher_key) for teacher_key in teacher_keys})
+    for start in range(0, len(names), VERSION_BATCH_SIZE):
+        batch = names[start:start + VERSION_BATCH_SIZE]
+        new_versions = {name: uuid.uuid4().hex for name in batch}
+        new_version = Case(*[When(name=name, then=Value(new_versions[name])) for name in batch])
+        held_names = [name for name in batch if name in _teacher_versions]
+        other_names = [name for name in batch if name not in _teacher_versions]
+
+        # The held versions are only replaced where they are still the stored ones
+        changed = 0
+        if held_names:
+            changed = DataVersion.objects.filter(
+                reduce(or_, [Q(name=name, version=_teacher_versions[name]) for name in held_names])
+            ).update(version=new_version)
+        # The other teachers had no stored version when the index was loaded, unless another process stored one since
+        stored_names = set()
+        if other_names:
+            stored_names = set(DataVersion.objects.filter(name__in=other_names).values_list('name', flat=True))
+            DataVersion.objects.bulk_create([DataVersion(name=name, version=new_versions[name])
+                                             for name in other_names if name not in stored_names],
+                                            ignore_conflicts=True)
+        if changed < len(held_names) or stored_names:
+            # Held versions may also have been rolled back along with the transaction that stored them
+            changed_names = held_names + sorted(stored_names)
+            if DataVersion.objects.filter(name__in=changed_names).update(version=new_version) < len(changed_names):
+                DataVersion.objects.bulk_create([DataVersion(name=name, version=new_versions[name])
+                                                 for name in changed_names], ignore_conflicts=True)
+            held_previous_versions = False
+        _teacher_versions.update(new_versions)
+    return held_previous_versions
+
+def get_teacher_schedule_index():
+    '''
+    Returns the teacher schedule index, loading it from the database on first use and whenever the stored versions of
+    the bookings are not the ones it holds, because they were changed by another process or a rolled back transaction.
+    Bookings changed without signals must be passed to update_teacher_schedule, or the index invalidated.
+    '''
+    global _teacher_schedule_index, _teacher_schedule_version, _teacher_versions
+    # The versions are read before the bookings, so bookings read before a change are never held under later versions
+    version = get_stored_teacher_schedule_version()
+    teacher_versions = get_stored_teacher_versions()
+    if (_teacher_schedule_index is None or version != _teacher_schedule_version
+            or teacher_versions != _teacher_versions):
+        _teacher_schedule_index = TeacherScheduleIndex(Booking.objects.values_list(*BOOKING_SLOT_FIELDS))
+        _teacher_schedule_version, _teacher_versions = version, teacher_versions
+    return _teacher_schedule_index
+
+def get_indexed_teacher_keys(booking_ids):
+    if _teacher_schedule_index is None:
+        return set()
+    return {_teacher_schedule_index.booking_slots[booking_id][0][0] for booking_id in booking_ids
+            if booking_id in _teacher_schedule_index.booking_slots}
+
+def update_teacher_schedule(booking_ids):
+    '''
+    Reloads the slots of the given bookings into the index if it is loaded, dropping those that no longer exist.
+    The stored versions of the teachers of the bookings, before and after they changed, are changed.
+    '''
+    global _teacher_schedule_index
+    booking_ids = set(booking_ids)
+    bookings = list(Booking.objects.filter(id__in=booking_ids).values_list(*BOOKING_SLOT_FIELDS))
+    teacher_keys = get_indexed_teacher_keys(booking_ids) | {get_teacher_key(booking[1]) for booking in bookings}
+    if not change_stored_teacher_versions(teacher_keys):
+        # Another process changed the bookings of these teachers since the index was loaded, so it is loaded again
+        # on next use
+        _teacher_schedule_index = None
+    if _teacher_schedule_index is None:
+        return
+
+    for booking in bookings:
+        _teacher_schedule_index.add(*booking)
+        booking_ids.discard(booking[0])
+    for booking_id in booking_ids:
+        _teacher_schedule_index.remove(booking_id)
+
+def start_deleting_bookings(origin):
+    '''
+    Records the start of a deletion of bookings, given by the model instance or queryset it was started from
+    '''
+    _deletion.origin, _deletion.teacher_keys = origin, set()
+
+def remove_from_teacher_schedule(bookings, origin=None):
+    '''
+    Removes the slots of deleted bookings from the index if it is loaded, without reading the bookings.
+    The stored version of each teacher is changed once for all the bookings of the deletion started from the given
+    origin.
+    '''
+    global _teacher_schedule_index
+    teacher_keys = {get_teacher_key(booking.teacher) for booking in bookings}
+    if origin is not None and getattr(_deletion, 'origin', None) is origin:
+        teacher_keys -= _deletion.teacher_keys
+        _deletion.teacher_keys |= teacher_keys
+    if teacher_keys and not change_stored_teacher_versions(teacher_keys):
+        _teacher_schedule_index = None
+    if _teacher_schedule_index is None:
+        return
+
+    for booking in bookings:
+        _teacher_schedule_index.remove(booking.id)
+
+def invalidate_teacher_schedule_index():
+    '''
+    Drops the teacher schedule index so that it is reloaded on next use, by every process
+    '''
+    global _teacher_schedule_index
+    DataVersion.objects.filter(name=TEACHER_SCHEDULE_VERSION).update(version=uuid.uuid4().hex)
+    _teacher_schedule_index = None
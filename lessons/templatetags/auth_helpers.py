@@ -5,8 +5,18 @@ register = template.Library()
 
 @register.filter(name='has_group')
 def has_group(user, group_name): 
-    return user.groups.filter(name=group_name).exists()
+    return group_name in getattr(user, 'group_names', [])
 
 @register.filter(name='is_staff')
 def is_staff(user):
     return has_group(user, 'Admin') or user.is_superuser
+
+@register.filter(name='user_role')
+def user_role(user):
+    if user.is_superuser:
+        return 'Director'
+    elif user.is_admin():
+        return 'Admin'
+    elif user.is_student():
+        return 'Student'
+    return ''
@@ -0,0 +1,33 @@
+from django import template
+from django.utils.safestring import mark_safe
+from lessons.fragment_cache import get_cached_fragment
+
+register = template.Library()
+
+
+class CachedFragmentNode(template.Node):
+    def __init__(self, nodelist, fragment_name, vary_on):
+        self.nodelist = nodelist
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        fragment_name = self.fragment_name.resolve(context)
+        vary_on = [variable.resolve(context) for variable in self.vary_on]
+        return mark_safe(get_cached_fragment(fragment_name, vary_on, lambda: self.nodelist.render(context)))
+
+
+@register.tag(name='cached_fragment')
+def cached_fragment(parser, token):
+    '''
+    Caches the render of its content under the name of the fragment, the version of its data and the values it
+    varies on:
+    {% cached_fragment 'name' value ... %} ... {% endcached_fragment %}
+    '''
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires the name of the fragment.")
+    nodelist = parser.parse(('endcached_fragment',))
+    parser.delete_first_token()
+    return CachedFragmentNode(nodelist, parser.compile_filter(bits[1]),
+                              [parser.compile_filter(bit) for bit in bits[2:]])
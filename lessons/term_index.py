@@ -0,0 +1,67 @@
+import datetime
+from bisect import bisect_left, bisect_right
+from .reference_data import get_school_terms
+
+
+class SchoolTermIndex:
+    '''
+    In-memory index of school terms sorted by start date, answering date lookups with a binary search
+    '''
+    def __init__(self, terms):
+        # The list the index was built from, so that it is rebuilt when the terms are read again
+        self.source = terms
+        self.terms = sorted(terms, key=lambda term: term.start_date)
+        self.start_dates = [term.start_date for term in self.terms]
+        self.end_dates = [term.end_date for term in self.terms]
+
+    def find_term(self, date):
+        '''
+        Returns the term containing the date, or None if the date falls in a holiday
+        '''
+        date = _as_date(date)
+        # Terms never overlap, so only the last term starting on or before the date can contain it
+        index = bisect_right(self.start_dates, date) - 1
+        if index >= 0 and date <= self.end_dates[index]:
+            return self.terms[index]
+        return None
+
+    def find_next_term(self, date):
+        '''
+        Returns the first term starting on or after the date, or None if there is no such term
+        '''
+        index = bisect_left(self.start_dates, _as_date(date))
+        if index < len(self.terms):
+            return self.terms[index]
+        return None
+
+    def classify_dates(self, dates):
+        '''
+        Returns the term containing each of the dates, with None for the dates that fall in a holiday
+        '''
+        return [self.find_term(date) for date in dates]
+
+
+def _as_date(date):
+    if isinstance(date, datetime.datetime):
+        return date.date()
+    return date
+
+
+_term_index = None
+
+def get_term_index():
+    '''
+    Returns the term index, rebuilt whenever the cached school terms it is built from change
+    '''
+    global _term_index
+    terms = get_school_terms()
+    if _term_index is None or _term_index.source is not terms:
+        _term_index = SchoolTermIndex(terms)
+    return _term_index
+
+def invalidate_term_index():
+    '''
+    Drops the term index so that it is reloaded on next use
+    '''
+    global _term_index
+    _term_index = None
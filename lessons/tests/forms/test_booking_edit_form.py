@@ -1,8 +1,10 @@
 import datetime
+from unittest import mock
 
+from django.db import connection
 from django.test import TestCase
 from django import forms
-from lessons.models import User, Student, DayOfTheWeek, SchoolTerm, Booking, Invoice
+from lessons.models import User, Student, DayOfTheWeek, SchoolTerm, Booking, Invoice, Child
 from lessons.forms import BookingEditForm
 from lessons.tests.helpers import create_days_of_the_week, create_user_groups
 
@@ -16,6 +18,7 @@ class BookingEditFormTestCase(TestCase):
         create_days_of_the_week()
         self.user = User.objects.all()[0]
         Student.objects.create(user=self.user)
+        child = Child.objects.create(parent=self.user, first_name='Alice', last_name='Doe')
         
         self.form_input = {
             'day_of_the_week':DayOfTheWeek.objects.get(day=DayOfTheWeek.Day.MONDAY),
@@ -41,7 +44,7 @@ class BookingEditFormTestCase(TestCase):
 
         self.booking1 = Booking.objects.create(
             user=User.objects.get(email="johndoe@email.com"),
-            relation_id=1,
+            relation_id=child.id,
             invoice=i1,
             time_of_the_day="12:00",
             teacher="Mr Smith",
@@ -303,3 +306,41 @@ class BookingEditFormTestCase(TestCase):
         form.save()
 
         self.assertEqual(Booking.objects.get(id=self.booking1.id).term_id, SchoolTerm.objects.all()[0])
+
+    def _booking1_input(self, **overrides):
+        form_input = {
+            'day_of_the_week': self.booking1.day_of_the_week,
+            'time_of_the_day': '12:00',
+            'teacher': 'Mr Smith',
+            'start_date': '2022-12-05',
+            'end_date': '2023-01-05',
+            'duration_of_lessons': Booking.LessonDuration.FORTY_FIVE_MINUTES,
+            'interval_between_lessons': Booking.IntervalBetweenLessons.TWO_WEEKS,
+            'number_of_lessons': 2,
+            'further_information': 'Some informations',
+            'hourly_cost': 5.0
+        }
+        form_input.update(overrides)
+        return form_input
+
+    def test_booking_does_not_conflict_with_itself(self):
+        form = BookingEditForm(instance_id=self.booking1.id, data=self._booking1_input())
+        self.assertTrue(form.is_valid())
+
+    def test_teacher_cannot_be_double_booked(self):
+        form = BookingEditForm(data=self._booking1_input(time_of_the_day='12:30'))
+        self.assertFalse(form.is_valid())
+        self.assertIn('teacher', form.errors)
+
+    def test_other_teacher_may_teach_at_the_same_time(self):
+        form = BookingEditForm(data=self._booking1_input(teacher='Ms Jones'))
+        self.assertTrue(form.is_valid())
+
+    def test_teacher_schedule_is_updated_in_the_transaction_of_the_edit(self):
+        atomic_blocks = []
+        form = BookingEditForm(instance_id=self.booking1.id, data=self._booking1_input(hourly_cost=10))
+        self.assertTrue(form.is_valid())
+        with mock.patch('lessons.forms.update_teacher_schedule',
+                        side_effect=lambda booking_ids: atomic_blocks.append(len(connection.atomic_blocks))):
+            form.save()
+        self.assertEqual(atomic_blocks, [len(connection.atomic_blocks) + 1])
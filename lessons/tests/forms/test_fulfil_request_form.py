@@ -162,12 +162,12 @@ class FulfilRequestFormTestCase(TestCase):
         self.form_input['further_information'] = 'x' * 500
 
     def test_form_saves_correctly(self):
+        self._assert_form_is_valid()
         form = FulfilRequestForm(request_id=self.request.id, data=self.form_input)
 
         form.save()
         self.request = Request.objects.get(id=self.request.id)
         self.assertTrue(self.request.fulfilled)
-        self._assert_form_is_valid()
 
     def test_form_marks_request_as_fulfilled_on_save(self):
         form = FulfilRequestForm(request_id=self.request.id, data=self.form_input)
@@ -228,3 +228,29 @@ class FulfilRequestFormTestCase(TestCase):
 
 
 
+
+    def test_teacher_cannot_be_double_booked(self):
+        form = FulfilRequestForm(request_id=self.request.id, data=self.form_input)
+        form.save()
+
+        other_request = Request.objects.create(
+            user=self.request.user,
+            number_of_lessons=1,
+            relation_id=-1,
+            interval_between_lessons=Request.IntervalBetweenLessons.ONE_WEEK,
+            duration_of_lessons=Request.LessonDuration.THIRTY_MINUTES,
+            further_information='Some information',
+            fulfilled=False
+        )
+        other_request.availability.set([DayOfTheWeek.objects.get(day=DayOfTheWeek.Day.TUESDAY)])
+        self.form_input['time_of_lesson'] = '10:30'
+        form = FulfilRequestForm(request_id=other_request.id, data=self.form_input)
+        self.assertFalse(form.is_valid())
+        self.assertIn('teacher', form.errors)
+
+    def test_teacher_may_teach_back_to_back_lessons(self):
+        form = FulfilRequestForm(request_id=self.request.id, data=self.form_input)
+        form.save()
+
+        self.form_input['time_of_lesson'] = '10:40'
+        self._assert_form_is_valid()
@@ -2,7 +2,7 @@
 from django.utils import timezone
 from django.test import TestCase
 from lessons.forms import NewRequestForm
-from lessons.models import DayOfTheWeek, Request, User
+from lessons.models import DayOfTheWeek, Request, User, Child
 from lessons.tests.helpers import create_user_groups, create_days_of_the_week, HandleGroups
 
 
@@ -16,9 +16,11 @@ class NewRequestFormTestCase(TestCase):
         HandleGroups.set_default_user_to_student()
 
         self.user = User.objects.get(email="johndoe@email.com")
+        self.child = Child.objects.create(parent=self.user, first_name='Alice', last_name='Doe')
+        self.other_child = Child.objects.create(parent=self.user, first_name='Bob', last_name='Doe')
 
         # Create form inputs
-        relation_id = 1
+        relation_id = self.child.id
         availability = DayOfTheWeek.objects.get(day=DayOfTheWeek.Day.TUESDAY), DayOfTheWeek.objects.get(
             day=DayOfTheWeek.Day.WEDNESDAY)
         number_of_lessons = 1
@@ -148,7 +150,7 @@ class NewRequestFormTestCase(TestCase):
         self.assertFalse(form.is_valid())
 
     def test_form_must_save_correctly(self):
-        form = NewRequestForm(user=self.user, relation_id=1, data=self.form_input)
+        form = NewRequestForm(user=self.user, relation_id=self.child.id, data=self.form_input)
         self.assertTrue(form.is_valid())
         form_availability = form.cleaned_data.get('availability')
         form_number_of_lessons = form.cleaned_data.get('number_of_lessons')
@@ -157,7 +159,7 @@ class NewRequestFormTestCase(TestCase):
         form_further_information = form.cleaned_data.get('further_information')
         Request.objects.create(
             user=self.user,
-            relation_id=2,
+            relation_id=self.other_child.id,
             date=timezone.datetime.now(tz=timezone.utc),
             number_of_lessons=form_number_of_lessons,
             interval_between_lessons=form_interval_between_lessons,
@@ -1,7 +1,10 @@
 from django.urls import reverse
+from django.db import connection
 from lessons.models import User, DayOfTheWeek
 from django.contrib.auth.models import Group, Permission
 from lessons import models
+from lessons.benchmarks import BENCHMARKED_VIEWS, get_benchmark_data, get_view_client, get_response
+from lessons.query_budgets import QUERY_BUDGETS, QueryRecorder
 
 GROUPS_PERMISSIONS = {
     'Admin': {
@@ -78,3 +81,18 @@ class HandleGroups:
         admin_group.user_set.add(other_user)
 
 
+def assert_views_within_query_budgets(test_case, views=BENCHMARKED_VIEWS):
+    '''
+    Visits every page of the URLconf with the seeded data, and fails for each page that runs more queries than its budget
+    '''
+    data = get_benchmark_data()
+    for view in views:
+        with test_case.subTest(view=view.url_name):
+            client = get_view_client(view)
+            recorder = QueryRecorder()
+            with connection.execute_wrapper(recorder):
+                response = get_response(client, reverse(view.url_name, kwargs=view.get_kwargs(data)),
+                                        view.get_query(data))
+            test_case.assertEqual(response.status_code, 200)
+            test_case.assertLessEqual(len(recorder.queries), QUERY_BUDGETS[view.url_name],
+                                      '\n'.join(recorder.queries))
@@ -1,7 +1,7 @@
 """Unit test for the Booking model"""
 from django.test import TestCase
 from django.core.exceptions import ValidationError
-from lessons.models import User, DayOfTheWeek, Booking, SchoolTerm, Invoice, Student
+from lessons.models import User, DayOfTheWeek, Booking, SchoolTerm, Invoice, Student, Child
 from django.utils import timezone
 from lessons.tests.helpers import create_user_groups, create_days_of_the_week
 import datetime
@@ -17,6 +17,8 @@ class BookingModelTestCase(TestCase):
         create_days_of_the_week()
         Student(user=User.objects.get(email="johndoe@email.com"), balance=0).save()
         Student(user=User.objects.get(email="janedoe@email.com"), balance=0).save()
+        child1 = Child.objects.create(parent=User.objects.get(email="johndoe@email.com"), first_name="Alice", last_name="Doe")
+        child2 = Child.objects.create(parent=User.objects.get(email="janedoe@email.com"), first_name="Bob", last_name="Doe")
 
         SchoolTerm(
             term_name="Term one",
@@ -51,7 +53,7 @@ class BookingModelTestCase(TestCase):
 
         self.booking1 = Booking.objects.create(
             user=User.objects.get(email="johndoe@email.com"),
-            relation_id=1,
+            relation_id=child1.id,
             invoice=i1,
             time_of_the_day="12:00",
             teacher="Mr Smith",
@@ -67,7 +69,7 @@ class BookingModelTestCase(TestCase):
 
         self.booking2 = Booking.objects.create(
             user=User.objects.get(email="janedoe@email.com"),
-            relation_id=2,
+            relation_id=child2.id,
             invoice=i2,
             time_of_the_day="9:00",
             teacher="Mr Singh",
@@ -170,3 +172,16 @@ class BookingModelTestCase(TestCase):
     def test_number_of_lessons_cannot_be_below_one(self):
         self.booking1.number_of_lessons = 0
         self._assert_booking_is_invalid()
+
+    def test_child_is_set_from_relation_id(self):
+        self.assertEqual(self.booking1.child.id, self.booking1.relation_id)
+
+    def test_child_is_none_for_the_user_themself(self):
+        self.booking1.relation_id = -1
+        self.booking1.save()
+        self.assertIsNone(Booking.objects.get(id=self.booking1.id).child)
+
+    def test_bookings_are_deleted_with_their_child(self):
+        self.booking1.child.delete()
+        self.assertFalse(Booking.objects.filter(id=self.booking1.id).exists())
+        self.assertTrue(Booking.objects.filter(id=self.booking2.id).exists())
@@ -1,7 +1,7 @@
 """Unit tests for the Request model"""
 from django.test import TestCase
 from django.core.exceptions import ValidationError
-from lessons.models import User, Request, DayOfTheWeek
+from lessons.models import User, Request, DayOfTheWeek, Child
 from django.utils import timezone
 from lessons.tests.helpers import create_days_of_the_week
 from lessons.tests.helpers import create_user_groups
@@ -15,10 +15,12 @@ class RequestModelTestCase(TestCase):
     def setUp(self):
         create_user_groups()
         create_days_of_the_week()
+        child1 = Child.objects.create(parent=User.objects.get(email='johndoe@email.com'), first_name='Alice', last_name='Doe')
+        child2 = Child.objects.create(parent=User.objects.get(email='janedoe@email.com'), first_name='Bob', last_name='Doe')
 
         self.request1 = Request.objects.create(
             user = User.objects.get(email='johndoe@email.com'),
-            relation_id = 1,
+            relation_id = child1.id,
             date = timezone.datetime(2000, 1, 1, 1, 1, 1, tzinfo=timezone.utc),
             number_of_lessons = 1,
             interval_between_lessons = Request.IntervalBetweenLessons.ONE_WEEK,
@@ -31,7 +33,7 @@ class RequestModelTestCase(TestCase):
 
         self.request2 = Request.objects.create(
             user = User.objects.get(email='janedoe@email.com'),
-            relation_id = 2,
+            relation_id = child2.id,
             date = timezone.datetime(2001, 2, 2, 2, 2, 2, tzinfo=timezone.utc),
             number_of_lessons = 2,
             interval_between_lessons = Request.IntervalBetweenLessons.TWO_WEEKS,
@@ -86,6 +88,19 @@ class RequestModelTestCase(TestCase):
     def test_relation_id_can_be_negative_one(self):
         self.request1.relation_id = -1
         self._assert_request_is_valid()
+
+    def test_child_is_set_from_relation_id(self):
+        self.assertEqual(self.request1.child.id, self.request1.relation_id)
+
+    def test_child_is_none_for_the_user_themself(self):
+        self.request1.relation_id = -1
+        self.request1.save()
+        self.assertIsNone(Request.objects.get(id=self.request1.id).child)
+
+    def test_requests_are_deleted_with_their_child(self):
+        self.request1.child.delete()
+        self.assertFalse(Request.objects.filter(id=self.request1.id).exists())
+        self.assertTrue(Request.objects.filter(id=self.request2.id).exists())
     
     def test_user_must_exist(self):
         self.request1.user.delete()
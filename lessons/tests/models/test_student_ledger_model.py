@@ -0,0 +1,132 @@
+"""Unit tests for the StudentLedger model"""
+import datetime
+from decimal import Decimal
+from django.core.management import call_command
+from django.test import TestCase
+from lessons.models import Invoice, User, Student, StudentLedger, BankTransaction
+from lessons.tests.helpers import create_user_groups
+
+
+class StudentLedgerModelTestCase(TestCase):
+    """Unit tests for the StudentLedger model"""
+
+    fixtures = ['lessons/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        create_user_groups()
+
+        self.student = Student.objects.create(
+            user=User.objects.get(email="johndoe@email.com"),
+            balance=100
+        )
+
+        self.invoice1 = Invoice.objects.create(
+            invoice_number="0001-001",
+            student=self.student,
+            full_amount=200,
+            paid_amount=50,
+            fully_paid=False
+        )
+
+        self.invoice2 = Invoice.objects.create(
+            invoice_number="0001-002",
+            student=self.student,
+            full_amount=300,
+            paid_amount=0,
+            fully_paid=False
+        )
+
+    def _assert_ledger_totals(self, invoiced, paid, outstanding, credit_balance):
+        ledger = StudentLedger.objects.get(student=self.student)
+        self.assertEqual(ledger.invoiced, Decimal(invoiced))
+        self.assertEqual(ledger.paid, Decimal(paid))
+        self.assertEqual(ledger.outstanding, Decimal(outstanding))
+        self.assertEqual(ledger.credit_balance, Decimal(credit_balance))
+
+    def test_ledger_is_created_with_student(self):
+        self.assertTrue(StudentLedger.objects.filter(student=self.student).exists())
+
+    def test_ledger_totals_follow_invoices(self):
+        self._assert_ledger_totals(500, 50, 450, 100)
+
+    def test_ledger_totals_follow_edited_invoice(self):
+        self.invoice2.full_amount = 100
+        self.invoice2.save()
+        self._assert_ledger_totals(300, 50, 250, 100)
+
+    def test_ledger_totals_follow_deleted_invoice(self):
+        self.invoice2.delete()
+        self._assert_ledger_totals(200, 50, 150, 100)
+
+    def test_ledger_totals_follow_payment(self):
+        BankTransaction.objects.create(
+            date=datetime.date(2022, 1, 1),
+            student=self.student,
+            amount=50,
+            invoice=self.invoice1
+        )
+        self._assert_ledger_totals(500, 100, 400, 100)
+
+    def test_refresh_recreates_missing_ledger(self):
+        StudentLedger.objects.all().delete()
+        StudentLedger.refresh([self.student.pk])
+        self._assert_ledger_totals(500, 50, 450, 100)
+
+    def test_changes_are_added_to_totals_without_recomputing_them(self):
+        with self.assertNumQueries(1):
+            StudentLedger.add_to_totals({self.student.pk: (Decimal('10.00'), Decimal('2.50'))})
+        self._assert_ledger_totals('510.00', '52.50', '457.50', 100)
+
+    def test_saving_an_invoice_adds_its_change_to_the_totals(self):
+        invoice = Invoice.objects.get(invoice_number="0001-002")
+        invoice.paid_amount = 20
+        with self.assertNumQueries(2):
+            invoice.save()
+        self._assert_ledger_totals(500, 70, 430, 100)
+        with self.assertNumQueries(1):
+            invoice.save()
+        self._assert_ledger_totals(500, 70, 430, 100)
+
+    def test_payment_does_not_recompute_the_totals(self):
+        with self.assertNumQueries(5):
+            BankTransaction.objects.create(date=datetime.date(2022, 1, 1), student=self.student, amount=200,
+                                           invoice=self.invoice2)
+        self._assert_ledger_totals(500, 250, 250, 100)
+
+    def test_overpayment_is_added_to_the_credit_balance(self):
+        BankTransaction.objects.create(date=datetime.date(2022, 1, 1), student=self.student, amount=310,
+                                       invoice=self.invoice2)
+        self._assert_ledger_totals(500, 350, 150, 110)
+
+    def test_ledger_totals_follow_invoice_moved_to_another_student(self):
+        other_student = Student.objects.create(user=User.objects.create_user(
+            email='other@email.com', password='Password123', first_name='Other', last_name='Student'))
+        self.invoice2.student = other_student
+        self.invoice2.save()
+        self._assert_ledger_totals(200, 50, 150, 100)
+        self.assertEqual(StudentLedger.objects.get(student=other_student).invoiced, Decimal(300))
+
+    def test_missing_ledger_is_created_when_its_totals_change(self):
+        StudentLedger.objects.all().delete()
+        self.invoice2.paid_amount = 10
+        self.invoice2.save()
+        self._assert_ledger_totals(500, 60, 440, 100)
+
+    def test_backfill_creates_only_missing_ledgers(self):
+        StudentLedger.objects.all().delete()
+        self.assertEqual(StudentLedger.backfill(), 1)
+        self._assert_ledger_totals(500, 50, 450, 100)
+        self.assertEqual(StudentLedger.backfill(), 0)
+
+    def test_backfill_command_recomputes_ledgers(self):
+        StudentLedger.objects.update(invoiced=0, paid=0, outstanding=0)
+        call_command('backfill_ledgers', '--recompute')
+        self._assert_ledger_totals(500, 50, 450, 100)
+
+    def test_refresh_of_no_students_does_nothing(self):
+        with self.assertNumQueries(0):
+            StudentLedger.refresh([])
+
+    def test_ledger_is_deleted_with_student(self):
+        self.student.delete()
+        self.assertFalse(StudentLedger.objects.exists())
@@ -3,6 +3,7 @@ from django.core.exceptions import ValidationError
 from django.test import TestCase
 from lessons.models import User
 from lessons.tests.helpers import create_user_groups, HandleGroups
+from django.contrib.auth.models import Group
 
 
 class UserModelTestCase(TestCase):
@@ -35,6 +36,29 @@ class UserModelTestCase(TestCase):
         HandleGroups.set_default_user_to_student()
         self.assertFalse(self.other_user.is_admin())
 
+    def test_role_checks_query_groups_once(self):
+        HandleGroups.set_default_user_to_admin()
+        with self.assertNumQueries(1):
+            self.assertTrue(self.other_user.is_admin())
+            self.assertFalse(self.other_user.is_student())
+            self.assertTrue(self.other_user.is_admin_or_director())
+            self.assertEqual(self.other_user.get_group(), 'Admin')
+
+    def test_role_cache_is_cleared_when_user_groups_change(self):
+        HandleGroups.set_default_user_to_admin()
+        self.assertTrue(self.other_user.is_admin())
+        self.other_user.groups.set([Group.objects.get(name='Student')])
+        self.assertTrue(self.other_user.is_student())
+        self.assertFalse(self.other_user.is_admin())
+
+    def test_roles_of_users_with_groups_are_resolved_with_one_group_query(self):
+        HandleGroups.set_default_user_to_admin()
+        HandleGroups.set_other_user_to_student()
+        with self.assertNumQueries(2):
+            groups = {user.email: user.get_group() for user in User.objects.with_groups()}
+        self.assertEqual(groups, {'johndoe@email.com': 'Admin', 'janedoe@email.com': 'Student',
+                                  'bobdylan@email.com': None})
+
     def test_first_name_must_not_be_blank(self):
         self.user.first_name = ''
         self._assert_user_is_invalid()
@@ -0,0 +1,72 @@
+"""Unit tests of the benchmarks of the views."""
+import copy
+import json
+from unittest import mock
+from django.test import TestCase
+from lessons.benchmarks import BENCHMARKED_VIEWS, run_benchmarks, find_regressions, check_seeded_invoice_numbers
+from lessons.models import Invoice
+from msms.urls import urlpatterns
+
+# Pages that are not visited by the benchmarks, as they only redirect or belong to django
+UNBENCHMARKED_URL_NAMES = {'log_out', 'redirect', None}
+
+
+class BenchmarksTestCase(TestCase):
+    """Unit tests of the benchmarks of the views."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.results = run_benchmarks([4], repeat=1, log=lambda message: None)
+
+    def test_every_view_is_benchmarked(self):
+        url_names = {getattr(pattern, 'name', None) for pattern in urlpatterns} - UNBENCHMARKED_URL_NAMES
+        self.assertEqual(url_names, {view.url_name for view in BENCHMARKED_VIEWS})
+
+    def test_every_benchmarked_view_is_visited_successfully(self):
+        for result in self.results['datasets'][0]['views']:
+            self.assertEqual(result['status_code'], 200, result['view'])
+
+    def test_results_are_recorded_for_each_view(self):
+        dataset = self.results['datasets'][0]
+        self.assertEqual(dataset['students'], 4)
+        self.assertEqual(len(dataset['views']), len(BENCHMARKED_VIEWS))
+        admin_page = next(result for result in dataset['views'] if result['view'] == 'admin_page')
+        self.assertGreater(admin_page['queries'], 0)
+        self.assertGreater(admin_page['median_seconds'], 0)
+        self.assertGreater(admin_page['peak_memory_bytes'], 0)
+
+    def test_results_can_be_saved_as_json(self):
+        self.assertEqual(json.loads(json.dumps(self.results)), self.results)
+
+    def test_no_regressions_against_the_same_results(self):
+        self.assertEqual(find_regressions(self.results, self.results), [])
+
+    def test_more_queries_are_a_regression(self):
+        results = copy.deepcopy(self.results)
+        results['datasets'][0]['views'][0]['queries'] += 1
+        regressions = find_regressions(self.results, results)
+        self.assertEqual(len(regressions), 1)
+        self.assertIn('queries', regressions[0])
+
+    def test_slower_views_are_a_regression_beyond_the_tolerance(self):
+        results = copy.deepcopy(self.results)
+        results['datasets'][0]['views'][0]['median_seconds'] *= 1.1
+        self.assertEqual(find_regressions(self.results, results), [])
+        results['datasets'][0]['views'][0]['median_seconds'] *= 2
+        self.assertEqual(len(find_regressions(self.results, results)), 1)
+
+    def test_seeded_invoice_numbers_are_valid(self):
+        self.assertTrue(Invoice.objects.exists())
+        check_seeded_invoice_numbers()
+
+    def test_no_timings_are_recorded_on_invalid_invoice_numbers(self):
+        def seed_invalid_invoice_numbers(number_of_students, seed):
+            invoice = Invoice.objects.first()
+            Invoice.objects.create(invoice_number='12-001', student=invoice.student, full_amount=invoice.full_amount)
+            return 0
+
+        with mock.patch('lessons.benchmarks.seed_benchmark_dataset', side_effect=seed_invalid_invoice_numbers), \
+                mock.patch('lessons.benchmarks.benchmark_view') as benchmark_view:
+            with self.assertRaisesMessage(ValueError, '12-001'):
+                run_benchmarks([4], repeat=1, log=lambda message: None)
+        benchmark_view.assert_not_called()
@@ -0,0 +1,177 @@
+"""Unit tests of the bulk request fulfilment."""
+import csv
+import datetime
+import os
+import tempfile
+from unittest import mock
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from lessons.bulk_fulfilment import fulfil_requests, validate_fulfil_assignments
+from lessons.models import User, Request, DayOfTheWeek, Student, Booking, Invoice, Child
+from lessons.reference_data import get_days_of_the_week
+from lessons.term_index import get_term_index
+from lessons.teacher_schedule import get_teacher_schedule_index
+from lessons.tests.helpers import create_days_of_the_week, create_user_groups
+
+
+class BulkFulfilmentTestCase(TestCase):
+    """Unit tests of the bulk request fulfilment."""
+
+    fixtures = ['lessons/tests/fixtures/default_user.json', 'lessons/tests/fixtures/other_users.json',
+                'lessons/tests/fixtures/default_terms.json']
+
+    def setUp(self):
+        create_days_of_the_week()
+        create_user_groups()
+        self.john = User.objects.get(email='johndoe@email.com')
+        self.jane = User.objects.get(email='janedoe@email.com')
+        self.john_student = Student.objects.create(user=self.john)
+        Student.objects.create(user=self.jane)
+        child = Child.objects.create(parent=self.john, first_name='Alice', last_name='Doe')
+
+        self.requests = [
+            self._create_request(self.john, -1),
+            self._create_request(self.john, child.id),
+            self._create_request(self.jane, -1),
+        ]
+
+    def _create_request(self, user, relation_id):
+        request = Request.objects.create(
+            user=user,
+            number_of_lessons=4,
+            relation_id=relation_id,
+            interval_between_lessons=Request.IntervalBetweenLessons.ONE_WEEK,
+            duration_of_lessons=Request.LessonDuration.FOURTY_FIVE_MINUTES,
+            further_information='Some information',
+        )
+        request.availability.set([DayOfTheWeek.objects.get(day=DayOfTheWeek.Day.TUESDAY)])
+        return request
+
+    def _assignment(self, request, **overrides):
+        assignment = {
+            'request_id': str(request.id),
+            'day_of_the_week': 'Tuesday',
+            'time_of_lesson': '10:30',
+            'teacher': f'Teacher {request.id}',
+            'start_date': '2022-03-01',
+            'end_date': '2022-06-01',
+            'hourly_cost': '20',
+        }
+        assignment.update(overrides)
+        return assignment
+
+    def test_bookings_and_invoices_are_created_for_every_request(self):
+        bookings = fulfil_requests([self._assignment(request) for request in self.requests])
+        self.assertEqual(len(bookings), 3)
+        self.assertEqual(Booking.objects.count(), 3)
+        self.assertFalse(Request.objects.filter(fulfilled=False).exists())
+
+        booking = Booking.objects.get(relation_id=self.requests[1].relation_id)
+        self.assertEqual(booking.user, self.john)
+        self.assertEqual(booking.time_of_the_day, datetime.time(10, 30))
+        self.assertEqual(booking.term_id.term_name, 'TermOne')
+        self.assertEqual(booking.number_of_lessons, 4)
+        self.assertEqual(booking.invoice.full_amount, Decimal('60.00'))
+
+    def test_invoice_numbers_are_allocated_per_student(self):
+        fulfil_requests([self._assignment(request) for request in self.requests])
+        self.assertEqual(sorted(Invoice.objects.values_list('invoice_number', flat=True)),
+                         ['0001-001', '0001-002', '0002-001'])
+        self.assertEqual(Student.objects.get(pk=self.john_student.pk).invoice_sequence, 2)
+
+    def test_existing_invoice_numbers_are_skipped(self):
+        Invoice.objects.create(invoice_number='0001-001', student=self.john_student, full_amount=10)
+        fulfil_requests([self._assignment(self.requests[0])])
+        self.assertEqual(Booking.objects.get().invoice_id, '0001-002')
+
+    def test_term_is_the_next_term_when_starting_in_a_holiday(self):
+        fulfil_requests([self._assignment(self.requests[0], start_date='2023-01-01', end_date='2023-02-01')])
+        self.assertEqual(Booking.objects.get().term_id.term_name, 'TermTwo')
+
+    def test_no_request_is_fulfilled_if_one_assignment_is_invalid(self):
+        assignments = [self._assignment(self.requests[0]), self._assignment(self.requests[1], day_of_the_week='Monday')]
+        with self.assertRaises(ValidationError) as context:
+            fulfil_requests(assignments)
+        self.assertIn('Assignment 2', context.exception.message_dict)
+        self.assertEqual(Booking.objects.count(), 0)
+        self.assertEqual(Invoice.objects.count(), 0)
+        self.assertFalse(Request.objects.filter(fulfilled=True).exists())
+
+    def test_invalid_assignments_are_rejected(self):
+        self.requests[2].fulfilled = True
+        self.requests[2].save()
+        invalid_assignments = [
+            self._assignment(self.requests[0], hourly_cost='0'),
+            self._assignment(self.requests[0], end_date='2022-01-01'),
+            self._assignment(self.requests[0], request_id='9999'),
+            self._assignment(self.requests[2]),
+            self._assignment(self.requests[0], start_date='2030-01-01', end_date='2030-02-01'),
+        ]
+        for assignment in invalid_assignments:
+            with self.assertRaises(ValidationError):
+                fulfil_requests([assignment])
+
+    def test_nothing_is_created_if_a_request_is_fulfilled_during_validation(self):
+        def validate_then_fulfil(assignments):
+            validated = validate_fulfil_assignments(assignments)
+            Request.objects.filter(id=self.requests[1].id).update(fulfilled=True)
+            return validated
+
+        with mock.patch('lessons.bulk_fulfilment.validate_fulfil_assignments', side_effect=validate_then_fulfil):
+            with self.assertRaises(ValidationError):
+                fulfil_requests([self._assignment(request) for request in self.requests])
+        self.assertEqual(Booking.objects.count(), 0)
+        self.assertEqual(Invoice.objects.count(), 0)
+        self.assertEqual(list(Request.objects.filter(fulfilled=True)), [self.requests[1]])
+        self.assertEqual(Student.objects.get(pk=self.john_student.pk).invoice_sequence, 0)
+
+    def test_request_cannot_be_assigned_twice_in_a_batch(self):
+        with self.assertRaises(ValidationError):
+            fulfil_requests([self._assignment(self.requests[0]), self._assignment(self.requests[0])])
+
+    def test_query_count_does_not_depend_on_batch_size(self):
+        get_term_index()
+        get_days_of_the_week()
+        get_teacher_schedule_index()
+        with CaptureQueriesContext(connection) as single_request:
+            fulfil_requests([self._assignment(self.requests[0])])
+        with CaptureQueriesContext(connection) as many_requests:
+            fulfil_requests([self._assignment(request) for request in self.requests[1:]])
+        self.assertEqual(len(single_request), len(many_requests))
+
+    def test_management_command_fulfils_requests_from_csv(self):
+        path = self._write_csv([self._assignment(request) for request in self.requests])
+        call_command('fulfil_requests', path)
+        self.assertEqual(Booking.objects.count(), 3)
+
+    def test_management_command_fails_on_invalid_csv(self):
+        path = self._write_csv([self._assignment(self.requests[0], teacher='')])
+        with self.assertRaises(CommandError):
+            call_command('fulfil_requests', path)
+        self.assertEqual(Booking.objects.count(), 0)
+
+    def _write_csv(self, assignments):
+        csv_file = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, newline='')
+        self.addCleanup(os.remove, csv_file.name)
+        writer = csv.DictWriter(csv_file, fieldnames=list(assignments[0].keys()))
+        writer.writeheader()
+        writer.writerows(assignments)
+        csv_file.close()
+        return csv_file.name
+
+    def test_teacher_cannot_be_assigned_twice_at_the_same_time(self):
+        with self.assertRaises(ValidationError) as raised:
+            fulfil_requests([self._assignment(request, teacher='Mr Smith') for request in self.requests[:2]])
+        self.assertIn('Assignment 2', raised.exception.message_dict)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_teacher_cannot_be_assigned_over_an_existing_booking(self):
+        fulfil_requests([self._assignment(self.requests[0], teacher='Mr Smith')])
+        with self.assertRaises(ValidationError) as raised:
+            fulfil_requests([self._assignment(self.requests[1], teacher='Mr Smith', time_of_lesson='11:00')])
+        self.assertIn('Assignment 1', raised.exception.message_dict)
@@ -0,0 +1,82 @@
+"""Unit tests of the batched client name resolution."""
+from django.test import TestCase
+from django.utils import timezone
+from lessons.models import User, Child, Request
+from lessons.views_functions import get_full_names_by_relation_ids, format_requests_for_display, \
+    format_request_for_display
+
+
+class ClientNameResolutionTestCase(TestCase):
+    """Unit tests of the batched client name resolution."""
+
+    fixtures = ['lessons/tests/fixtures/default_user.json', 'lessons/tests/fixtures/other_users.json']
+
+    def setUp(self):
+        self.john = User.objects.get(email='johndoe@email.com')
+        self.jane = User.objects.get(email='janedoe@email.com')
+        self.alice = Child.objects.create(parent=self.john, first_name='Alice', last_name='Doe')
+        self.bob = Child.objects.create(parent=self.jane, first_name='Bob', last_name='Doe')
+
+    def _create_request(self, user, relation_id):
+        return Request.objects.create(
+            user=user,
+            relation_id=relation_id,
+            date=timezone.now(),
+            number_of_lessons=1,
+            interval_between_lessons=Request.IntervalBetweenLessons.ONE_WEEK,
+            duration_of_lessons=Request.LessonDuration.THIRTY_MINUTES,
+            further_information='Some information'
+        )
+
+    def test_names_of_users_and_children_are_resolved(self):
+        names = get_full_names_by_relation_ids([
+            (self.john.id, -1), (self.jane.id, -1), (self.john.id, self.alice.id), (self.jane.id, self.bob.id)
+        ])
+        self.assertEqual(names, {
+            (self.john.id, -1): 'John Doe',
+            (self.jane.id, -1): 'Jane Doe',
+            (self.john.id, self.alice.id): 'Alice Doe',
+            (self.jane.id, self.bob.id): 'Bob Doe',
+        })
+
+    def test_names_are_resolved_with_one_query_per_client_type(self):
+        pairs = [(self.john.id, -1), (self.jane.id, -1), (self.john.id, self.alice.id), (self.jane.id, self.bob.id)]
+        with self.assertNumQueries(2):
+            get_full_names_by_relation_ids(pairs)
+
+    def test_string_relation_ids_are_accepted(self):
+        names = get_full_names_by_relation_ids([(self.john.id, str(self.alice.id)), (self.john.id, '-1')])
+        self.assertEqual(names[(self.john.id, self.alice.id)], 'Alice Doe')
+        self.assertEqual(names[(self.john.id, -1)], 'John Doe')
+
+    def test_no_query_is_made_without_clients(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(get_full_names_by_relation_ids([]), {})
+
+    def test_formatting_requests_uses_a_constant_number_of_queries(self):
+        for _ in range(10):
+            self._create_request(self.john, -1)
+            self._create_request(self.john, self.alice.id)
+            self._create_request(self.jane, self.bob.id)
+
+        with self.assertNumQueries(3):
+            formatted_requests = format_requests_for_display(Request.objects.all())
+
+        self.assertEqual(len(formatted_requests), 30)
+        self.assertEqual({request.student_name for request in formatted_requests},
+                         {'John Doe', 'Alice Doe', 'Bob Doe'})
+
+    def test_names_of_joined_clients_are_not_queried(self):
+        for _ in range(10):
+            self._create_request(self.john, -1)
+            self._create_request(self.john, self.alice.id)
+
+        with self.assertNumQueries(1):
+            formatted_requests = format_requests_for_display(Request.objects.select_related('user', 'child'))
+
+        self.assertEqual({request.student_name for request in formatted_requests}, {'John Doe', 'Alice Doe'})
+
+    def test_single_request_is_formatted_without_a_name_map(self):
+        request = format_request_for_display(self._create_request(self.jane, self.bob.id))
+        self.assertEqual(request.student_name, 'Bob Doe')
+        self.assertEqual(request.interval_between_lessons, '1 Week')
@@ -0,0 +1,73 @@
+"""Unit tests of the reset of the data."""
+import contextlib
+import datetime
+import io
+from django.contrib.auth.models import Group
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from lessons.data_reset import RESET_MODELS, reset_data
+from lessons.models import User, SchoolTerm
+from lessons.student_dashboard import get_student_dashboard_cache_key
+from lessons.term_index import get_term_index
+from lessons.teacher_schedule import get_teacher_schedule_index
+
+
+class DataResetTestCase(TestCase):
+    """Unit tests of the reset of the data."""
+
+    def _seed(self, number_of_students):
+        with contextlib.redirect_stdout(io.StringIO()):
+            call_command('seed', '--fast', '--students', str(number_of_students), '--seed', '1')
+
+    def test_reset_empties_every_table(self):
+        self._seed(5)
+        self.client.login(email='john.doe@example.org', password='Password123')
+        with contextlib.redirect_stdout(io.StringIO()):
+            call_command('reset')
+        for model in RESET_MODELS:
+            self.assertFalse(model.objects.exists(), model.__name__)
+        self.assertFalse(Session.objects.exists())
+
+    def test_reset_keeps_the_groups(self):
+        self._seed(2)
+        reset_data()
+        self.assertEqual(set(Group.objects.values_list('name', flat=True)), {'Admin', 'Student'})
+
+    def test_reset_resets_the_ids(self):
+        self._seed(3)
+        reset_data()
+        user = User.objects.create_user(email='new.user@example.org', password='Password123', first_name='New',
+                                        last_name='User')
+        self.assertEqual(user.id, 1)
+
+    def _count_queries_of_reset(self):
+        with CaptureQueriesContext(connection) as queries:
+            reset_data()
+        return len(queries)
+
+    def test_statements_of_reset_do_not_grow_with_the_data(self):
+        self._seed(2)
+        queries_of_small_reset = self._count_queries_of_reset()
+        self._seed(12)
+        self.assertEqual(self._count_queries_of_reset(), queries_of_small_reset)
+
+    def test_reset_drops_what_is_derived_from_the_data(self):
+        self._seed(2)
+        get_teacher_schedule_index()
+        self.assertIsNotNone(get_term_index().find_term(datetime.date(2022, 9, 1)))
+        dashboard_key = get_student_dashboard_cache_key(User.objects.first().id)
+        cache.set(dashboard_key, 'stale')
+        cache.set('other_application', 'kept')
+        self.addCleanup(cache.delete, 'other_application')
+        with self.settings(STUDENT_DASHBOARD_CACHE_TIMEOUT=60):
+            reset_data()
+        SchoolTerm.objects.bulk_create([SchoolTerm(term_name='Term one', start_date=datetime.date(2030, 9, 1),
+                                                   end_date=datetime.date(2030, 10, 21))])
+        self.assertIsNone(get_term_index().find_term(datetime.date(2022, 9, 1)))
+        self.assertEqual(len(get_teacher_schedule_index().booking_slots), 0)
+        self.assertIsNone(cache.get(dashboard_key))
+        self.assertEqual(cache.get('other_application'), 'kept')
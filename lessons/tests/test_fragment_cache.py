@@ -0,0 +1,144 @@
+"""Unit tests of the caching of template fragments."""
+import datetime
+import os
+import shutil
+import tempfile
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from lessons.data_reset import reset_data
+from lessons.fragment_cache import get_cached_fragment, get_fragment_cache
+from lessons.models import User, SchoolTerm
+from lessons.tests.helpers import create_user_groups, HandleGroups
+
+
+@override_settings(FRAGMENT_CACHE_TIMEOUT=60)
+class FragmentCacheTestCase(TestCase):
+    """Unit tests of the caching of template fragments."""
+
+    fixtures = ['lessons/tests/fixtures/default_user.json', 'lessons/tests/fixtures/other_users.json']
+
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        file_caches = {**settings.CACHES, 'fragments_file': {**settings.CACHES['fragments_file'], 'LOCATION': location}}
+        cache_settings = self.settings(CACHES=file_caches)
+        cache_settings.enable()
+        self.addCleanup(cache_settings.disable)
+        get_fragment_cache().clear()
+        create_user_groups()
+        HandleGroups.set_default_user_to_student()
+        HandleGroups.set_other_user_to_admin()
+        self.director = User.objects.get(email='bobdylan@email.com')
+        self.director.is_superuser = True
+        self.director.save()
+        for term_number in range(6):
+            start_date = datetime.date(2030, 1, 1) + datetime.timedelta(days=60 * term_number)
+            SchoolTerm.objects.create(term_name=f'Term {term_number}', start_date=start_date,
+                                      end_date=start_date + datetime.timedelta(days=30))
+
+    def _log_in_as_admin(self):
+        self.client.login(email='janedoe@email.com', password='Password123')
+
+    def _get_queries(self, url_name):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(url_name))
+        return response, [query['sql'] for query in queries]
+
+    def _count_term_queries(self, queries):
+        return len([query for query in queries if 'FROM "lessons_schoolterm"' in query])
+
+    def test_cached_term_table_skips_the_term_query(self):
+        self._log_in_as_admin()
+        first_response, first_queries = self._get_queries('admin_term_view')
+        second_response, second_queries = self._get_queries('admin_term_view')
+        self.assertEqual(self._count_term_queries(first_queries), 1)
+        self.assertEqual(self._count_term_queries(second_queries), 0)
+        self.assertEqual(first_response.content, second_response.content)
+
+    def test_creating_a_term_invalidates_the_term_table(self):
+        self._log_in_as_admin()
+        self.client.get(reverse('admin_term_view'))
+        SchoolTerm.objects.create(term_name='New term', start_date=datetime.date(2031, 1, 1),
+                                  end_date=datetime.date(2031, 2, 1))
+        response = self.client.get(reverse('admin_term_view'))
+        self.assertContains(response, 'New term')
+
+    def test_changing_and_deleting_terms_invalidates_the_term_table(self):
+        self._log_in_as_admin()
+        self.client.get(reverse('admin_term_view'))
+        term = SchoolTerm.objects.get(term_name='Term 0')
+        term.term_name = 'Renamed term'
+        term.save()
+        self.assertContains(self.client.get(reverse('admin_term_view')), 'Renamed term')
+        term.delete()
+        self.assertNotContains(self.client.get(reverse('admin_term_view')), 'Renamed term')
+
+    def test_reset_invalidates_the_term_table(self):
+        self._log_in_as_admin()
+        self.client.get(reverse('admin_term_view'))
+        reset_data()
+        create_user_groups()
+        User.objects.create_user(email='janedoe@email.com', password='Password123', first_name='Jane',
+                                 last_name='Doe')
+        HandleGroups.set_other_user_to_admin()
+        self._log_in_as_admin()
+        self.assertContains(self.client.get(reverse('admin_term_view')), 'No terms yet...')
+
+    def test_admin_page_shows_the_first_five_terms(self):
+        self._log_in_as_admin()
+        self.client.get(reverse('admin_term_view'))
+        response = self.client.get(reverse('admin_page'))
+        self.assertContains(response, 'Term 4')
+        self.assertNotContains(response, 'Term 5')
+        self.assertContains(self.client.get(reverse('admin_term_view')), 'Term 5')
+
+    def test_term_tables_of_different_pages_are_cached_separately(self):
+        self._log_in_as_admin()
+        self.client.get(reverse('admin_page'))
+        self.assertContains(self.client.get(reverse('admin_term_view')), 'Term 5')
+        self.client.logout()
+        self.client.login(email='johndoe@email.com', password='Password123')
+        self.assertNotContains(self.client.get(reverse('student_term_view')), 'Edit Term')
+
+    def test_menus_are_cached_per_role(self):
+        self._log_in_as_admin()
+        self.assertNotContains(self.client.get(reverse('admin_page')), 'Manage Users')
+        self.client.force_login(self.director)
+        self.assertContains(self.client.get(reverse('admin_page')), 'Manage Users')
+        self._log_in_as_admin()
+        self.assertNotContains(self.client.get(reverse('admin_page')), 'Manage Users')
+
+    def test_user_specific_parts_of_menus_are_not_cached(self):
+        self._log_in_as_admin()
+        self.client.get(reverse('admin_page'))
+        self.client.force_login(self.director)
+        response = self.client.get(reverse('admin_page'))
+        self.assertContains(response, f'?user_id={self.director.id}')
+
+    @override_settings(FRAGMENT_CACHE_TIMEOUT=0)
+    def test_fragments_are_not_cached_when_disabled(self):
+        renders = []
+        for _ in range(2):
+            get_cached_fragment('terms_table', [], lambda: renders.append(1) or 'table')
+        self.assertEqual(len(renders), 2)
+
+    def test_fragments_are_cached_in_files_by_default(self):
+        renders = []
+        for _ in range(2):
+            fragment = get_cached_fragment('terms_table', [True], lambda: renders.append(1) or 'table')
+        self.assertEqual(fragment, 'table')
+        self.assertEqual(len(renders), 1)
+        self.assertIs(get_fragment_cache(), caches['fragments_file'])
+        self.assertEqual(len(os.listdir(settings.CACHES['fragments_file']['LOCATION'])), 2)
+
+    @override_settings(FRAGMENT_CACHE_ALIAS='fragments')
+    def test_fragments_can_be_cached_in_memory(self):
+        renders = []
+        for _ in range(2):
+            get_cached_fragment('terms_table', [True], lambda: renders.append(1) or 'table')
+        self.assertEqual(len(renders), 1)
+        self.assertIs(get_fragment_cache(), caches['fragments'])
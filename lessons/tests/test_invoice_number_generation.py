@@ -0,0 +1,46 @@
+"""Unit tests of the invoice number allocation."""
+from django.test import TestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from lessons.models import User, Student, Invoice
+from lessons.tests.helpers import create_user_groups
+from lessons.forms_functions import generate_invoice_number, format_invoice_number
+
+
+class InvoiceNumberGenerationTestCase(TestCase):
+    """Unit tests of the invoice number allocation."""
+
+    fixtures = ['lessons/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        create_user_groups()
+        self.student = Student.objects.create(user=User.objects.get(email="johndoe@email.com"))
+
+    def test_invoice_number_format(self):
+        self.assertEqual(format_invoice_number(1, 1), '0001-001')
+        self.assertEqual(format_invoice_number(123, 45), '0123-045')
+
+    def test_invoice_numbers_follow_the_student_sequence(self):
+        self.assertEqual(generate_invoice_number(self.student), '0001-001')
+        self.assertEqual(generate_invoice_number(self.student), '0001-002')
+        self.assertEqual(Student.objects.get(pk=self.student.pk).invoice_sequence, 2)
+
+    def test_sequence_is_read_from_the_database(self):
+        generate_invoice_number(self.student)
+        stale_student = Student.objects.get(pk=self.student.pk)
+        generate_invoice_number(self.student)
+        self.assertEqual(generate_invoice_number(stale_student), '0001-003')
+
+    def test_numbers_taken_outside_of_the_sequence_are_skipped(self):
+        Invoice.objects.create(invoice_number='0001-001', student=self.student, full_amount=10)
+        Invoice.objects.create(invoice_number='0001-002', student=self.student, full_amount=10)
+        self.assertEqual(generate_invoice_number(self.student), '0001-003')
+
+    def test_allocation_does_not_count_invoices(self):
+        for sequence in range(1, 6):
+            Invoice.objects.create(invoice_number=format_invoice_number(self.student.id, sequence),
+                                   student=self.student, full_amount=10)
+        Student.objects.filter(pk=self.student.pk).update(invoice_sequence=5)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(generate_invoice_number(self.student), '0001-006')
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql']])
@@ -0,0 +1,124 @@
+"""Unit tests of the lesson calendar feed rendering."""
+import datetime
+from django.test import TestCase
+from lessons.lesson_calendar import get_calendar_token, read_calendar_token, render_lesson_calendar, \
+    get_calendar_etag, fold_line, escape_text, MAX_LINE_OCTETS
+from lessons.models import User, DayOfTheWeek, Booking, SchoolTerm, Invoice, Student
+from lessons.tests.helpers import create_user_groups, create_days_of_the_week
+
+
+class LessonCalendarTestCase(TestCase):
+    """Unit tests of the lesson calendar feed rendering."""
+
+    fixtures = ['lessons/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        create_user_groups()
+        create_days_of_the_week()
+        self.user = User.objects.get(email='johndoe@email.com')
+        self.student = Student.objects.create(user=self.user)
+        self.term_one = SchoolTerm.objects.create(term_name='Term one', start_date=datetime.date(2029, 9, 1),
+                                                  end_date=datetime.date(2029, 10, 21))
+        SchoolTerm.objects.create(term_name='Term two', start_date=datetime.date(2029, 10, 31),
+                                  end_date=datetime.date(2029, 12, 16))
+        self.invoice_count = 0
+
+    def _create_booking(self, start_date=datetime.date(2029, 10, 8), number_of_lessons=4,
+                        interval=Booking.IntervalBetweenLessons.ONE_WEEK, further_information='Bring music, please'):
+        self.invoice_count += 1
+        invoice = Invoice.objects.create(invoice_number=f'0001-{self.invoice_count:03}', student=self.student,
+                                         full_amount=100)
+        return Booking.objects.create(
+            user=self.user,
+            relation_id=-1,
+            invoice=invoice,
+            time_of_the_day=datetime.time(12, 0),
+            teacher='Mr Smith',
+            number_of_lessons=number_of_lessons,
+            start_date=start_date,
+            end_date=start_date,
+            term_id=self.term_one,
+            duration_of_lessons=Booking.LessonDuration.FORTY_FIVE_MINUTES,
+            interval_between_lessons=interval,
+            day_of_the_week=DayOfTheWeek.objects.get(order=0),
+            further_information=further_information
+        )
+
+    def _render(self):
+        return render_lesson_calendar(Booking.objects.filter(user=self.user), 'John Doe')
+
+    def test_booking_is_a_single_recurring_event(self):
+        booking = self._create_booking(number_of_lessons=1000)
+        calendar = self._render()
+        self.assertEqual(calendar.count('BEGIN:VEVENT'), 1)
+        self.assertIn(f'UID:booking-{booking.id}@msms\r\n', calendar)
+        self.assertIn('DTSTART:20291008T120000\r\n', calendar)
+        self.assertIn('DURATION:PT45M\r\n', calendar)
+        self.assertIn('RRULE:FREQ=WEEKLY;INTERVAL=1;COUNT=1000\r\n', calendar)
+
+    def test_fortnightly_booking_has_interval_of_two_weeks(self):
+        self._create_booking(interval=Booking.IntervalBetweenLessons.TWO_WEEKS)
+        self.assertIn('RRULE:FREQ=WEEKLY;INTERVAL=2;COUNT=4\r\n', self._render())
+
+    def test_lessons_in_holidays_are_excluded(self):
+        # The third and fourth lessons, on 2029-10-22 and 2029-10-29, fall between the two terms
+        self._create_booking(number_of_lessons=5)
+        self.assertIn('EXDATE:20291022T120000,20291029T120000\r\n', self._render())
+
+    def test_lessons_in_term_time_are_not_excluded(self):
+        self._create_booking(start_date=datetime.date(2029, 11, 5))
+        self.assertNotIn('EXDATE', self._render())
+
+    def test_calendar_is_wrapped_in_a_vcalendar(self):
+        self._create_booking()
+        self._create_booking()
+        calendar = self._render()
+        self.assertTrue(calendar.startswith('BEGIN:VCALENDAR\r\nVERSION:2.0\r\n'))
+        self.assertTrue(calendar.endswith('END:VCALENDAR\r\n'))
+        self.assertEqual(calendar.count('BEGIN:VEVENT'), 2)
+
+    def test_text_is_escaped(self):
+        self.assertEqual(escape_text('a,b;c\\d\ne'), 'a\\,b\\;c\\\\d\\ne')
+        self._create_booking(further_information='Bring music, please')
+        self.assertIn('DESCRIPTION:Bring music\\, please\r\n', self._render())
+
+    def test_long_lines_are_folded(self):
+        line = 'DESCRIPTION:' + 'é' * 100
+        folded = fold_line(line)
+        for folded_line in folded.split('\r\n'):
+            self.assertLessEqual(len(folded_line.encode()), MAX_LINE_OCTETS)
+        self.assertEqual(folded.replace('\r\n ', ''), line)
+
+    def test_calendar_token_round_trip(self):
+        self.assertEqual(read_calendar_token(get_calendar_token(self.user.id, 3)), (self.user.id, 3))
+        self.assertIsNone(read_calendar_token(get_calendar_token(self.user.id) + 'x'))
+        self.assertIsNone(read_calendar_token('not-a-token'))
+
+    def test_etag_changes_when_a_booking_changes(self):
+        booking = self._create_booking()
+        bookings = Booking.objects.filter(user=self.user)
+        etag = get_calendar_etag(bookings)
+        self.assertEqual(get_calendar_etag(bookings), etag)
+
+        booking.teacher = 'Ms Jones'
+        booking.save()
+        self.assertNotEqual(get_calendar_etag(bookings), etag)
+
+    def test_etag_changes_when_a_booking_is_deleted(self):
+        self._create_booking()
+        booking = self._create_booking()
+        bookings = Booking.objects.filter(user=self.user)
+        etag = get_calendar_etag(bookings)
+        booking.delete()
+        self.assertNotEqual(get_calendar_etag(bookings), etag)
+
+    def test_etag_changes_when_terms_change(self):
+        self._create_booking()
+        bookings = Booking.objects.filter(user=self.user)
+        etag = get_calendar_etag(bookings)
+        self.term_one.end_date = datetime.date(2029, 10, 28)
+        self.term_one.save()
+        self.assertNotEqual(get_calendar_etag(bookings), etag)
+
+    def test_etag_without_bookings(self):
+        self.assertTrue(get_calendar_etag(Booking.objects.filter(user=self.user)).startswith('"'))
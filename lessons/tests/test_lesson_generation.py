@@ -2,7 +2,8 @@
 from django.test import TestCase
 from lessons.models import User, DayOfTheWeek, Booking, SchoolTerm, Invoice, Student
 from lessons.tests.helpers import create_user_groups, create_days_of_the_week
-from lessons.views_functions import generate_lessons_from_bookings, check_if_lessons_not_in_termtime
+from lessons.views_functions import generate_lessons_from_bookings, check_if_lessons_not_in_termtime, \
+    get_first_future_lesson_index, get_future_lesson_datetimes
 from lessons.utils import Lesson
 import datetime
 
@@ -83,4 +84,34 @@ class LessonGenerationTestCase(TestCase):
         self.booking2.save()
         all_bookings = Booking.objects.all()
         lessons_generated = generate_lessons_from_bookings(all_bookings)
-        self.assertEqual(len(lessons_generated), 0)
\ No newline at end of file
+        self.assertEqual(len(lessons_generated), 0)
+
+    def test_partially_past_bookings_only_generate_future_lessons(self):
+        self.booking1.start_date = datetime.date.today() - datetime.timedelta(days=15)
+        self.booking1.number_of_lessons = 4
+        self.booking1.save()
+        self.booking2.delete()
+        lessons_generated = generate_lessons_from_bookings(Booking.objects.all())
+        self.assertEqual(len(lessons_generated), 2)
+        for lesson in lessons_generated:
+            self.assertGreaterEqual(lesson.date_time, datetime.datetime.today())
+            self.assertEqual(lesson.student_name, "John Doe")
+            self.assertEqual(lesson.duration, "45 mins")
+
+    def test_first_future_lesson_index_is_computed_directly(self):
+        booking = Booking.objects.get(id=self.booking1.id)
+        first_lesson = datetime.datetime.combine(booking.start_date, booking.time_of_the_day)
+        self.assertEqual(get_first_future_lesson_index(booking, first_lesson), 0)
+        self.assertEqual(get_first_future_lesson_index(booking, first_lesson + datetime.timedelta(minutes=1)), 1)
+        self.assertEqual(get_first_future_lesson_index(booking, first_lesson + datetime.timedelta(days=14)), 1)
+        self.assertEqual(get_first_future_lesson_index(booking, first_lesson + datetime.timedelta(days=365)), 4)
+
+    def test_future_lesson_datetimes_are_spaced_by_interval(self):
+        booking = Booking.objects.get(id=self.booking1.id)
+        first_lesson = datetime.datetime.combine(booking.start_date, booking.time_of_the_day)
+        lesson_datetimes = get_future_lesson_datetimes(booking, first_lesson + datetime.timedelta(days=1))
+        self.assertEqual(lesson_datetimes, [
+            first_lesson + datetime.timedelta(days=14),
+            first_lesson + datetime.timedelta(days=28),
+            first_lesson + datetime.timedelta(days=42),
+        ])
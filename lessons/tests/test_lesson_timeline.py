@@ -0,0 +1,124 @@
+"""Unit tests of the paginated lesson timeline."""
+from django.test import TestCase
+from lessons.models import User, DayOfTheWeek, Booking, SchoolTerm, Invoice, Student
+from lessons.tests.helpers import create_user_groups, create_days_of_the_week
+from lessons.lesson_timeline import get_lesson_timeline_page, iterate_lesson_timeline, encode_lesson_cursor, \
+    decode_lesson_cursor, get_bookings_with_lessons_from
+from lessons.views_functions import generate_lessons_from_bookings
+import datetime
+
+
+class LessonTimelineTestCase(TestCase):
+    """Unit tests of the paginated lesson timeline."""
+
+    fixtures = ['lessons/tests/fixtures/default_user.json', 'lessons/tests/fixtures/other_users.json']
+
+    def setUp(self):
+        create_user_groups()
+        create_days_of_the_week()
+        Student(user=User.objects.get(email="johndoe@email.com"), balance=0).save()
+        Student(user=User.objects.get(email="janedoe@email.com"), balance=0).save()
+        SchoolTerm(term_name="Term one", start_date=datetime.date(2029, 9, 1),
+                   end_date=datetime.date(2029, 12, 16)).save()
+        Invoice(invoice_number="0001-001", student=Student.objects.get(user__email="johndoe@email.com"),
+                full_amount=300, paid_amount=0, fully_paid=False).save()
+        Invoice(invoice_number="0002-001", student=Student.objects.get(user__email="janedoe@email.com"),
+                full_amount=500, paid_amount=0, fully_paid=False).save()
+        Invoice(invoice_number="0003-001", student=Student.objects.get(user__email="johndoe@email.com"),
+                full_amount=100, paid_amount=0, fully_paid=False).save()
+
+        self.booking1 = self._create_booking("johndoe@email.com", "0001-001", "2029-11-21", 4,
+                                             Booking.IntervalBetweenLessons.TWO_WEEKS)
+        # Shares its first lesson time with the second lesson of booking1
+        self.booking2 = self._create_booking("janedoe@email.com", "0002-001", "2029-12-05", 5,
+                                             Booking.IntervalBetweenLessons.ONE_WEEK)
+        self.now = datetime.datetime(2029, 1, 1)
+
+    def _create_booking(self, email, invoice_number, start_date, number_of_lessons, interval):
+        return Booking.objects.create(
+            user=User.objects.get(email=email),
+            relation_id=-1,
+            invoice=Invoice.objects.get(invoice_number=invoice_number),
+            time_of_the_day="12:00",
+            teacher="Mr Smith",
+            number_of_lessons=number_of_lessons,
+            start_date=start_date,
+            end_date=start_date,
+            term_id=SchoolTerm.objects.get(term_name="Term one"),
+            duration_of_lessons=Booking.LessonDuration.FORTY_FIVE_MINUTES,
+            interval_between_lessons=interval,
+            day_of_the_week=DayOfTheWeek.objects.get(order=1),
+            further_information="Extra Information"
+        )
+
+    def test_timeline_is_in_date_order(self):
+        lesson_keys = [(date_time, booking_id) for date_time, booking_id, _ in
+                       iterate_lesson_timeline(Booking.objects.all(), now=self.now)]
+        self.assertEqual(len(lesson_keys), 9)
+        self.assertEqual(lesson_keys, sorted(lesson_keys))
+
+    def test_timeline_contains_the_same_lessons_as_full_generation(self):
+        lessons, next_cursor = get_lesson_timeline_page(Booking.objects.all(), page_size=100)
+        generated_lessons = generate_lessons_from_bookings(Booking.objects.all())
+        self.assertIsNone(next_cursor)
+        generated_lessons.sort(key=lambda lesson: (lesson.date_time, lesson.booking.id))
+        self.assertEqual(lessons, generated_lessons)
+
+    def test_pages_follow_each_other_without_gaps_or_duplicates(self):
+        bookings = Booking.objects.all()
+        all_lessons, _ = get_lesson_timeline_page(bookings, page_size=100, now=self.now)
+
+        paged_lessons = []
+        after = None
+        while True:
+            lessons, next_cursor = get_lesson_timeline_page(bookings, page_size=2, now=self.now, after=after)
+            paged_lessons.extend(lessons)
+            if not next_cursor:
+                break
+            after = decode_lesson_cursor(next_cursor)
+
+        self.assertEqual([(l.date_time, l.booking.id) for l in paged_lessons],
+                         [(l.date_time, l.booking.id) for l in all_lessons])
+
+    def test_cursor_breaks_ties_on_booking_id(self):
+        tie = datetime.datetime(2029, 12, 5, 12, 0)
+        lessons, _ = get_lesson_timeline_page(Booking.objects.all(), page_size=1, now=self.now,
+                                              after=(tie, self.booking1.id))
+        self.assertEqual(lessons[0].date_time, tie)
+        self.assertEqual(lessons[0].booking.id, self.booking2.id)
+
+    def test_cursor_round_trip(self):
+        date_time = datetime.datetime(2029, 12, 5, 12, 0)
+        cursor = encode_lesson_cursor(date_time, 12)
+        self.assertEqual(decode_lesson_cursor(cursor), (date_time, 12))
+
+    def test_malformed_cursor_is_ignored(self):
+        self.assertIsNone(decode_lesson_cursor(None))
+        self.assertIsNone(decode_lesson_cursor('not-a-cursor'))
+        self.assertIsNone(decode_lesson_cursor('2029-12-05T12:00:00_abc'))
+
+    def test_bookings_that_ended_before_the_start_are_filtered_out_in_sql(self):
+        booking3 = self._create_booking("johndoe@email.com", "0003-001", "2029-11-28", 1,
+                                        Booking.IntervalBetweenLessons.ONE_WEEK)
+        # The last lessons of booking1 and booking2 are on 2030-01-02
+        self.assertEqual(list(get_bookings_with_lessons_from(Booking.objects.all(), datetime.date(2029, 11, 28))),
+                         [self.booking1, booking3, self.booking2])
+        self.assertEqual(list(get_bookings_with_lessons_from(Booking.objects.all(), datetime.date(2029, 11, 29))),
+                         [self.booking1, self.booking2])
+        self.assertEqual(list(get_bookings_with_lessons_from(Booking.objects.all(), datetime.date(2030, 1, 3))), [])
+
+    def test_timeline_starts_after_ended_bookings(self):
+        lesson_keys = [(date_time, booking_id) for date_time, booking_id, _ in
+                       iterate_lesson_timeline(Booking.objects.all(), now=datetime.datetime(2029, 12, 20))]
+        self.assertEqual(lesson_keys, [(datetime.datetime(2029, 12, 26, 12, 0), self.booking2.id),
+                                       (datetime.datetime(2030, 1, 2, 12, 0), self.booking1.id),
+                                       (datetime.datetime(2030, 1, 2, 12, 0), self.booking2.id)])
+
+    def test_later_bookings_are_merged_once_the_timeline_reaches_them(self):
+        booking3 = self._create_booking("johndoe@email.com", "0003-001", "2029-11-28", 1,
+                                        Booking.IntervalBetweenLessons.ONE_WEEK)
+        lesson_keys = [(date_time, booking_id) for date_time, booking_id, _ in
+                       iterate_lesson_timeline(Booking.objects.all(), now=self.now)]
+        self.assertEqual(lesson_keys[:3], [(datetime.datetime(2029, 11, 21, 12, 0), self.booking1.id),
+                                           (datetime.datetime(2029, 11, 28, 12, 0), booking3.id),
+                                           (datetime.datetime(2029, 12, 5, 12, 0), self.booking1.id)])
@@ -0,0 +1,69 @@
+"""Unit tests of the query budgets of the views."""
+import contextlib
+import io
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from lessons import query_budgets
+from lessons.benchmarks import BENCHMARKED_VIEWS, seed_benchmark_dataset
+from lessons.models import User
+from lessons.query_budgets import QUERY_BUDGETS, QueryBudgetExceeded, check_query_budget
+from lessons.tests.helpers import assert_views_within_query_budgets
+
+
+class QueryBudgetsTestCase(TestCase):
+    """Unit tests of the query budgets of the views."""
+
+    def _set_budget(self, url_name, budget):
+        self.addCleanup(QUERY_BUDGETS.__setitem__, url_name, QUERY_BUDGETS[url_name])
+        QUERY_BUDGETS[url_name] = budget
+
+    def test_every_view_has_a_budget(self):
+        self.assertEqual(set(QUERY_BUDGETS), {view.url_name for view in BENCHMARKED_VIEWS})
+
+    def test_views_are_within_their_budgets(self):
+        # Enough rows that a query per row displayed exceeds any budget
+        seed_benchmark_dataset(30)
+        assert_views_within_query_budgets(self)
+
+    def test_queries_within_budget_are_not_reported(self):
+        with self.assertNoLogs(query_budgets.logger):
+            check_query_budget('home', ['SELECT 1'] * QUERY_BUDGETS['home'])
+
+    def test_views_without_a_budget_are_not_reported(self):
+        with self.assertNoLogs(query_budgets.logger):
+            check_query_budget('unknown', ['SELECT 1'] * 100)
+
+    def test_queries_over_budget_are_logged(self):
+        with self.assertLogs(query_budgets.logger, 'WARNING') as logs:
+            check_query_budget('home', ['SELECT 1'] * (QUERY_BUDGETS['home'] + 1))
+        self.assertIn('home ran 4 queries, over its budget of 3', logs.output[0])
+
+    @override_settings(QUERY_BUDGETS_RAISE=True)
+    def test_queries_over_budget_raise_if_configured(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            check_query_budget('home', ['SELECT 1'] * (QUERY_BUDGETS['home'] + 1))
+
+    @override_settings(QUERY_BUDGETS_ENABLED=True)
+    def test_middleware_checks_pages_against_their_budget(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            call_command('create_groups')
+        user = User.objects.create_user(email='new.user@example.org', password='Password123', first_name='New',
+                                        last_name='User')
+        self.client.force_login(user)
+        self._set_budget('profile', 1)
+        with self.assertLogs(query_budgets.logger, 'WARNING') as logs:
+            self.client.get(reverse('profile'), {'user_id': user.id})
+        self.assertIn('profile ran', logs.output[0])
+
+    @override_settings(QUERY_BUDGETS_ENABLED=False)
+    def test_middleware_is_not_used_unless_enabled(self):
+        self._set_budget('home', 0)
+        with self.assertNoLogs(query_budgets.logger):
+            self.client.get(reverse('home'))
+
+    @override_settings(QUERY_BUDGETS_ENABLED=True)
+    def test_middleware_does_not_check_submitted_forms(self):
+        self._set_budget('log_in', 0)
+        with self.assertNoLogs(query_budgets.logger):
+            self.client.post(reverse('log_in'), {'email': 'nobody@example.org', 'password': 'Password123'})
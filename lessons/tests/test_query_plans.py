@@ -0,0 +1,21 @@
+"""Unit tests of the query plans of the hot queries."""
+from unittest import skipUnless
+from django.core.management import call_command
+from django.test import TestCase
+from lessons.query_plans import explain_hot_queries, can_explain_hot_queries
+
+
+@skipUnless(can_explain_hot_queries(), 'Only the query plans of SQLite databases can be checked.')
+class QueryPlansTestCase(TestCase):
+    """Unit tests of the query plans of the hot queries."""
+
+    def test_hot_queries_use_their_index(self):
+        for query_plan in explain_hot_queries():
+            self.assertTrue(query_plan.uses_index, f'{query_plan.query.name}: {query_plan.plan}')
+
+    def test_hot_queries_do_not_sort_rows(self):
+        for query_plan in explain_hot_queries():
+            self.assertFalse(query_plan.sorts_rows, f'{query_plan.query.name}: {query_plan.plan}')
+
+    def test_check_query_plans_command_passes(self):
+        call_command('check_query_plans')
@@ -0,0 +1,107 @@
+"""Unit tests of the cached reference data."""
+import datetime
+import time
+from unittest import mock
+from django.core.exceptions import ValidationError
+from django.test import TestCase, override_settings
+from lessons.forms import NewRequestForm, BookingEditForm
+from lessons.models import SchoolTerm, DayOfTheWeek
+from lessons.reference_data import ReferenceData, get_school_terms, get_days_of_the_week
+from lessons.tests.helpers import create_days_of_the_week
+from lessons.views_functions import get_upcoming_term
+
+
+class ReferenceDataTestCase(TestCase):
+    """Unit tests of the cached reference data."""
+
+    def setUp(self):
+        create_days_of_the_week()
+        today = datetime.date.today()
+        self.past_term = SchoolTerm.objects.create(term_name='Past term', start_date=today - datetime.timedelta(days=60),
+                                                   end_date=today - datetime.timedelta(days=30))
+        self.next_term = SchoolTerm.objects.create(term_name='Next term', start_date=today + datetime.timedelta(days=30),
+                                                   end_date=today + datetime.timedelta(days=60))
+
+    def _get_term_names(self):
+        return [term.term_name for term in get_school_terms()]
+
+    def test_rows_are_read_in_their_default_order(self):
+        self.assertEqual(get_school_terms(), [self.past_term, self.next_term])
+        self.assertEqual(get_days_of_the_week(), list(DayOfTheWeek.objects.order_by('order')))
+
+    def test_rows_are_only_read_once(self):
+        get_school_terms()
+        get_days_of_the_week()
+        with self.assertNumQueries(0):
+            get_school_terms()
+            get_days_of_the_week()
+
+    def test_saved_and_deleted_rows_are_read_again(self):
+        get_school_terms()
+        self.next_term.term_name = 'Renamed term'
+        self.next_term.save()
+        self.assertEqual(self._get_term_names(), ['Past term', 'Renamed term'])
+        self.past_term.delete()
+        self.assertEqual(self._get_term_names(), ['Renamed term'])
+
+    def test_rows_read_before_a_commit_are_read_again_after_it(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.next_term.term_name = 'Renamed term'
+            self.next_term.save()
+            self.assertEqual(self._get_term_names(), ['Past term', 'Renamed term'])
+        with self.assertNumQueries(1):
+            get_school_terms()
+
+    @override_settings(REFERENCE_DATA_TIMEOUT=60)
+    def test_rows_changed_by_another_process_are_read_again_once_they_expire(self):
+        get_school_terms()
+        # Saved without signals, as by another process whose cache is not shared
+        SchoolTerm.objects.filter(pk=self.next_term.pk).update(term_name='Renamed term')
+        self.assertEqual(self._get_term_names(), ['Past term', 'Next term'])
+        with mock.patch('time.time', return_value=time.time() + 61):
+            self.assertEqual(self._get_term_names(), ['Past term', 'Renamed term'])
+
+    def test_rows_are_shared_through_the_cache_until_they_change(self):
+        first_process = ReferenceData('lessons.SchoolTerm')
+        second_process = ReferenceData('lessons.SchoolTerm')
+        self.addCleanup(first_process.invalidate)
+        with self.assertNumQueries(1):
+            first_process.all()
+        with self.assertNumQueries(0):
+            self.assertEqual(second_process.all(), [self.past_term, self.next_term])
+        first_process.invalidate()
+        with self.assertNumQueries(1):
+            second_process.all()
+
+    def test_day_fields_are_rendered_and_validated_without_queries(self):
+        days = get_days_of_the_week()
+        with self.assertNumQueries(0):
+            form = NewRequestForm()
+            rendered_field = str(form['availability'])
+            availability = form.fields['availability'].clean([str(days[2].pk), str(days[0].pk)])
+            day_of_the_week = BookingEditForm().fields['day_of_the_week'].clean(str(days[4].pk))
+        self.assertIn('Wednesday', rendered_field)
+        self.assertEqual(availability, [days[0], days[2]])
+        self.assertEqual(day_of_the_week, days[4])
+
+    def test_day_fields_reject_unknown_days(self):
+        get_days_of_the_week()
+        with self.assertRaises(ValidationError):
+            NewRequestForm().fields['availability'].clean(['9999'])
+        with self.assertRaises(ValidationError):
+            BookingEditForm().fields['day_of_the_week'].clean('9999')
+
+    def test_term_validation_reads_terms_from_the_database(self):
+        get_school_terms()
+        # Created without signals, as by another process whose cache is not shared
+        SchoolTerm.objects.bulk_create([SchoolTerm(term_name='Later term', start_date=datetime.date(2040, 1, 1),
+                                                   end_date=datetime.date(2040, 2, 1))])
+        overlapping_term = SchoolTerm(term_name='Overlapping term', start_date=datetime.date(2040, 1, 15),
+                                      end_date=datetime.date(2040, 3, 1))
+        with self.assertRaises(ValidationError):
+            overlapping_term.clean()
+
+    def test_upcoming_term_is_found_in_cached_terms(self):
+        get_school_terms()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_upcoming_term(), self.next_term)
@@ -0,0 +1,99 @@
+"""Unit tests of the profiling of requests."""
+import os
+import pstats
+import shutil
+import tempfile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from lessons.request_profiling import get_collapsed_stacks
+from lessons.tests.helpers import create_user_groups, HandleGroups
+
+
+class RequestProfilingTestCase(TestCase):
+    """Unit tests of the profiling of requests."""
+
+    fixtures = ['lessons/tests/fixtures/default_user.json', 'lessons/tests/fixtures/other_users.json']
+
+    def setUp(self):
+        create_user_groups()
+        HandleGroups.set_default_user_to_student()
+        HandleGroups.set_other_user_to_admin()
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+        settings_override = override_settings(PROFILING_OUTPUT_DIR=self.output_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _get_profiles(self, extension):
+        return [name for name in os.listdir(self.output_dir) if name.endswith(extension)]
+
+    def _log_in_as_admin(self):
+        self.client.login(email='janedoe@email.com', password='Password123')
+
+    def test_requests_are_not_profiled_by_default(self):
+        self._log_in_as_admin()
+        response = self.client.get(reverse('admin_page'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(os.listdir(self.output_dir), [])
+
+    def test_admin_can_profile_with_query_flag(self):
+        self._log_in_as_admin()
+        response = self.client.get(reverse('admin_page'), {'profile': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Server-Timing', response)
+        self.assertEqual(len(self._get_profiles('.collapsed')), 1)
+        self.assertEqual(len(self._get_profiles('.prof')), 1)
+        self.assertIn('admin_page', self._get_profiles('.collapsed')[0])
+
+    def test_admin_can_profile_with_header(self):
+        self._log_in_as_admin()
+        response = self.client.get(reverse('admin_page'), HTTP_X_PROFILE='1')
+        self.assertIn('Server-Timing', response)
+        self.assertEqual(len(self._get_profiles('.collapsed')), 1)
+
+    def test_students_cannot_profile(self):
+        self.client.login(email='johndoe@email.com', password='Password123')
+        response = self.client.get(reverse('student_page'), {'profile': 1}, HTTP_X_PROFILE='1')
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(os.listdir(self.output_dir), [])
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_sampled_requests_are_profiled(self):
+        response = self.client.get(reverse('log_in'))
+        self.assertIn('Server-Timing', response)
+        self.assertEqual(len(self._get_profiles('.collapsed')), 1)
+
+    def test_timings_separate_sql_and_templates(self):
+        self._log_in_as_admin()
+        response = self.client.get(reverse('admin_page'), {'profile': 1})
+        timings = dict(timing.split(';dur=') for timing in response['Server-Timing'].split(', '))
+        self.assertEqual(set(timings), {'total', 'sql', 'python', 'template'})
+        self.assertGreater(float(timings['sql']), 0)
+        self.assertGreater(float(timings['template']), 0)
+        self.assertAlmostEqual(float(timings['total']), float(timings['sql']) + float(timings['python']), delta=0.2)
+
+    def test_collapsed_stacks_can_be_read_by_flamegraph_tools(self):
+        self._log_in_as_admin()
+        self.client.get(reverse('admin_page'), {'profile': 1})
+        with open(os.path.join(self.output_dir, self._get_profiles('.collapsed')[0])) as collapsed_file:
+            lines = collapsed_file.read().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, microseconds = line.rsplit(' ', 1)
+            self.assertGreater(int(microseconds), 0)
+        self.assertTrue(any('admin_page (lessons/views.py' in line for line in lines))
+
+    def test_collapsed_stacks_split_the_time_of_a_function_between_its_callers(self):
+        stats = pstats.Stats()
+        main, first_caller, second_caller, shared = ('app.py', 1, 'main'), ('app.py', 2, 'first'), \
+            ('app.py', 3, 'second'), ('app.py', 4, 'shared')
+        stats.stats = {
+            main: (1, 1, 0.0, 0.004, {}),
+            first_caller: (1, 1, 0.0, 0.003, {main: (1, 1, 0.0, 0.003)}),
+            second_caller: (1, 1, 0.0, 0.001, {main: (1, 1, 0.0, 0.001)}),
+            shared: (2, 2, 0.004, 0.004, {first_caller: (1, 1, 0.003, 0.003), second_caller: (1, 1, 0.001, 0.001)}),
+        }
+        self.assertEqual(get_collapsed_stacks(stats), {
+            'main (app.py:1);first (app.py:2);shared (app.py:4)': 3000,
+            'main (app.py:1);second (app.py:3);shared (app.py:4)': 1000,
+        })
@@ -0,0 +1,97 @@
+"""Unit tests of the fast mode of the seed command."""
+import contextlib
+import io
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import TestCase
+from lessons.management.commands.seed import Command as SeedCommand
+from lessons.models import User, Student, Request, Booking, Invoice, BankTransaction, StudentLedger
+from lessons.statement_import import INVOICE_NUMBER_PATTERN
+from lessons.tests.helpers import create_user_groups
+
+
+class FastSeedTestCase(TestCase):
+    """Unit tests of the fast mode of the seed command."""
+
+    def setUp(self):
+        batch_size = SeedCommand.FAST_SEED_BATCH_SIZE
+        SeedCommand.FAST_SEED_BATCH_SIZE = 4
+        self.addCleanup(setattr, SeedCommand, 'FAST_SEED_BATCH_SIZE', batch_size)
+
+    def _seed(self, *args):
+        with contextlib.redirect_stdout(io.StringIO()):
+            call_command('seed', '--fast', *args)
+
+    def _get_seeded_data(self):
+        return (
+            list(User.objects.order_by('email').values_list('email', 'first_name', 'last_name')),
+            list(Student.objects.order_by('user__email').values_list('balance', 'invoice_sequence')),
+            list(Request.objects.order_by('user__email', 'date').values_list(
+                'number_of_lessons', 'duration_of_lessons', 'interval_between_lessons', 'fulfilled', 'date')),
+            list(Booking.objects.order_by('user__email', 'start_date').values_list('teacher', 'time_of_the_day')),
+            list(Invoice.objects.order_by('student__user__email').values_list('full_amount', 'paid_amount')),
+        )
+
+    def test_fast_seed_creates_the_number_of_students(self):
+        self._seed('--students', '10')
+        # John Doe is created along with the random students
+        self.assertEqual(Student.objects.count(), 11)
+        self.assertEqual(User.objects.filter(groups__name='Student').count(), 11)
+        self.assertEqual(StudentLedger.objects.count(), 11)
+
+    def test_fast_seeded_students_can_log_in(self):
+        self._seed('--students', '5')
+        for user in User.objects.filter(email__endswith='@example.org').exclude(email='john.doe@example.org'):
+            self.assertTrue(user.check_password(SeedCommand.PASSWORD_FOR_ALL))
+
+    def test_fast_seeded_records_are_consistent(self):
+        self._seed('--students', '10', '--seed', '1')
+        for request in Request.objects.exclude(relation_id=-1):
+            self.assertEqual(request.child.parent_id, request.user_id)
+        self.assertFalse(Request.objects.filter(relation_id=-1, child__isnull=False).exists())
+        self.assertEqual(Booking.objects.count(), Request.objects.filter(fulfilled=True).count())
+        self.assertEqual(Booking.objects.exclude(relation_id=-1).filter(child__isnull=True).count(), 0)
+        self.assertFalse(Request.objects.filter(availability=None).exists())
+        for invoice in Invoice.objects.all():
+            self.assertEqual(invoice.fully_paid, invoice.paid_amount == invoice.full_amount)
+            self.assertTrue(invoice.invoice_number.startswith(f'{invoice.student_id:04d}-'))
+        for ledger in StudentLedger.objects.all():
+            invoices = Invoice.objects.filter(student_id=ledger.student_id)
+            self.assertEqual(ledger.invoiced, invoices.aggregate(total=Sum('full_amount'))['total'] or 0)
+            self.assertEqual(ledger.paid, invoices.aggregate(total=Sum('paid_amount'))['total'] or 0)
+
+    def test_fast_seeded_invoices_of_students_past_id_9999_are_valid(self):
+        # SQLite never gives the id of a deleted row again, so the seeded students get five digit ids
+        create_user_groups()
+        user = User.objects.create_user(id=9999, email='last.user@example.org', password='Password123',
+                                        first_name='Last', last_name='User')
+        Student.objects.create(id=9999, user=user)
+        user.delete()
+        self._seed('--students', '5', '--seed', '1')
+        invoices = Invoice.objects.all()
+        self.assertTrue(invoices.exists())
+        for invoice in invoices:
+            self.assertGreater(invoice.student_id, 9999)
+            invoice.full_clean()
+            self.assertEqual(INVOICE_NUMBER_PATTERN.search(f'Lessons {invoice.invoice_number}').group(),
+                             invoice.invoice_number)
+
+    def test_fast_seed_credits_overpayments_to_the_balance(self):
+        self._seed('--students', '20', '--seed', '1')
+        paid = BankTransaction.objects.aggregate(total=Sum('amount'))['total']
+        applied = Invoice.objects.aggregate(total=Sum('paid_amount'))['total']
+        credited = Student.objects.aggregate(total=Sum('balance'))['total']
+        self.assertEqual(paid, applied + credited)
+
+    def test_fast_seed_is_deterministic(self):
+        self._seed('--students', '6', '--seed', '42')
+        seeded_data = self._get_seeded_data()
+        with contextlib.redirect_stdout(io.StringIO()):
+            call_command('unseed')
+        self._seed('--students', '6', '--seed', '42')
+        self.assertEqual(self._get_seeded_data(), seeded_data)
+
+    def test_fast_seed_does_nothing_if_the_database_is_not_empty(self):
+        self._seed('--students', '2')
+        self._seed('--students', '2')
+        self.assertEqual(Student.objects.count(), 3)
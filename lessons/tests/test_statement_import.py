@@ -0,0 +1,143 @@
+"""Unit tests of the bank statement import."""
+import datetime
+import os
+import tempfile
+from decimal import Decimal
+from django.core.management import call_command
+from django.test import TestCase
+from lessons.models import User, Student, Invoice, BankTransaction
+from lessons.statement_import import import_bank_statement, get_statement_format
+from lessons.tests.helpers import create_user_groups
+
+
+class StatementImportTestCase(TestCase):
+    """Unit tests of the bank statement import."""
+
+    fixtures = ['lessons/tests/fixtures/default_user.json', 'lessons/tests/fixtures/other_users.json']
+
+    def setUp(self):
+        create_user_groups()
+        self.john = Student.objects.create(user=User.objects.get(email='johndoe@email.com'))
+        self.jane = Student.objects.create(user=User.objects.get(email='janedoe@email.com'))
+        Invoice.objects.create(invoice_number='0001-001', student=self.john, full_amount='100.00')
+        Invoice.objects.create(invoice_number='0001-002', student=self.john, full_amount='50.00')
+        Invoice.objects.create(invoice_number='0002-001', student=self.jane, full_amount='80.00')
+
+    def _csv(self, *rows):
+        return ['date,amount,reference\n'] + [row + '\n' for row in rows]
+
+    def test_payments_are_matched_to_invoices(self):
+        result = import_bank_statement(self._csv(
+            '2022-01-10,40.00,Payment 0001-001',
+            '2022-01-11,80.00,INV 0002-001 Jane Doe',
+        ))
+        self.assertEqual(result.imported, 2)
+        self.assertEqual(result.rejected, [])
+        self.assertEqual(BankTransaction.objects.count(), 2)
+        self.assertEqual(Invoice.objects.get(invoice_number='0001-001').paid_amount, Decimal('40.00'))
+        self.assertFalse(Invoice.objects.get(invoice_number='0001-001').fully_paid)
+        self.assertTrue(Invoice.objects.get(invoice_number='0002-001').fully_paid)
+        transaction = BankTransaction.objects.get(invoice_id='0002-001')
+        self.assertEqual(transaction.student, self.jane)
+        self.assertEqual(transaction.date, datetime.date(2022, 1, 11))
+
+    def test_payments_to_the_same_invoice_are_accumulated_and_overpayment_is_credited(self):
+        import_bank_statement(self._csv(
+            '2022-01-10,30.00,0001-002',
+            '2022-01-11,30.00,0001-002',
+            '2022-01-12,5.00,0001-002',
+        ))
+        invoice = Invoice.objects.get(invoice_number='0001-002')
+        self.assertEqual(invoice.paid_amount, Decimal('50.00'))
+        self.assertTrue(invoice.fully_paid)
+        self.assertEqual(Student.objects.get(pk=self.john.pk).balance, Decimal('15.00'))
+
+    def test_import_matches_payments_one_by_one_saving(self):
+        for amount in ['30.00', '30.00', '5.00']:
+            BankTransaction.objects.create(date=datetime.date(2022, 1, 10), student=self.jane,
+                                           invoice=Invoice.objects.get(invoice_number='0002-001'), amount=amount)
+        import_bank_statement(self._csv('2022-01-10,30.00,0001-001', '2022-01-11,30.00,0001-001',
+                                        '2022-01-12,5.00,0001-001'))
+        saved_invoice = Invoice.objects.get(invoice_number='0002-001')
+        imported_invoice = Invoice.objects.get(invoice_number='0001-001')
+        self.assertEqual(imported_invoice.paid_amount, Decimal('65.00'))
+        self.assertEqual(saved_invoice.paid_amount, Decimal('65.00'))
+        self.assertEqual(imported_invoice.fully_paid, saved_invoice.fully_paid)
+
+    def test_invalid_lines_are_rejected(self):
+        future_date = (datetime.date.today() + datetime.timedelta(days=5)).isoformat()
+        result = import_bank_statement(self._csv(
+            'not a date,10.00,0001-001',
+            '2022-01-10,ten,0001-001',
+            '2022-01-10,-10.00,0001-001',
+            '2022-01-10,10.00,no reference',
+            '2022-01-10,10.00,9999-999',
+            f'{future_date},10.00,0001-001',
+            '10/01/2022,10.00,0001-001',
+        ))
+        self.assertEqual(result.imported, 1)
+        self.assertEqual([line_number for line_number, _ in result.rejected], [2, 3, 4, 5, 6, 7])
+        self.assertEqual(BankTransaction.objects.count(), 1)
+
+    def test_ofx_statement(self):
+        result = import_bank_statement([
+            '<OFX>\n',
+            '<BANKTRANLIST>\n',
+            '<STMTTRN>\n',
+            '<TRNTYPE>CREDIT\n',
+            '<DTPOSTED>20220110120000[0:GMT]\n',
+            '<TRNAMT>100.00\n',
+            '<NAME>J DOE\n',
+            '<MEMO>LESSONS 0001-001\n',
+            '</STMTTRN>\n',
+            '<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20220111<TRNAMT>-5.00<MEMO>FEE 0001-002</STMTTRN>\n',
+            '</BANKTRANLIST>\n',
+            '</OFX>\n',
+        ], 'ofx')
+        self.assertEqual(result.imported, 1)
+        self.assertEqual(len(result.rejected), 1)
+        self.assertTrue(Invoice.objects.get(invoice_number='0001-001').fully_paid)
+
+    def test_query_count_does_not_depend_on_statement_size(self):
+        with self.assertNumQueries(9):
+            import_bank_statement(self._csv('2022-01-10,1.00,0001-001'))
+        with self.assertNumQueries(9):
+            import_bank_statement(self._csv(*['2022-01-10,1.00,0001-001', '2022-01-10,1.00,0002-001'] * 50))
+
+    def test_lines_imported_before_are_skipped(self):
+        import_bank_statement(self._csv('2022-01-10,40.00,Payment 0001-001'))
+        result = import_bank_statement(self._csv(
+            '2022-01-10,40,Payment  0001-001',
+            '2022-01-11,40.00,Payment 0001-001',
+        ))
+        self.assertEqual(result.imported, 1)
+        self.assertEqual(result.rejected, [(2, 'Already imported.')])
+        self.assertEqual(BankTransaction.objects.count(), 2)
+        self.assertEqual(Invoice.objects.get(invoice_number='0001-001').paid_amount, Decimal('80.00'))
+
+    def test_identical_lines_of_one_statement_are_all_imported_once(self):
+        statement = self._csv('2022-01-10,10.00,0001-001', '2022-01-10,10.00,0001-001')
+        self.assertEqual(import_bank_statement(statement).imported, 2)
+        self.assertEqual(import_bank_statement(statement).imported, 0)
+        self.assertEqual(Invoice.objects.get(invoice_number='0001-001').paid_amount, Decimal('20.00'))
+
+    def test_ofx_lines_are_identified_by_their_bank_reference(self):
+        def ofx_statement(memo):
+            return [f'<STMTTRN><DTPOSTED>20220110<TRNAMT>10.00<FITID>TX1<MEMO>{memo}</STMTTRN>\n']
+
+        import_bank_statement(ofx_statement('LESSONS 0001-001'), 'ofx')
+        result = import_bank_statement(ofx_statement('LESSONS 0001-001 J DOE'), 'ofx')
+        self.assertEqual(result.rejected, [(1, 'Already imported.')])
+        self.assertEqual(BankTransaction.objects.count(), 1)
+
+    def test_statement_format_is_guessed_from_file_name(self):
+        self.assertEqual(get_statement_format('statement.OFX'), 'ofx')
+        self.assertEqual(get_statement_format('statement.csv'), 'csv')
+
+    def test_management_command_imports_statement(self):
+        statement = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False)
+        self.addCleanup(os.remove, statement.name)
+        statement.writelines(self._csv('2022-01-10,100.00,0001-001'))
+        statement.close()
+        call_command('import_bank_statement', statement.name)
+        self.assertTrue(Invoice.objects.get(invoice_number='0001-001').fully_paid)
@@ -0,0 +1,140 @@
+"""Unit tests of the student dashboard service."""
+import datetime
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from lessons.models import User, DayOfTheWeek, Booking, SchoolTerm, Invoice, Student, Request, BankTransaction
+from lessons.tests.helpers import create_user_groups, create_days_of_the_week
+from lessons.student_dashboard import get_student_dashboard, build_student_dashboard, DASHBOARD_SECTION_SIZE
+
+
+class StudentDashboardTestCase(TestCase):
+    """Unit tests of the student dashboard service."""
+
+    fixtures = ['lessons/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        create_user_groups()
+        create_days_of_the_week()
+        cache.clear()
+        self.user = User.objects.get(email='johndoe@email.com')
+        self.student = Student.objects.create(user=self.user, balance=10)
+        self.term = SchoolTerm.objects.create(term_name='Term one', start_date=datetime.date(2029, 9, 1),
+                                              end_date=datetime.date(2029, 12, 16))
+        self.invoice_count = 0
+
+    def _create_invoice(self):
+        self.invoice_count += 1
+        return Invoice.objects.create(invoice_number=f'0001-{self.invoice_count:03}', student=self.student,
+                                      full_amount=100, paid_amount=0, fully_paid=False)
+
+    def _create_rows(self, count):
+        for index in range(count):
+            Request.objects.create(
+                user=self.user,
+                relation_id=-1,
+                date=timezone.now() - datetime.timedelta(days=index),
+                number_of_lessons=1,
+                interval_between_lessons=Request.IntervalBetweenLessons.ONE_WEEK,
+                duration_of_lessons=Request.LessonDuration.THIRTY_MINUTES,
+                further_information='Some information'
+            )
+            invoice = self._create_invoice()
+            Booking.objects.create(
+                user=self.user,
+                relation_id=-1,
+                invoice=invoice,
+                time_of_the_day='12:00',
+                teacher='Mr Smith',
+                number_of_lessons=1,
+                start_date=datetime.date(2029, 9, 1) + datetime.timedelta(days=index),
+                end_date=datetime.date(2029, 9, 1) + datetime.timedelta(days=index),
+                term_id=self.term,
+                duration_of_lessons=Booking.LessonDuration.THIRTY_MINUTES,
+                interval_between_lessons=Booking.IntervalBetweenLessons.ONE_WEEK,
+                day_of_the_week=DayOfTheWeek.objects.get(order=0),
+                further_information='Some information'
+            )
+            BankTransaction.objects.create(date=datetime.date(2022, 1, 1), student=self.student,
+                                           amount=1, invoice=invoice)
+
+    def _count_dashboard_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            get_student_dashboard(self.user)
+        return len(queries)
+
+    def test_dashboard_sections_are_limited(self):
+        self._create_rows(DASHBOARD_SECTION_SIZE + 2)
+        dashboard = get_student_dashboard(self.user)
+        self.assertEqual(len(dashboard.requests), DASHBOARD_SECTION_SIZE)
+        self.assertEqual(len(dashboard.bookings), DASHBOARD_SECTION_SIZE)
+        self.assertEqual(len(dashboard.invoices), DASHBOARD_SECTION_SIZE)
+        self.assertEqual(len(dashboard.transactions), DASHBOARD_SECTION_SIZE)
+
+    def test_dashboard_sections_are_latest_first(self):
+        self._create_rows(DASHBOARD_SECTION_SIZE + 2)
+        dashboard = get_student_dashboard(self.user)
+        self.assertEqual(dashboard.requests[0].id, Request.objects.order_by('-date').first().id)
+        self.assertEqual(dashboard.bookings[0].id, Booking.objects.order_by('-start_date').first().id)
+        self.assertEqual(dashboard.invoices[0].invoice_number, f'0001-{self.invoice_count:03}')
+
+    def test_dashboard_rows_are_formatted(self):
+        self._create_rows(1)
+        dashboard = get_student_dashboard(self.user)
+        self.assertEqual(dashboard.requests[0].student_name, 'John Doe')
+        self.assertEqual(dashboard.bookings[0].student_name, 'John Doe')
+        self.assertEqual(dashboard.balance, Student.objects.get(user=self.user).balance)
+
+    def test_dashboard_of_user_who_is_not_a_student(self):
+        self.student.delete()
+        dashboard = get_student_dashboard(self.user)
+        self.assertIsNone(dashboard.balance)
+        self.assertEqual(dashboard.invoices, [])
+        self.assertEqual(dashboard.transactions, [])
+
+    def test_query_count_does_not_depend_on_number_of_rows(self):
+        self._create_rows(1)
+        few_rows_queries = self._count_dashboard_queries()
+        self._create_rows(DASHBOARD_SECTION_SIZE * 2)
+        self.assertEqual(self._count_dashboard_queries(), few_rows_queries)
+
+    def test_dashboard_is_not_cached_by_default(self):
+        get_student_dashboard(self.user)
+        self.assertGreater(self._count_dashboard_queries(), 0)
+
+    @override_settings(STUDENT_DASHBOARD_CACHE_TIMEOUT=60)
+    def test_cached_dashboard_does_not_query(self):
+        get_student_dashboard(self.user)
+        self.assertEqual(self._count_dashboard_queries(), 0)
+
+    @override_settings(STUDENT_DASHBOARD_CACHE_TIMEOUT=60)
+    def test_cached_dashboard_is_invalidated_by_new_invoice(self):
+        get_student_dashboard(self.user)
+        self._create_invoice()
+        self.assertEqual(len(get_student_dashboard(self.user).invoices), 1)
+
+    @override_settings(STUDENT_DASHBOARD_CACHE_TIMEOUT=60)
+    def test_cached_dashboard_is_invalidated_by_new_request_and_booking(self):
+        get_student_dashboard(self.user)
+        self._create_rows(1)
+        dashboard = get_student_dashboard(self.user)
+        self.assertEqual(len(dashboard.requests), 1)
+        self.assertEqual(len(dashboard.bookings), 1)
+        self.assertEqual(len(dashboard.transactions), 1)
+
+    @override_settings(STUDENT_DASHBOARD_CACHE_TIMEOUT=60)
+    def test_cached_dashboard_is_invalidated_by_balance_change(self):
+        get_student_dashboard(self.user)
+        self.student.balance = 25
+        self.student.save()
+        self.assertEqual(get_student_dashboard(self.user).balance, 25)
+
+    @override_settings(STUDENT_DASHBOARD_CACHE_TIMEOUT=60)
+    def test_cache_is_per_user(self):
+        other_user = User.objects.create_user(email='other@email.com', password='Password123',
+                                              first_name='Other', last_name='User')
+        get_student_dashboard(self.user)
+        self.assertIsNone(get_student_dashboard(other_user).balance)
+        self.assertEqual(build_student_dashboard(self.user).balance, self.student.balance)
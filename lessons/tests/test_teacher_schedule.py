@@ -0,0 +1,251 @@
+"""Unit tests of the teacher schedule index."""
+import datetime
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from lessons.models import User, DayOfTheWeek, Booking, SchoolTerm, Invoice, Student, DataVersion
+from lessons.teacher_schedule import TeacherScheduleIndex, TEACHER_SCHEDULE_VERSION, get_teacher_schedule_index, \
+    remove_from_teacher_schedule, update_teacher_schedule, invalidate_teacher_schedule_index, get_teacher_version_name
+from lessons.tests.helpers import create_user_groups, create_days_of_the_week
+
+
+class TeacherScheduleIndexTestCase(TestCase):
+    """Unit tests of the teacher schedule index."""
+
+    fixtures = ['lessons/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        create_user_groups()
+        create_days_of_the_week()
+        self.user = User.objects.get(email='johndoe@email.com')
+        self.student = Student.objects.create(user=self.user)
+        self.term = SchoolTerm.objects.create(term_name='Term one', start_date=datetime.date(2029, 9, 1),
+                                              end_date=datetime.date(2029, 12, 16))
+        self.monday = DayOfTheWeek.objects.get(day=DayOfTheWeek.Day.MONDAY)
+        self.index = TeacherScheduleIndex([
+            (1, 'Mr Smith', 'Monday', datetime.time(10, 0), 45, datetime.date(2029, 9, 3), 7, 4),
+            (2, 'Mr Smith', 'Monday', datetime.time(13, 0), 60, datetime.date(2029, 9, 3), 7, 1),
+            (3, 'Ms Jones', 'Monday', datetime.time(10, 0), 30, datetime.date(2029, 9, 3), 7, 1),
+        ])
+
+    def _find_conflicts(self, teacher='Mr Smith', day='Monday', time=datetime.time(10, 30), duration=30,
+                        start_date=datetime.date(2029, 9, 10), interval=7, number_of_lessons=1, exclude_booking_id=None):
+        return self.index.find_conflicts(teacher, day, time, duration, start_date, interval, number_of_lessons,
+                                         exclude_booking_id)
+
+    def _create_booking(self, teacher, time_of_the_day):
+        invoice = Invoice.objects.create(invoice_number=f'0001-{Invoice.objects.count() + 1:03}', student=self.student,
+                                         full_amount=10, paid_amount=0, fully_paid=False)
+        return Booking.objects.create(
+            user=self.user,
+            relation_id=-1,
+            invoice=invoice,
+            time_of_the_day=time_of_the_day,
+            teacher=teacher,
+            number_of_lessons=1,
+            start_date=datetime.date(2029, 9, 3),
+            end_date=datetime.date(2029, 9, 3),
+            term_id=self.term,
+            duration_of_lessons=Booking.LessonDuration.THIRTY_MINUTES,
+            interval_between_lessons=Booking.IntervalBetweenLessons.ONE_WEEK,
+            day_of_the_week=self.monday,
+            further_information='Some information'
+        )
+
+    def test_overlapping_lesson_conflicts(self):
+        self.assertEqual(self._find_conflicts(), [1])
+
+    def test_lessons_of_other_teachers_do_not_conflict(self):
+        self.assertEqual(self._find_conflicts(teacher='Mr Singh'), [])
+
+    def test_teacher_names_are_compared_loosely(self):
+        self.assertEqual(self._find_conflicts(teacher='  mr   SMITH '), [1])
+
+    def test_lessons_on_other_days_do_not_conflict(self):
+        self.assertEqual(self._find_conflicts(day='Tuesday'), [])
+
+    def test_back_to_back_lessons_do_not_conflict(self):
+        self.assertEqual(self._find_conflicts(time=datetime.time(10, 45)), [])
+        self.assertEqual(self._find_conflicts(time=datetime.time(12, 0), duration=60), [])
+
+    def test_lessons_spanning_several_slots_conflict_with_all_of_them(self):
+        self.assertEqual(self._find_conflicts(time=datetime.time(9, 0), duration=300,
+                                              start_date=datetime.date(2029, 9, 3)), [1, 2])
+
+    def test_lessons_outside_the_dates_of_a_booking_do_not_conflict(self):
+        self.assertEqual(self._find_conflicts(start_date=datetime.date(2029, 10, 1)), [])
+
+    def test_last_lesson_date_extends_past_the_end_date(self):
+        # Booking 1 has four weekly lessons from the 3rd of September although it ends on the same day
+        self.assertEqual(self._find_conflicts(start_date=datetime.date(2029, 9, 24)), [1])
+
+    def test_alternate_fortnightly_lessons_do_not_conflict(self):
+        self.index.add(4, 'Ms Jones', 'Monday', datetime.time(15, 0), 60, datetime.date(2029, 9, 3), 14, 6)
+        self.assertEqual(self._find_conflicts(teacher='Ms Jones', time=datetime.time(15, 0), duration=60,
+                                              start_date=datetime.date(2029, 9, 10), interval=14, number_of_lessons=6), [])
+        self.assertEqual(self._find_conflicts(teacher='Ms Jones', time=datetime.time(15, 0), duration=60,
+                                              start_date=datetime.date(2029, 9, 17), interval=14, number_of_lessons=6), [4])
+
+    def test_weekly_lessons_conflict_with_fortnightly_lessons_on_the_same_dates(self):
+        self.index.add(4, 'Ms Jones', 'Monday', datetime.time(15, 0), 60, datetime.date(2029, 9, 10), 14, 2)
+        self.assertEqual(self._find_conflicts(teacher='Ms Jones', time=datetime.time(15, 30),
+                                              start_date=datetime.date(2029, 9, 3), interval=7, number_of_lessons=2), [4])
+        self.assertEqual(self._find_conflicts(teacher='Ms Jones', time=datetime.time(15, 30),
+                                              start_date=datetime.date(2029, 9, 17), interval=7, number_of_lessons=10), [4])
+        self.assertEqual(self._find_conflicts(teacher='Ms Jones', time=datetime.time(15, 30),
+                                              start_date=datetime.date(2029, 9, 3), interval=7, number_of_lessons=1), [])
+        self.assertEqual(self._find_conflicts(teacher='Ms Jones', time=datetime.time(15, 30),
+                                              start_date=datetime.date(2029, 10, 1), interval=7, number_of_lessons=10), [])
+
+    def test_lessons_between_the_lessons_of_a_booking_do_not_conflict(self):
+        # Booking 1 has lessons on the 3rd, 10th, 17th and 24th of September
+        self.assertEqual(self._find_conflicts(start_date=datetime.date(2029, 9, 5)), [])
+
+    def test_excluded_booking_does_not_conflict(self):
+        self.assertEqual(self._find_conflicts(exclude_booking_id=1), [])
+
+    def test_removed_booking_does_not_conflict(self):
+        self.index.remove(1)
+        self.assertEqual(self._find_conflicts(), [])
+
+    def test_readded_booking_replaces_its_previous_slot(self):
+        self.index.add(1, 'Mr Smith', 'Monday', datetime.time(16, 0), 45,
+                       datetime.date(2029, 9, 3), 7, 4)
+        self.assertEqual(self._find_conflicts(), [])
+        self.assertEqual(self._find_conflicts(time=datetime.time(16, 15)), [1])
+
+    def test_index_is_updated_when_a_booking_is_saved(self):
+        get_teacher_schedule_index()
+        booking = self._create_booking('Mr Smith', '10:00')
+        self.assertTrue(get_teacher_schedule_index().has_conflict(
+            'Mr Smith', 'Monday', datetime.time(10, 0), 30, datetime.date(2029, 9, 3), 7, 1
+        ))
+
+        booking.time_of_the_day = '15:00'
+        booking.save()
+        self.assertFalse(get_teacher_schedule_index().has_conflict(
+            'Mr Smith', 'Monday', datetime.time(10, 0), 30, datetime.date(2029, 9, 3), 7, 1
+        ))
+
+    def test_index_is_updated_when_a_booking_is_deleted(self):
+        booking = self._create_booking('Mr Smith', '10:00')
+        get_teacher_schedule_index()
+        booking.delete()
+        self.assertFalse(get_teacher_schedule_index().has_conflict(
+            'Mr Smith', 'Monday', datetime.time(10, 0), 30, datetime.date(2029, 9, 3), 7, 1
+        ))
+
+    def test_deleted_bookings_are_removed_without_reading_bookings(self):
+        booking = self._create_booking('Mr Smith', '10:00')
+        index = get_teacher_schedule_index()
+        with self.assertNumQueries(1):
+            remove_from_teacher_schedule([booking])
+        self.assertFalse(index.has_conflict(
+            'Mr Smith', 'Monday', datetime.time(10, 0), 30, datetime.date(2029, 9, 3), 7, 1
+        ))
+
+    def test_bookings_deleted_together_change_the_stored_version_once(self):
+        for time_of_the_day in ['10:00', '11:00', '12:00']:
+            self._create_booking('Mr Smith', time_of_the_day)
+        get_teacher_schedule_index()
+        with CaptureQueriesContext(connection) as queries:
+            Booking.objects.all().delete()
+        self.assertEqual(len([query for query in queries if 'UPDATE "lessons_dataversion"' in query['sql']]), 1)
+        with self.assertNumQueries(2):
+            self.assertFalse(get_teacher_schedule_index().has_conflict(
+                'Mr Smith', 'Monday', datetime.time(11, 0), 30, datetime.date(2029, 9, 3), 7, 1
+            ))
+
+    def test_index_is_reloaded_when_bookings_are_added_without_signals(self):
+        get_teacher_schedule_index()
+        booking = self._create_booking('Mr Smith', '10:00')
+        bookings = Booking.objects.bulk_create([Booking(
+            user=self.user, relation_id=-1, invoice=Invoice.objects.create(
+                invoice_number='0001-099', student=self.student, full_amount=10, paid_amount=0, fully_paid=False),
+            time_of_the_day=datetime.time(17, 0), teacher='Ms Jones', number_of_lessons=1,
+            start_date=booking.start_date, end_date=booking.end_date, term_id=self.term,
+            duration_of_lessons=30, interval_between_lessons=7, day_of_the_week=self.monday,
+            further_information='Some information'
+        )])
+        update_teacher_schedule(booking.id for booking in bookings)
+        self.assertTrue(get_teacher_schedule_index().has_conflict(
+            'Ms Jones', 'Monday', datetime.time(17, 0), 30, datetime.date(2029, 9, 3), 7, 1
+        ))
+
+    def test_index_is_reloaded_when_another_process_changes_bookings(self):
+        booking = self._create_booking('Mr Smith', '10:00')
+        get_teacher_schedule_index()
+        # Another process moves the booking, changing the stored version of its teacher but not the index of this
+        # process
+        Booking.objects.filter(id=booking.id).update(time_of_the_day=datetime.time(15, 0))
+        DataVersion.objects.filter(name=get_teacher_version_name('mr smith')).update(version='changed elsewhere')
+        self.assertTrue(get_teacher_schedule_index().has_conflict(
+            'Mr Smith', 'Monday', datetime.time(15, 0), 30, datetime.date(2029, 9, 3), 7, 1
+        ))
+
+    def test_index_is_reloaded_when_another_process_adds_a_teacher(self):
+        get_teacher_schedule_index()
+        Booking.objects.bulk_create([Booking(
+            user=self.user, relation_id=-1, invoice=Invoice.objects.create(
+                invoice_number='0001-099', student=self.student, full_amount=10, paid_amount=0, fully_paid=False),
+            time_of_the_day=datetime.time(17, 0), teacher='Ms Jones', number_of_lessons=1,
+            start_date=datetime.date(2029, 9, 3), end_date=datetime.date(2029, 9, 3), term_id=self.term,
+            duration_of_lessons=30, interval_between_lessons=7, day_of_the_week=self.monday,
+            further_information='Some information'
+        )])
+        DataVersion.objects.create(name=get_teacher_version_name('ms jones'), version='created elsewhere')
+        self.assertTrue(get_teacher_schedule_index().has_conflict(
+            'Ms Jones', 'Monday', datetime.time(17, 0), 30, datetime.date(2029, 9, 3), 7, 1
+        ))
+
+    def test_invalidated_index_is_reloaded_by_every_process(self):
+        get_teacher_schedule_index()
+        version = DataVersion.objects.get(name=TEACHER_SCHEDULE_VERSION).version
+        invalidate_teacher_schedule_index()
+        self.assertNotEqual(DataVersion.objects.get(name=TEACHER_SCHEDULE_VERSION).version, version)
+
+    def test_changing_a_booking_only_changes_the_versions_of_its_teachers(self):
+        booking = self._create_booking('Mr Smith', '10:00')
+        self._create_booking('Ms Jones', '10:00')
+        get_teacher_schedule_index()
+        versions = dict(DataVersion.objects.values_list('name', 'version'))
+        booking.teacher = 'Mr Singh'
+        booking.save()
+        changed_versions = {name for name, version in DataVersion.objects.values_list('name', 'version')
+                            if versions.get(name) != version}
+        self.assertEqual(changed_versions, {get_teacher_version_name('mr smith'), get_teacher_version_name('mr singh')})
+        self.assertFalse(get_teacher_schedule_index().has_conflict(
+            'Mr Smith', 'Monday', datetime.time(10, 0), 30, datetime.date(2029, 9, 3), 7, 1
+        ))
+        self.assertTrue(get_teacher_schedule_index().has_conflict(
+            'Mr Singh', 'Monday', datetime.time(10, 0), 30, datetime.date(2029, 9, 3), 7, 1
+        ))
+
+    def test_loading_the_index_does_not_write_versions(self):
+        with CaptureQueriesContext(connection) as queries:
+            get_teacher_schedule_index()
+        self.assertTrue(all(query['sql'].startswith('SELECT') for query in queries))
+
+    def test_index_is_reloaded_after_a_rolled_back_change(self):
+        booking = self._create_booking('Mr Smith', '10:00')
+        get_teacher_schedule_index()
+        try:
+            with transaction.atomic():
+                booking.delete()
+                self.assertFalse(get_teacher_schedule_index().has_conflict(
+                    'Mr Smith', 'Monday', datetime.time(10, 0), 30, datetime.date(2029, 9, 3), 7, 1
+                ))
+                raise RuntimeError()
+        except RuntimeError:
+            pass
+        self.assertTrue(get_teacher_schedule_index().has_conflict(
+            'Mr Smith', 'Monday', datetime.time(10, 0), 30, datetime.date(2029, 9, 3), 7, 1
+        ))
+
+    def test_checking_for_conflicts_does_not_load_bookings_once_loaded(self):
+        self._create_booking('Mr Smith', '10:00')
+        get_teacher_schedule_index()
+        with self.assertNumQueries(2):
+            get_teacher_schedule_index().has_conflict(
+                'Mr Smith', 'Monday', datetime.time(10, 0), 30, datetime.date(2029, 9, 3), 7, 1
+            )
@@ -0,0 +1,69 @@
+"""Unit tests of the school term index."""
+from django.test import TestCase
+from lessons.models import SchoolTerm
+from lessons.term_index import get_term_index, SchoolTermIndex
+from lessons.forms_functions import find_term_from_date
+import datetime
+
+
+class SchoolTermIndexTestCase(TestCase):
+    """Unit tests of the school term index."""
+
+    fixtures = ['lessons/tests/fixtures/default_terms.json']
+
+    def setUp(self):
+        self.term_one = SchoolTerm.objects.get(term_name="TermOne")
+        self.term_two = SchoolTerm.objects.get(term_name="TermTwo")
+
+    def test_find_term_returns_containing_term(self):
+        index = get_term_index()
+        self.assertEqual(index.find_term(datetime.date(2022, 1, 1)), self.term_one)
+        self.assertEqual(index.find_term(datetime.date(2022, 6, 15)), self.term_one)
+        self.assertEqual(index.find_term(datetime.date(2022, 12, 31)), self.term_one)
+        self.assertEqual(index.find_term(datetime.date(2023, 1, 2)), self.term_two)
+
+    def test_find_term_returns_none_in_holidays(self):
+        index = get_term_index()
+        self.assertIsNone(index.find_term(datetime.date(2021, 12, 31)))
+        self.assertIsNone(index.find_term(datetime.date(2023, 1, 1)))
+        self.assertIsNone(index.find_term(datetime.date(2024, 1, 1)))
+
+    def test_find_term_accepts_datetimes(self):
+        index = get_term_index()
+        self.assertEqual(index.find_term(datetime.datetime(2022, 12, 31, 23, 0)), self.term_one)
+
+    def test_find_next_term(self):
+        index = get_term_index()
+        self.assertEqual(index.find_next_term(datetime.date(2021, 6, 1)), self.term_one)
+        self.assertEqual(index.find_next_term(datetime.date(2023, 1, 1)), self.term_two)
+        self.assertIsNone(index.find_next_term(datetime.date(2024, 1, 1)))
+
+    def test_classify_dates(self):
+        dates = [datetime.date(2022, 3, 1), datetime.date(2023, 1, 1), datetime.date(2023, 3, 1)]
+        self.assertEqual(get_term_index().classify_dates(dates), [self.term_one, None, self.term_two])
+
+    def test_classify_dates_does_not_query_the_database_once_loaded(self):
+        get_term_index()
+        dates = [datetime.date(2022, 1, 1) + datetime.timedelta(days=offset) for offset in range(100)]
+        with self.assertNumQueries(0):
+            get_term_index().classify_dates(dates)
+
+    def test_index_is_invalidated_when_a_term_is_saved(self):
+        get_term_index()
+        SchoolTerm.objects.create(term_name="TermThree", start_date=datetime.date(2024, 1, 1),
+                                  end_date=datetime.date(2024, 3, 1))
+        self.assertEqual(get_term_index().find_term(datetime.date(2024, 2, 1)).term_name, "TermThree")
+
+    def test_index_is_invalidated_when_a_term_is_deleted(self):
+        get_term_index()
+        self.term_two.delete()
+        self.assertIsNone(get_term_index().find_term(datetime.date(2023, 3, 1)))
+
+    def test_find_term_from_date_falls_back_to_next_term(self):
+        self.assertEqual(find_term_from_date(datetime.date(2022, 5, 1)), self.term_one)
+        self.assertEqual(find_term_from_date(datetime.date(2023, 1, 1)), self.term_two)
+
+    def test_empty_index(self):
+        index = SchoolTermIndex([])
+        self.assertIsNone(index.find_term(datetime.date(2022, 1, 1)))
+        self.assertIsNone(index.find_next_term(datetime.date(2022, 1, 1)))
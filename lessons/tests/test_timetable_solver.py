@@ -0,0 +1,209 @@
+"""Unit tests of the timetable solver."""
+import csv
+import datetime
+import os
+import tempfile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from lessons.models import User, Request, DayOfTheWeek, Student, Booking, SchoolTerm, Child
+from lessons.teacher_schedule import TeacherScheduleIndex
+from lessons.timetable_solver import TimetableSolver, propose_timetable, apply_timetable_proposal, \
+    get_requests_to_schedule
+from lessons.tests.helpers import create_days_of_the_week, create_user_groups
+
+
+class TimetableSolverTestCase(TestCase):
+    """Unit tests of the timetable solver."""
+
+    fixtures = ['lessons/tests/fixtures/default_user.json', 'lessons/tests/fixtures/other_users.json']
+
+    def setUp(self):
+        create_days_of_the_week()
+        create_user_groups()
+        self.john = User.objects.get(email='johndoe@email.com')
+        self.jane = User.objects.get(email='janedoe@email.com')
+        Student.objects.create(user=self.john)
+        Student.objects.create(user=self.jane)
+        # The term starts on a Wednesday
+        self.term = SchoolTerm.objects.create(term_name='Term one', start_date=datetime.date(2030, 1, 2),
+                                              end_date=datetime.date(2030, 3, 29))
+
+    def _create_request(self, days, user=None, duration=Request.LessonDuration.SIXTY_MINUTES, number_of_lessons=4,
+                        interval=Request.IntervalBetweenLessons.ONE_WEEK):
+        request = Request.objects.create(
+            user=user or self.john,
+            number_of_lessons=number_of_lessons,
+            relation_id=-1,
+            interval_between_lessons=interval,
+            duration_of_lessons=duration,
+            further_information='Some information',
+        )
+        request.availability.set([DayOfTheWeek.objects.get(day=day) for day in days])
+        return request
+
+    def _solve(self, teachers, requests, day_start=datetime.time(9, 0), day_end=datetime.time(11, 0)):
+        solver = TimetableSolver(teachers, self.term, day_start, day_end, schedule_index=TeacherScheduleIndex())
+        return solver.solve(Request.objects.filter(id__in=[request.id for request in requests])
+                            .prefetch_related('availability'))
+
+    def _assert_no_clashes(self, proposal):
+        index = TeacherScheduleIndex()
+        for booking in proposal.bookings:
+            request = booking.request
+            slot = (booking.teacher, booking.day, booking.time_of_lesson, request.duration_of_lessons,
+                    booking.start_date, request.interval_between_lessons, request.number_of_lessons)
+            self.assertFalse(index.has_conflict(*slot))
+            index.add(-request.id, *slot)
+
+    def test_request_is_placed_at_the_earliest_slot_of_its_first_day(self):
+        request = self._create_request(['Tuesday', 'Friday'])
+        proposal = self._solve(['Mr Smith'], [request])
+        self.assertEqual(proposal.unscheduled, [])
+        booking = proposal.bookings[0]
+        self.assertEqual(booking.day, 'Tuesday')
+        self.assertEqual(booking.time_of_lesson, datetime.time(9, 0))
+        self.assertEqual(booking.teacher, 'Mr Smith')
+        self.assertEqual(booking.start_date, datetime.date(2030, 1, 8))
+        self.assertEqual(booking.end_date, self.term.end_date)
+
+    def test_requests_are_spread_between_teachers(self):
+        requests = [self._create_request(['Monday']), self._create_request(['Monday'])]
+        proposal = self._solve(['Mr Smith', 'Ms Jones'], requests)
+        self.assertEqual({booking.teacher for booking in proposal.bookings}, {'Mr Smith', 'Ms Jones'})
+        self._assert_no_clashes(proposal)
+
+    def test_requests_beyond_capacity_are_unscheduled(self):
+        requests = [self._create_request(['Monday']) for _ in range(3)]
+        proposal = self._solve(['Mr Smith'], requests)
+        self.assertEqual(len(proposal.bookings), 2)
+        self.assertEqual(len(proposal.unscheduled), 1)
+        self._assert_no_clashes(proposal)
+
+    def test_most_constrained_requests_are_placed_first(self):
+        flexible = self._create_request(['Monday', 'Tuesday'])
+        constrained = self._create_request(['Monday'])
+        other_constrained = self._create_request(['Monday'])
+        proposal = self._solve(['Mr Smith'], [flexible, constrained, other_constrained])
+        self.assertEqual(proposal.unscheduled, [])
+        days = {booking.request.id: booking.day for booking in proposal.bookings}
+        self.assertEqual(days[flexible.id], 'Tuesday')
+        self._assert_no_clashes(proposal)
+
+    def test_placed_booking_is_moved_to_make_room(self):
+        solver = TimetableSolver(['Mr Smith'], self.term, datetime.time(9, 0), datetime.time(10, 0),
+                                 schedule_index=TeacherScheduleIndex())
+        flexible = self._create_request(['Monday', 'Tuesday'])
+        constrained = self._create_request(['Monday'])
+        # Place the flexible request on Monday first, as if it had been placed before the constrained one
+        solver.place(Request.objects.prefetch_related('availability').get(id=flexible.id), 'Mr Smith', 'Monday', 540)
+        proposal = solver.solve(Request.objects.filter(id=constrained.id).prefetch_related('availability'))
+        self.assertEqual(proposal.unscheduled, [])
+        days = {booking.request.id: booking.day for booking in proposal.bookings}
+        self.assertEqual(days, {flexible.id: 'Tuesday', constrained.id: 'Monday'})
+
+    def test_days_found_full_during_a_reverted_move_are_forgotten(self):
+        solver = TimetableSolver(['Mr Smith'], self.term, datetime.time(9, 0), datetime.time(11, 0),
+                                 schedule_index=TeacherScheduleIndex())
+        short = self._create_request(['Monday'], duration=Request.LessonDuration.THIRTY_MINUTES)
+        long = self._create_request(['Monday'])
+        blocked = self._create_request(['Monday'], user=self.jane)
+        later = self._create_request(['Monday'], user=self.jane, duration=Request.LessonDuration.THIRTY_MINUTES)
+        requests = {request.id: request for request in Request.objects.prefetch_related('availability')}
+        solver.place(requests[short.id], 'Mr Smith', 'Monday', 570)
+        solver.place(requests[long.id], 'Mr Smith', 'Monday', 600)
+        # Moving the short lesson is tried with the blocked request at 9:00, when Monday has no room for it, and
+        # reverted, leaving 9:00 to 9:30 free
+        self.assertFalse(solver.place_by_moving_a_booking(requests[blocked.id]))
+        self.assertTrue(solver.place_greedily(requests[later.id]))
+        self.assertEqual(solver.placements[later.id][1], ('Mr Smith', 'Monday', 540))
+
+    def test_requests_are_not_placed_over_existing_bookings(self):
+        existing = TeacherScheduleIndex([
+            (1, 'Mr Smith', 'Monday', datetime.time(9, 0), 60, datetime.date(2030, 1, 7), 7, 12),
+        ])
+        request = self._create_request(['Monday'])
+        solver = TimetableSolver(['Mr Smith'], self.term, datetime.time(9, 0), datetime.time(11, 0), schedule_index=existing)
+        proposal = solver.solve(Request.objects.filter(id=request.id).prefetch_related('availability'))
+        self.assertEqual(proposal.bookings[0].time_of_lesson, datetime.time(10, 0))
+
+    def test_fortnightly_requests_are_placed_between_existing_fortnightly_lessons(self):
+        # The existing lessons are on the second, fourth and sixth Mondays of the term
+        existing = TeacherScheduleIndex([
+            (1, 'Mr Smith', 'Monday', datetime.time(9, 0), 60, datetime.date(2030, 1, 14), 14, 3),
+        ])
+        fortnightly = self._create_request(['Monday'], number_of_lessons=3, interval=Request.IntervalBetweenLessons.TWO_WEEKS)
+        weekly = self._create_request(['Monday'], user=self.jane, number_of_lessons=2)
+        solver = TimetableSolver(['Mr Smith'], self.term, datetime.time(9, 0), datetime.time(11, 0), schedule_index=existing)
+        proposal = solver.solve(Request.objects.filter(id__in=[fortnightly.id, weekly.id]).prefetch_related('availability'))
+        times = {booking.request.id: booking.time_of_lesson for booking in proposal.bookings}
+        self.assertEqual(times, {fortnightly.id: datetime.time(9, 0), weekly.id: datetime.time(10, 0)})
+
+    def test_no_request_is_scheduled_without_teachers(self):
+        request = self._create_request(['Monday'])
+        proposal = self._solve([], [request])
+        self.assertEqual(proposal.bookings, [])
+        self.assertEqual(proposal.unscheduled, [request])
+
+    def test_only_unfulfilled_requests_of_students_are_scheduled(self):
+        request = self._create_request(['Monday'])
+        fulfilled_request = self._create_request(['Monday'])
+        fulfilled_request.fulfilled = True
+        fulfilled_request.save()
+        Student.objects.filter(user=self.jane).delete()
+        self._create_request(['Monday'], user=self.jane)
+        self.assertEqual(list(get_requests_to_schedule()), [request])
+
+    def test_applied_proposal_fulfils_requests_without_clashes(self):
+        child = Child.objects.create(parent=self.john, first_name='Alice', last_name='Doe')
+        requests = [self._create_request(['Monday']) for _ in range(3)]
+        Request.objects.filter(id=requests[0].id).update(relation_id=child.id)
+        proposal = propose_timetable(['Mr Smith', 'Ms Jones'], self.term, datetime.time(9, 0), datetime.time(12, 0))
+        bookings = apply_timetable_proposal(proposal, 20)
+        self.assertEqual(len(bookings), 3)
+        self.assertFalse(Request.objects.filter(fulfilled=False).exists())
+
+        second_proposal = propose_timetable(['Mr Smith', 'Ms Jones'], self.term)
+        self.assertEqual(second_proposal.bookings, [])
+
+    def test_solver_handles_many_requests(self):
+        requests = [self._create_request([day], duration=Request.LessonDuration.THIRTY_MINUTES, number_of_lessons=1)
+                    for day in ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday'] for _ in range(40)]
+        teachers = [f'Teacher {number}' for number in range(5)]
+        proposal = self._solve(teachers, requests, datetime.time(9, 0), datetime.time(17, 0))
+        self.assertEqual(len(proposal.bookings), 200)
+        self._assert_no_clashes(proposal)
+
+    def _output_path(self):
+        csv_file = tempfile.NamedTemporaryFile(suffix='.csv', delete=False)
+        csv_file.close()
+        self.addCleanup(os.remove, csv_file.name)
+        return csv_file.name
+
+    def test_management_command_writes_fulfil_requests_csv(self):
+        requests = [self._create_request(['Monday']) for _ in range(2)]
+        path = self._output_path()
+        call_command('propose_timetable', '--teacher', 'Mr Smith', '--term', 'Term one', '--hourly-cost', '20',
+                     '--output', path)
+        with open(path, newline='') as csv_file:
+            rows = list(csv.DictReader(csv_file))
+        self.assertEqual([int(row['request_id']) for row in rows], [request.id for request in requests])
+        self.assertEqual(Booking.objects.count(), 0)
+
+        call_command('fulfil_requests', path)
+        self.assertEqual(Booking.objects.count(), 2)
+
+    def test_management_command_applies_proposal(self):
+        self._create_request(['Monday'])
+        call_command('propose_timetable', '--teacher', 'Mr Smith', '--term', 'Term one', '--hourly-cost', '20', '--apply')
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_management_command_requires_hourly_cost_to_apply(self):
+        self._create_request(['Monday'])
+        with self.assertRaises(CommandError):
+            call_command('propose_timetable', '--teacher', 'Mr Smith', '--term', 'Term one', '--apply')
+        self.assertEqual(Booking.objects.count(), 0)
+
+    def test_management_command_requires_a_term(self):
+        with self.assertRaises(CommandError):
+            call_command('propose_timetable', '--teacher', 'Mr Smith', '--term', 'No such term')
@@ -83,4 +83,26 @@ class AdminBookingListTestCase(TestCase):
 
         response_url = reverse('student_page')
         self.assertRedirects(response, response_url, status_code=302, target_status_code=200)
-        self.assertTemplateUsed(response, 'student_page.html')
\ No newline at end of file
+        self.assertTemplateUsed(response, 'student_page.html')
+
+    def test_admin_booking_list_filters_by_teacher(self):
+        response = self.client.get(self.url, {'teacher': 'singh'})
+        bookings = response.context['bookings']
+        self.assertEqual([booking.id for booking in bookings], [self.booking2.id])
+
+    def test_admin_booking_list_filters_by_start_date(self):
+        response = self.client.get(self.url, {'date_to': '2029-11-21'})
+        bookings = response.context['bookings']
+        self.assertEqual([booking.id for booking in bookings], [self.booking1.id])
+
+    def test_admin_booking_list_filters_by_student(self):
+        response = self.client.get(self.url, {'student': 'nobody'})
+        self.assertEqual(len(response.context['bookings']), 0)
+        response = self.client.get(self.url, {'student': 'john'})
+        self.assertEqual(len(response.context['bookings']), 2)
+
+    def test_admin_booking_list_is_paginated(self):
+        response = self.client.get(self.url, {'page': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['bookings_page'].number, 1)
+        self.assertFalse(response.context['bookings_page'].has_next())
@@ -1,7 +1,7 @@
 """Tests of the admin balance list view."""
 from django.test import TestCase
 from django.urls import reverse
-from lessons.models import User, Student
+from lessons.models import User, Student, Invoice
 from django.db.models.query import QuerySet
 from lessons.tests.helpers import create_user_groups
 
@@ -39,4 +39,19 @@ class AdminBalanceListTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'balance_list.html')
         students = response.context['students']
-        self.assertEqual(students.all().count(), Student.objects.count())
\ No newline at end of file
+        self.assertEqual(students.all().count(), Student.objects.count())
+
+    def test_balance_view_displays_ledger_totals(self):
+        Invoice.objects.create(invoice_number='0001-001', student=self.student, full_amount=120, paid_amount=20, fully_paid=False)
+        self.client.login(email='admin@email.com', password='password')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '120.00')
+        self.assertContains(response, '100.00')
+
+    def test_balance_view_lists_largest_outstanding_first(self):
+        Invoice.objects.create(invoice_number='0002-001', student=self.student2, full_amount=50, paid_amount=0, fully_paid=False)
+        self.client.login(email='admin@email.com', password='password')
+        response = self.client.get(self.url)
+        students = list(response.context['students'])
+        self.assertEqual(students[0], self.student2)
@@ -2,6 +2,7 @@
 from django.test import TestCase
 from lessons.models import User, DayOfTheWeek, Booking, SchoolTerm, Invoice, Student
 from lessons.tests.helpers import create_user_groups, create_days_of_the_week
+from lessons.lesson_timeline import encode_lesson_cursor
 from django.urls import reverse
 import datetime
 
@@ -82,3 +83,17 @@ class AdminLessonListTestCase(TestCase):
         lessons = response.context['lessons']
         expected_lessons = self.booking1.number_of_lessons + self.booking2.number_of_lessons
         self.assertEqual(len(lessons), expected_lessons)
+
+    def test_admin_lesson_list_is_in_date_order(self):
+        response = self.client.get(self.url)
+        lessons = response.context['lessons']
+        date_times = [lesson.date_time for lesson in lessons]
+        self.assertEqual(date_times, sorted(date_times))
+        self.assertIsNone(response.context['next_cursor'])
+
+    def test_admin_lesson_list_continues_after_cursor(self):
+        first_page = self.client.get(self.url).context['lessons']
+        cursor = encode_lesson_cursor(first_page[3].date_time, first_page[3].booking.id)
+        response = self.client.get(self.url, {'after': cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['lessons'], first_page[4:])
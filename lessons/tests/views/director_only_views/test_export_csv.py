@@ -0,0 +1,119 @@
+"""Unit tests of the CSV export view."""
+import csv
+import datetime
+import io
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from lessons import exports
+from lessons.exports import EXPORTS, stream_csv
+from lessons.models import User, Student, Invoice, BankTransaction, Booking, SchoolTerm, DayOfTheWeek
+from lessons.tests.helpers import create_user_groups, create_days_of_the_week, HandleGroups
+
+
+class ExportCsvTestCase(TestCase):
+    """Unit tests of the CSV export view."""
+
+    fixtures = ['lessons/tests/fixtures/default_user.json', 'lessons/tests/fixtures/other_users.json']
+
+    def setUp(self):
+        create_user_groups()
+        create_days_of_the_week()
+        HandleGroups.set_other_user_to_admin()
+        self.student = Student.objects.create(user=User.objects.get(email='johndoe@email.com'))
+        term = SchoolTerm.objects.create(term_name='Term one', start_date=datetime.date(2022, 1, 1),
+                                         end_date=datetime.date(2022, 3, 31))
+        for number, day in enumerate([3, 10, 17], start=1):
+            invoice = Invoice.objects.create(invoice_number=f'0001-00{number}', student=self.student, full_amount=100)
+            BankTransaction.objects.create(date=datetime.date(2022, 1, day), student=self.student, amount=10,
+                                           invoice=invoice)
+            Booking.objects.create(
+                user=self.student.user,
+                relation_id=-1,
+                invoice=invoice,
+                time_of_the_day=datetime.time(12, 0),
+                teacher='Mr Smith',
+                number_of_lessons=4,
+                start_date=datetime.date(2022, 1, day),
+                end_date=datetime.date(2022, 1, day),
+                term_id=term,
+                duration_of_lessons=Booking.LessonDuration.SIXTY_MINUTES,
+                interval_between_lessons=Booking.IntervalBetweenLessons.ONE_WEEK,
+                day_of_the_week=DayOfTheWeek.objects.get(order=0),
+                further_information='Some information'
+            )
+
+    def _export(self, export_name, data=None):
+        self.client.login(email='janedoe@email.com', password='Password123')
+        response = self.client.get(reverse('export_csv', kwargs={'export_name': export_name}), data or {})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+        return list(csv.reader(io.StringIO(content)))
+
+    def test_export_csv_url(self):
+        self.assertEqual(reverse('export_csv', kwargs={'export_name': 'transactions'}), '/exports/transactions.csv')
+
+    def test_export_transactions(self):
+        rows = self._export('transactions')
+        self.assertEqual(rows[0], EXPORTS['transactions'].header)
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][1:], ['2022-01-03', 'johndoe@email.com', '0001-001', '10.00'])
+
+    def test_export_invoices(self):
+        rows = self._export('invoices')
+        self.assertEqual(rows[0], EXPORTS['invoices'].header)
+        self.assertEqual(rows[1], ['0001-001', 'johndoe@email.com', '2022-01-03', '100.00', '10.00', 'False'])
+
+    def test_export_bookings(self):
+        rows = self._export('bookings')
+        self.assertEqual(rows[0], EXPORTS['bookings'].header)
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][1], 'johndoe@email.com')
+        self.assertEqual(rows[1][3], 'Monday')
+
+    def test_text_starting_like_a_formula_is_escaped(self):
+        Booking.objects.filter(start_date=datetime.date(2022, 1, 3)).update(teacher='=HYPERLINK("http://x")')
+        Booking.objects.filter(start_date=datetime.date(2022, 1, 10)).update(teacher='@SUM(A1)')
+        BankTransaction.objects.filter(date=datetime.date(2022, 1, 3)).update(amount=-10)
+        rows = self._export('bookings')
+        self.assertEqual([row[5] for row in rows[1:]], ['\'=HYPERLINK("http://x")', "'@SUM(A1)", 'Mr Smith'])
+        self.assertEqual(self._export('transactions')[1][4], '-10.00')
+
+    def test_export_is_filtered_by_date_range(self):
+        for export_name in EXPORTS:
+            rows = self._export(export_name, {'date_from': '2022-01-05', 'date_to': '2022-01-17'})
+            self.assertEqual(len(rows), 3, export_name)
+
+    def test_invalid_dates_are_ignored(self):
+        self.assertEqual(len(self._export('transactions', {'date_from': 'yesterday'})), 4)
+
+    def test_export_is_streamed_in_chunks(self):
+        chunk_size = exports.EXPORT_CHUNK_SIZE
+        exports.EXPORT_CHUNK_SIZE = 1
+        self.addCleanup(setattr, exports, 'EXPORT_CHUNK_SIZE', chunk_size)
+        lines = stream_csv(EXPORTS['transactions'].header, EXPORTS['transactions'].get_rows())
+        with CaptureQueriesContext(connection) as queries:
+            next(lines)
+            next(lines)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(len(list(lines)), 2)
+
+    def test_unknown_export_is_not_found(self):
+        self.client.login(email='janedoe@email.com', password='Password123')
+        response = self.client.get(reverse('export_csv', kwargs={'export_name': 'users'}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_student_cannot_export(self):
+        HandleGroups.set_default_user_to_student()
+        self.client.login(email='johndoe@email.com', password='Password123')
+        response = self.client.get(reverse('export_csv', kwargs={'export_name': 'transactions'}), follow=True)
+        self.assertRedirects(response, reverse('student_page'), status_code=302, target_status_code=200)
+
+    def test_admin_lists_link_to_exports(self):
+        self.client.login(email='janedoe@email.com', password='Password123')
+        for url_name, export_name in [('transaction_list_admin', 'transactions'), ('invoice_list_admin', 'invoices'),
+                                      ('admin_booking_list', 'bookings')]:
+            response = self.client.get(reverse(url_name))
+            self.assertContains(response, reverse('export_csv', kwargs={'export_name': export_name}))
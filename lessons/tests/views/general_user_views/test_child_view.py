@@ -1,9 +1,13 @@
 """Unit test for the ChildView view"""
+import datetime
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from lessons.forms import ChildEditForm
-from lessons.models import User, Child, Student
-from lessons.tests.helpers import create_user_groups, HandleGroups
+from lessons.models import User, Child, Student, Request, Booking, Invoice, SchoolTerm, DayOfTheWeek
+from lessons.views_functions import delete_child
+from lessons.tests.helpers import create_user_groups, create_days_of_the_week, HandleGroups
 
 
 class ChildViewTestCase(TestCase):
@@ -89,6 +93,75 @@ class ChildViewTestCase(TestCase):
         self.assertTemplateUsed(response, 'children_list.html')
         self.assertEqual(Child.objects.count(), 0)
         
+    def test_child_delete_deletes_and_refunds_lessons_of_child(self):
+        create_days_of_the_week()
+        Request.objects.create(user=self.user1, relation_id=self.child.id, number_of_lessons=1,
+                               interval_between_lessons=Request.IntervalBetweenLessons.ONE_WEEK,
+                               duration_of_lessons=Request.LessonDuration.THIRTY_MINUTES,
+                               further_information='Some information')
+        start_date = datetime.date.today() + datetime.timedelta(days=7)
+        term = SchoolTerm.objects.create(term_name='Term one', start_date=start_date, end_date=start_date)
+        invoice = Invoice.objects.create(invoice_number='0001-001', student=Student.objects.get(user=self.user1),
+                                         full_amount=20, paid_amount=20, fully_paid=True)
+        Booking.objects.create(user=self.user1, relation_id=self.child.id, invoice=invoice, time_of_the_day='12:00',
+                               teacher='Mr Smith', number_of_lessons=1, start_date=start_date, end_date=start_date,
+                               term_id=term, duration_of_lessons=Booking.LessonDuration.THIRTY_MINUTES,
+                               interval_between_lessons=Booking.IntervalBetweenLessons.ONE_WEEK,
+                               day_of_the_week=DayOfTheWeek.objects.get(order=0), further_information='Some information')
+
+        self.client.login(email='johndoe@email.com', password='Password123')
+        self.form_input['delete'] = True
+        self.client.post(reverse('child_view'), self.form_input)
+        self.assertEqual(Request.objects.count(), 0)
+        self.assertEqual(Booking.objects.count(), 0)
+        self.assertEqual(Student.objects.get(user=self.user1).balance, 20)
+
+    def _create_paid_bookings_of_child(self, child, count, start_date):
+        term = SchoolTerm.objects.create(term_name=f'Term {child.id}', start_date=start_date, end_date=start_date)
+        student = Student.objects.get(user=self.user1)
+        for number in range(count):
+            invoice = Invoice.objects.create(invoice_number=f'0001-{child.id}{number:02}', student=student,
+                                             full_amount=20, paid_amount=20, fully_paid=True)
+            Booking.objects.create(user=self.user1, relation_id=child.id, invoice=invoice, time_of_the_day='12:00',
+                                   teacher='Mr Smith', number_of_lessons=1, start_date=start_date,
+                                   end_date=start_date, term_id=term,
+                                   duration_of_lessons=Booking.LessonDuration.THIRTY_MINUTES,
+                                   interval_between_lessons=Booking.IntervalBetweenLessons.ONE_WEEK,
+                                   day_of_the_week=DayOfTheWeek.objects.get(order=0),
+                                   further_information='Some information')
+
+    def _count_queries_of_child_delete(self, child):
+        with CaptureQueriesContext(connection) as queries:
+            delete_child(self.user1, child.id)
+        return len(queries)
+
+    def test_child_delete_queries_do_not_grow_with_bookings(self):
+        create_days_of_the_week()
+        start_date = datetime.date.today() + datetime.timedelta(days=7)
+        self._create_paid_bookings_of_child(self.child, 1, start_date)
+        other_child = Child.objects.create(parent=self.user1, first_name='Alice', last_name='Harry')
+        self._create_paid_bookings_of_child(other_child, 12, start_date)
+
+        self.assertEqual(self._count_queries_of_child_delete(self.child),
+                         self._count_queries_of_child_delete(other_child))
+        self.assertEqual(Booking.objects.count(), 0)
+        self.assertEqual(Student.objects.get(user=self.user1).balance, 260)
+        self.assertFalse(Invoice.objects.exclude(paid_amount=0, full_amount=0).exists())
+
+    def test_child_delete_does_not_refund_past_bookings(self):
+        create_days_of_the_week()
+        self._create_paid_bookings_of_child(self.child, 2, datetime.date.today())
+        delete_child(self.user1, self.child.id)
+        self.assertEqual(Booking.objects.count(), 0)
+        self.assertEqual(Student.objects.get(user=self.user1).balance, 0)
+        self.assertEqual(Invoice.objects.filter(paid_amount=20).count(), 2)
+
+    def test_child_delete_does_nothing_for_a_child_of_another_user(self):
+        other_user = User.objects.exclude(id=self.user1.id).first()
+        self.assertIsNone(delete_child(other_user, self.child.id))
+        self.assertIsNone(delete_child(self.user1, 9999))
+        self.assertTrue(Child.objects.filter(id=self.child.id).exists())
+
     def test_return_redirects_to_children_list_on_return_button(self):
         self.client.login(email='johndoe@email.com', password='Password123')
         self.url = f'{reverse("child_view")}'
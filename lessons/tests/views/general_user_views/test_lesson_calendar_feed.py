@@ -0,0 +1,121 @@
+"""Unit tests of the lesson calendar feed view."""
+import datetime
+from django.test import TestCase
+from django.urls import reverse
+from django.utils.http import http_date
+from lessons.forms import BookingEditForm
+from lessons.lesson_calendar import get_calendar_token
+from lessons.models import User, DayOfTheWeek, Booking, SchoolTerm, Invoice, Student, Child
+from lessons.tests.helpers import create_user_groups, create_days_of_the_week, HandleGroups
+
+
+class LessonCalendarFeedTestCase(TestCase):
+    """Unit tests of the lesson calendar feed view."""
+
+    fixtures = ['lessons/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        create_user_groups()
+        create_days_of_the_week()
+        self.user = User.objects.get(email='johndoe@email.com')
+        self.student = Student.objects.create(user=self.user)
+        self.child = Child.objects.create(parent=self.user, first_name='Alice', last_name='Doe')
+        self.term = SchoolTerm.objects.create(term_name='Term one', start_date=datetime.date(2029, 9, 1),
+                                              end_date=datetime.date(2029, 12, 16))
+        self.booking = self._create_booking(-1, '0001-001')
+        self.child_booking = self._create_booking(self.child.id, '0001-002')
+        self.url = reverse('lesson_calendar_feed', kwargs={'token': get_calendar_token(self.user.id)})
+
+    def _create_booking(self, relation_id, invoice_number):
+        return Booking.objects.create(
+            user=self.user,
+            relation_id=relation_id,
+            invoice=Invoice.objects.create(invoice_number=invoice_number, student=self.student, full_amount=100),
+            time_of_the_day=datetime.time(12, 0),
+            teacher='Mr Smith',
+            number_of_lessons=4,
+            start_date=datetime.date(2029, 10, 8),
+            end_date=datetime.date(2029, 10, 8),
+            term_id=self.term,
+            duration_of_lessons=Booking.LessonDuration.SIXTY_MINUTES,
+            interval_between_lessons=Booking.IntervalBetweenLessons.ONE_WEEK,
+            day_of_the_week=DayOfTheWeek.objects.get(order=0),
+            further_information='Some information'
+        )
+
+    def test_feed_of_student_lessons(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        self.assertIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+        calendar = response.content.decode()
+        self.assertIn(f'UID:booking-{self.booking.id}@msms', calendar)
+        self.assertNotIn(f'UID:booking-{self.child_booking.id}@msms', calendar)
+        self.assertIn('SUMMARY:John Doe lesson with Mr Smith', calendar)
+
+    def test_feed_of_child_lessons(self):
+        url = reverse('lesson_calendar_feed', kwargs={'token': get_calendar_token(self.user.id, self.child.id)})
+        calendar = self.client.get(url).content.decode()
+        self.assertIn(f'UID:booking-{self.child_booking.id}@msms', calendar)
+        self.assertNotIn(f'UID:booking-{self.booking.id}@msms', calendar)
+        self.assertIn('SUMMARY:Alice Doe lesson with Mr Smith', calendar)
+
+    def test_feed_does_not_need_log_in(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_feed_with_forged_token_is_not_found(self):
+        self.assertEqual(self.client.get(self.url.replace('.ics', 'x.ics')).status_code, 404)
+
+    def test_unchanged_feed_is_not_modified(self):
+        response = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_feed_is_not_validated_by_modification_time(self):
+        # Deleting a booking or changing a term does not move any modification time, so it cannot be relied on
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=http_date(self.booking.updated_at.timestamp() + 60))
+        self.assertEqual(response.status_code, 200)
+
+    def test_changed_feed_is_sent_again(self):
+        etag = self.client.get(self.url)['ETag']
+        self.booking.teacher = 'Ms Jones'
+        self.booking.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Ms Jones', response.content.decode())
+
+    def test_feed_of_booking_edited_with_the_booking_edit_form_is_sent_again(self):
+        etag = self.client.get(self.url)['ETag']
+        form = BookingEditForm(instance_id=self.booking.id, data={
+            'day_of_the_week': self.booking.day_of_the_week.id,
+            'time_of_the_day': '15:00',
+            'teacher': 'Mr Smith',
+            'start_date': '2029-10-08',
+            'end_date': '2029-10-08',
+            'duration_of_lessons': Booking.LessonDuration.SIXTY_MINUTES,
+            'interval_between_lessons': Booking.IntervalBetweenLessons.ONE_WEEK,
+            'number_of_lessons': 4,
+            'further_information': 'Some information',
+            'hourly_cost': '20',
+        })
+        self.assertTrue(form.is_valid())
+        form.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('T150000', response.content.decode())
+
+    def test_lesson_list_links_to_feed(self):
+        HandleGroups.set_default_user_to_student()
+        self.client.login(email='johndoe@email.com', password='Password123')
+        response = self.client.get(reverse('lesson_list_student'))
+        self.assertContains(response, 'http://testserver' + self.url)
+
+    def test_child_lesson_list_links_to_feed(self):
+        HandleGroups.set_default_user_to_student()
+        self.client.login(email='johndoe@email.com', password='Password123')
+        response = self.client.get(reverse('lesson_list_child'), {'relation_id': self.child.id})
+        url = reverse('lesson_calendar_feed', kwargs={'token': get_calendar_token(self.user.id, self.child.id)})
+        self.assertContains(response, 'http://testserver' + url)
@@ -0,0 +1,35 @@
+"""Tests for the student page."""
+from django.test import TestCase
+from django.urls import reverse
+from lessons.models import User, Student, Invoice
+from lessons.tests.helpers import HandleGroups, create_user_groups
+
+
+class StudentPageTest(TestCase):
+    """Test suite for the student page."""
+
+    fixtures = ['lessons/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        create_user_groups()
+        HandleGroups.set_default_user_to_student()
+        self.user = User.objects.get(email="johndoe@email.com")
+        self.student = Student.objects.create(user=self.user, balance=15)
+        self.url = reverse('student_page')
+
+    def test_get_student_page(self):
+        self.client.login(email="johndoe@email.com", password='Password123')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'student_page.html')
+        self.assertEqual(response.context['balance'], self.student.balance)
+
+    def test_student_page_shows_latest_five_invoices(self):
+        for sequence in range(1, 8):
+            Invoice.objects.create(invoice_number=f'0001-{sequence:03}', student=self.student,
+                                   full_amount=10, paid_amount=0, fully_paid=False)
+        self.client.login(email="johndoe@email.com", password='Password123')
+        response = self.client.get(self.url)
+        invoices = response.context['invoices']
+        self.assertEqual(len(invoices), 5)
+        self.assertEqual(invoices[0].invoice_number, '0001-007')
@@ -1,9 +1,12 @@
 """Tests of the admin request list view."""
 from django.test import TestCase
 from django.urls import reverse
-from lessons.models import Request, DayOfTheWeek
+from lessons.models import Request, DayOfTheWeek, Child
 from lessons.tests.helpers import create_user_groups, HandleGroups, create_days_of_the_week
 from django.utils import timezone
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from lessons.views_functions import ADMIN_LIST_PAGE_SIZE
 
 
 class AdminRequestListTestCase(TestCase):
@@ -80,3 +83,63 @@ class AdminRequestListTestCase(TestCase):
         self.assertRedirects(response, response_url, status_code=302, target_status_code=200)
         self.assertTemplateUsed(response, 'student_page.html')
 
+
+    def _create_request(self, fulfilled=False, date=None):
+        return Request.objects.create(
+            user_id=1,
+            relation_id=-1,
+            date=date or timezone.datetime.now(tz=timezone.utc),
+            number_of_lessons=1,
+            interval_between_lessons=Request.IntervalBetweenLessons.ONE_WEEK,
+            duration_of_lessons=Request.LessonDuration.THIRTY_MINUTES,
+            further_information='Some information',
+            fulfilled=fulfilled
+        )
+
+    def test_admin_request_list_filters_by_fulfilled_status(self):
+        response = self.client.get(self.url, {'fulfilled': 'true'})
+        self.assertEqual(len(response.context['fulfilled_requests']), 1)
+        self.assertEqual(len(response.context['unfulfilled_requests']), 0)
+
+    def test_admin_request_list_filters_by_date_range(self):
+        old_request = self._create_request(date=timezone.datetime(2020, 5, 1, 12, tzinfo=timezone.utc))
+        response = self.client.get(self.url, {'date_from': '2020-05-01', 'date_to': '2020-05-01'})
+        self.assertEqual([request.id for request in response.context['unfulfilled_requests']], [old_request.id])
+        self.assertEqual(len(response.context['fulfilled_requests']), 0)
+
+    def test_admin_request_list_filters_by_student(self):
+        response = self.client.get(self.url, {'student': 'janedoe'})
+        self.assertEqual(len(response.context['unfulfilled_requests']), 0)
+        response = self.client.get(self.url, {'student': 'johndoe'})
+        self.assertEqual(len(response.context['unfulfilled_requests']), 1)
+
+    def test_admin_request_list_filters_by_child_name(self):
+        child = Child.objects.create(parent_id=1, first_name='Timmy', last_name='Smith')
+        child_request = self._create_request()
+        child_request.relation_id = child.id
+        child_request.child = child
+        child_request.save()
+        response = self.client.get(self.url, {'student': 'timmy'})
+        self.assertEqual([request.id for request in response.context['unfulfilled_requests']], [child_request.id])
+        response = self.client.get(self.url, {'student': 'smith'})
+        self.assertEqual([request.id for request in response.context['unfulfilled_requests']], [child_request.id])
+
+    def test_admin_request_list_only_formats_the_visible_page(self):
+        for _ in range(ADMIN_LIST_PAGE_SIZE + 1):
+            self._create_request()
+        response = self.client.get(self.url, {'unfulfilled_page': 2})
+        unfulfilled_page = response.context['unfulfilled_page']
+        self.assertEqual(unfulfilled_page.number, 2)
+        self.assertEqual(unfulfilled_page.paginator.count, ADMIN_LIST_PAGE_SIZE + 2)
+        self.assertEqual(len(response.context['unfulfilled_requests']), 2)
+        self.assertTrue(hasattr(response.context['unfulfilled_requests'][0], 'student_name'))
+
+    def test_admin_request_list_query_count_does_not_depend_on_rows(self):
+        with CaptureQueriesContext(connection) as few_rows:
+            self.client.get(self.url)
+        for _ in range(10):
+            self._create_request()
+            self._create_request(fulfilled=True)
+        with CaptureQueriesContext(connection) as many_rows:
+            self.client.get(self.url)
+        self.assertEqual(len(few_rows), len(many_rows))
@@ -0,0 +1,79 @@
+"""Tests of the propose timetable view."""
+import datetime
+from django.test import TestCase
+from django.urls import reverse
+from lessons.forms import TimetableProposalForm
+from lessons.models import User, Request, DayOfTheWeek, Student, Booking, SchoolTerm
+from lessons.tests.helpers import create_user_groups, create_days_of_the_week, HandleGroups
+
+
+class ProposeTimetableViewTestCase(TestCase):
+    """Tests of the propose timetable view."""
+
+    fixtures = ['lessons/tests/fixtures/default_user.json', 'lessons/tests/fixtures/other_users.json']
+
+    def setUp(self):
+        create_user_groups()
+        create_days_of_the_week()
+        self.url = reverse('propose_timetable_view')
+        self.term = SchoolTerm.objects.create(term_name='Term one', start_date=datetime.date(2030, 1, 2),
+                                              end_date=datetime.date(2030, 3, 29))
+        user = User.objects.get(email='johndoe@email.com')
+        Student.objects.create(user=user)
+        for _ in range(2):
+            request = Request.objects.create(
+                user=user,
+                number_of_lessons=4,
+                relation_id=-1,
+                interval_between_lessons=Request.IntervalBetweenLessons.ONE_WEEK,
+                duration_of_lessons=Request.LessonDuration.SIXTY_MINUTES,
+                further_information='Some information',
+            )
+            request.availability.set([DayOfTheWeek.objects.get(day='Monday')])
+        HandleGroups.set_other_user_to_admin()
+        self.form_input = {
+            'term': self.term.id,
+            'teachers': 'Mr Smith\nMs Jones',
+            'day_start': '09:00',
+            'day_end': '17:00',
+            'hourly_cost': '20.00',
+        }
+
+    def test_propose_timetable_url(self):
+        self.assertEqual(self.url, '/admin_request_list/propose_timetable')
+
+    def test_get_propose_timetable_view(self):
+        self.client.login(email='janedoe@email.com', password='Password123')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'propose_timetable_view.html')
+        self.assertTrue(isinstance(response.context['form'], TimetableProposalForm))
+        self.assertIsNone(response.context['proposal'])
+
+    def test_propose_timetable(self):
+        self.client.login(email='janedoe@email.com', password='Password123')
+        response = self.client.post(self.url, {**self.form_input, 'propose': 'Propose'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['proposal'].bookings), 2)
+        self.assertContains(response, 'Ms Jones')
+        self.assertEqual(Booking.objects.count(), 0)
+
+    def test_propose_timetable_with_invalid_times(self):
+        self.client.login(email='janedoe@email.com', password='Password123')
+        response = self.client.post(self.url, {**self.form_input, 'day_end': '08:00', 'propose': 'Propose'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context['proposal'])
+        self.assertFalse(response.context['form'].is_valid())
+
+    def test_apply_proposed_timetable(self):
+        self.client.login(email='janedoe@email.com', password='Password123')
+        response = self.client.post(self.url, {**self.form_input, 'apply': 'Fulfil proposed requests'}, follow=True)
+        self.assertRedirects(response, reverse('admin_request_list'), status_code=302, target_status_code=200)
+        self.assertEqual(Booking.objects.count(), 2)
+        self.assertFalse(Request.objects.filter(fulfilled=False).exists())
+
+    def test_student_cannot_access_propose_timetable_view(self):
+        HandleGroups.set_default_user_to_student()
+        self.client.login(email='johndoe@email.com', password='Password123')
+        response = self.client.get(self.url, follow=True)
+        self.assertRedirects(response, reverse('student_page'), status_code=302, target_status_code=200)
@@ -2,7 +2,6 @@
 from django.test import TestCase
 from django.urls import reverse
 from lessons.models import SchoolTerm
-from django.db.models.query import QuerySet
 from lessons.tests.helpers import HandleGroups, reverse_with_next
 
 
@@ -33,14 +32,14 @@ class SchoolTermStudentView(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'admin_term_view.html')
         terms = response.context['terms']
-        self.assertTrue(isinstance(terms, QuerySet))
+        self.assertEqual(list(terms), list(SchoolTerm.objects.all()))
 
     def test_school_terms_admin_view_displays_all_terms(self):
         response = self.client.get(self.url)
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'admin_term_view.html')
         terms = response.context['terms']
-        self.assertEqual(terms.all().count(), SchoolTerm.objects.count())
+        self.assertEqual(len(terms), SchoolTerm.objects.count())
 
     def test_student_cannot_access_school_terms_admin_view(self):
         self.client.login(email='johndoe@email.com', password='Password123')
@@ -2,7 +2,6 @@
 from django.test import TestCase
 from django.urls import reverse
 from lessons.models import SchoolTerm
-from django.db.models.query import QuerySet
 from lessons.tests.helpers import HandleGroups, reverse_with_next
 
 
@@ -30,11 +29,11 @@ class SchoolTermStudentView(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'student_term_view.html')
         terms = response.context['terms']
-        self.assertTrue(isinstance(terms, QuerySet))
+        self.assertEqual(list(terms), list(SchoolTerm.objects.all()))
 
     def test_school_terms_student_view_displays_all_terms(self):
         response = self.client.get(self.url)
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'student_term_view.html')
         terms = response.context['terms']
-        self.assertEqual(terms.all().count(), SchoolTerm.objects.count())
+        self.assertEqual(len(terms), SchoolTerm.objects.count())
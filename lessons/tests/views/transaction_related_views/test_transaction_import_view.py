@@ -0,0 +1,56 @@
+"""Tests of the bank statement import view."""
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+from lessons.forms import BankStatementUploadForm
+from lessons.models import BankTransaction, User, Student, Invoice
+from lessons.tests.helpers import create_user_groups, HandleGroups
+
+
+class TransactionImportViewTestCase(TestCase):
+    """Tests of the bank statement import view."""
+
+    fixtures = ['lessons/tests/fixtures/default_user.json', 'lessons/tests/fixtures/other_users.json']
+
+    def setUp(self):
+        create_user_groups()
+        self.url = reverse('transaction_import_view')
+        self.student = Student.objects.create(user=User.objects.get(email='johndoe@email.com'))
+        Invoice.objects.create(invoice_number='0001-001', student=self.student, full_amount='100.00')
+        HandleGroups.set_other_user_to_admin()
+
+    def test_transaction_import_url(self):
+        self.assertEqual(self.url, '/transactions/admin/import')
+
+    def test_get_transaction_import_view(self):
+        self.client.login(email='janedoe@email.com', password='Password123')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'transaction_import_view.html')
+        self.assertTrue(isinstance(response.context['form'], BankStatementUploadForm))
+
+    def test_upload_statement(self):
+        self.client.login(email='janedoe@email.com', password='Password123')
+        statement = SimpleUploadedFile('statement.csv', b'date,amount,reference\n2022-01-10,100.00,0001-001\n'
+                                                        b'2022-01-10,5.00,0009-001\n')
+        response = self.client.post(self.url, {'statement': statement})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(BankTransaction.objects.count(), 1)
+        self.assertTrue(Invoice.objects.get(invoice_number='0001-001').fully_paid)
+        self.assertEqual(response.context['result'].imported, 1)
+        self.assertContains(response, 'Invoice 0009-001 does not exist.')
+
+    def test_upload_statement_that_is_not_utf_8(self):
+        self.client.login(email='janedoe@email.com', password='Password123')
+        statement = SimpleUploadedFile('statement.csv', b'date,amount,reference\n2022-01-10,100.00,0001-001 \xa3\xff\n')
+        response = self.client.post(self.url, {'statement': statement})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('statement', response.context['form'].errors)
+        self.assertIsNone(response.context['result'])
+        self.assertEqual(BankTransaction.objects.count(), 0)
+
+    def test_student_cannot_access_transaction_import_view(self):
+        HandleGroups.set_default_user_to_student()
+        self.client.login(email='johndoe@email.com', password='Password123')
+        response = self.client.get(self.url, follow=True)
+        self.assertRedirects(response, reverse('student_page'), status_code=302, target_status_code=200)
@@ -0,0 +1,212 @@
+import datetime
+from .bulk_fulfilment import fulfil_requests
+from .models import Request, DayOfTheWeek
+from .teacher_schedule import TeacherScheduleIndex, get_teacher_schedule_index, get_last_lesson_date, get_teacher_key
+
+DEFAULT_DAY_START = datetime.time(9, 0)
+DEFAULT_DAY_END = datetime.time(17, 0)
+SLOT_STEP_MINUTES = 15
+# Proposed bookings tried to be moved for each request that could not be placed
+MAX_MOVES_PER_REQUEST = 10
+# Day names in the order of datetime.date.weekday()
+WEEKDAYS = list(DayOfTheWeek.Day.values)
+
+
+class ProposedBooking:
+    '''
+    The day, time, teacher and dates proposed for the lessons of a request
+    '''
+    def __init__(self, request, day, time_of_lesson, teacher, start_date, end_date):
+        self.request = request
+        self.day = day
+        self.time_of_lesson = time_of_lesson
+        self.teacher = teacher
+        self.start_date = start_date
+        self.end_date = end_date
+
+    def as_assignment(self, hourly_cost):
+        '''
+        Returns the proposed booking as an assignment accepted by fulfil_requests
+        '''
+        return {
+            'request_id': str(self.request.id),
+            'day_of_the_week': self.day,
+            'time_of_lesson': self.time_of_lesson.strftime('%H:%M'),
+            'teacher': self.teacher,
+            'start_date': self.start_date.isoformat(),
+            'end_date': self.end_date.isoformat(),
+            'hourly_cost': str(hourly_cost),
+        }
+
+
+class TimetableProposal:
+    def __init__(self, term, bookings, unscheduled):
+        self.term = term
+        self.bookings = bookings
+        # Requests no teacher could be found for at any of their available days and times
+        self.unscheduled = unscheduled
+
+
+def get_first_date_on_day(start_date, day):
+    return start_date + datetime.timedelta(days=(WEEKDAYS.index(day) - start_date.weekday()) % 7)
+
+def get_time_from_minutes(minutes):
+    return datetime.time(minutes // 60, minutes % 60)
+
+
+class TimetableSolver:
+    '''
+    Proposes conflict-free bookings for requests within a term.
+    Requests with the fewest options are placed first, each at the earliest free time of its available days
+    with the least busy teacher. Requests that cannot be placed are then retried by moving a single proposed
+    booking that blocks them to another free slot.
+    '''
+    def __init__(self, teachers, term, day_start=DEFAULT_DAY_START, day_end=DEFAULT_DAY_END, schedule_index=None):
+        self.teachers = list(dict.fromkeys(teacher.strip() for teacher in teachers if teacher.strip()))
+        self.teacher_keys = {teacher: get_teacher_key(teacher) for teacher in self.teachers}
+        self.term = term
+        self.day_start = day_start.hour * 60 + day_start.minute
+        self.day_end = day_end.hour * 60 + day_end.minute
+        self.first_dates = {day: get_first_date_on_day(term.start_date, day) for day in WEEKDAYS}
+        self.existing_schedule = schedule_index if schedule_index is not None else get_teacher_schedule_index()
+        self.proposed_schedule = TeacherScheduleIndex()
+        # Minutes of lessons proposed for each teacher, to spread requests between teachers
+        self.teacher_load = dict.fromkeys(self.teachers, 0)
+        # Request id -> (request, (teacher, day, minute)) of the proposed bookings
+        self.placements = {}
+        # Day -> (duration, interval, last date) of the lessons no free slot was found for since bookings were last moved
+        self.full_days = {}
+
+    def get_days(self, request):
+        '''
+        Returns the available days of a request that fall in the term, with the date of their first and last lesson
+        '''
+        days = []
+        for day in sorted(request.availability.all(), key=lambda day: day.order):
+            start_date = self.first_dates[day.day]
+            if start_date <= self.term.end_date:
+                days.append((day.day, start_date, get_last_lesson_date(
+                    start_date, request.interval_between_lessons, request.number_of_lessons
+                )))
+        return days
+
+    def get_candidates(self, request, day):
+        '''
+        Lazily yields the (teacher, minute) a request could take on a day, earliest first and least busy teacher first
+        '''
+        teachers = sorted(self.teachers, key=lambda teacher: self.teacher_load[teacher])
+        for minute in range(self.day_start, self.day_end - request.duration_of_lessons + 1, SLOT_STEP_MINUTES):
+            for teacher in teachers:
+                yield teacher, minute
+
+    def find_blocking_bookings(self, schedule, request, teacher, day, minute, start_date):
+        return schedule.find_overlapping_bookings((self.teacher_keys[teacher], day), minute,
+                                                  minute + request.duration_of_lessons, start_date,
+                                                  request.interval_between_lessons, request.number_of_lessons)
+
+    def is_free(self, request, teacher, day, minute, start_date):
+        return not (self.find_blocking_bookings(self.existing_schedule, request, teacher, day, minute, start_date)
+                    or self.find_blocking_bookings(self.proposed_schedule, request, teacher, day, minute, start_date))
+
+    def is_known_to_be_full(self, request, day, last_date):
+        '''
+        Returns whether lessons no longer than the request's, on some of the dates of its lessons, already found no
+        free slot on the day, in which case the request cannot find one either.
+        Lessons of a day all start on its first date, so the dates of lessons every interval days up to a last date
+        are among those of the request if their interval is a multiple of the request's and their last date is no later.
+        '''
+        return any(duration <= request.duration_of_lessons and interval % request.interval_between_lessons == 0
+                   and failed_last_date <= last_date
+                   for duration, interval, failed_last_date in self.full_days.get(day, []))
+
+    def place(self, request, teacher, day, minute):
+        self.proposed_schedule.add(-request.id, teacher, day, get_time_from_minutes(minute), request.duration_of_lessons,
+                                   self.first_dates[day], request.interval_between_lessons, request.number_of_lessons)
+        self.teacher_load[teacher] += request.duration_of_lessons * request.number_of_lessons
+        self.placements[request.id] = (request, (teacher, day, minute))
+
+    def unplace(self, request):
+        _, position = self.placements.pop(request.id)
+        self.proposed_schedule.remove(-request.id)
+        self.teacher_load[position[0]] -= request.duration_of_lessons * request.number_of_lessons
+        return position
+
+    def place_greedily(self, request, excluded_position=None):
+        '''
+        Places a request at its first free slot, returns whether a free slot was found
+        '''
+        for day, start_date, last_date in self.get_days(request):
+            if self.is_known_to_be_full(request, day, last_date):
+                continue
+            for teacher, minute in self.get_candidates(request, day):
+                if (teacher, day, minute) != excluded_position \
+                        and self.is_free(request, teacher, day, minute, start_date):
+                    self.place(request, teacher, day, minute)
+                    return True
+            self.full_days.setdefault(day, []).append((request.duration_of_lessons, request.interval_between_lessons,
+                                                       last_date))
+        return False
+
+    def place_by_moving_a_booking(self, request):
+        '''
+        Places a request in a slot taken by a single proposed booking, if that booking can move to another free slot
+        '''
+        moves = 0
+        for day, start_date, _ in self.get_days(request):
+            for teacher, minute in self.get_candidates(request, day):
+                if moves == MAX_MOVES_PER_REQUEST:
+                    return False
+                if self.find_blocking_bookings(self.existing_schedule, request, teacher, day, minute, start_date):
+                    continue
+                blocking_ids = self.find_blocking_bookings(self.proposed_schedule, request, teacher, day, minute,
+                                                           start_date)
+                if len(blocking_ids) != 1:
+                    continue
+
+                moves += 1
+                blocking_request, _ = self.placements[-blocking_ids[0]]
+                blocking_position = self.unplace(blocking_request)
+                self.place(request, teacher, day, minute)
+                # Days found full while trying the move are only full with the request in the blocking booking's slot
+                full_days = {full_day: list(lessons) for full_day, lessons in self.full_days.items()}
+                if self.place_greedily(blocking_request, excluded_position=blocking_position):
+                    # Moving a booking frees its slot, so days found full before may have room again
+                    self.full_days = {}
+                    return True
+                self.unplace(request)
+                self.place(blocking_request, *blocking_position)
+                self.full_days = full_days
+        return False
+
+    def solve(self, requests):
+        requests = sorted(requests, key=lambda request: (
+            len(request.availability.all()), -request.duration_of_lessons, -request.number_of_lessons, request.id
+        ))
+        unscheduled = [request for request in requests if not self.place_greedily(request)]
+        unscheduled = [request for request in unscheduled if not self.place_by_moving_a_booking(request)]
+
+        bookings = [
+            ProposedBooking(request, day, get_time_from_minutes(minute), teacher, self.first_dates[day], self.term.end_date)
+            for request, (teacher, day, minute) in sorted(self.placements.values(), key=lambda placement: placement[0].id)
+        ]
+        return TimetableProposal(self.term, bookings, unscheduled)
+
+
+def get_requests_to_schedule():
+    '''
+    Returns the unfulfilled requests of students, with their available days
+    '''
+    return Request.objects.filter(fulfilled=False, user__user_record__isnull=False).select_related('user') \
+        .prefetch_related('availability').order_by('id')
+
+def propose_timetable(teachers, term, day_start=DEFAULT_DAY_START, day_end=DEFAULT_DAY_END):
+    '''
+    Proposes bookings for all unfulfilled requests in the term, around the existing bookings of the teachers
+    '''
+    return TimetableSolver(teachers, term, day_start, day_end).solve(get_requests_to_schedule())
+
+def apply_timetable_proposal(proposal, hourly_cost):
+    '''
+    Fulfils the requests of a proposal in a single transaction, returns the created bookings
+    '''
+    return fulfil_requests([booking.as_assignment(hourly_cost) for booking in proposal.bookings])
@@ -2,6 +2,13 @@ from django.contrib.auth.base_user import BaseUserManager
 
 class UserManager(BaseUserManager):
     use_in_migrations = True
+
+    def with_groups(self):
+        '''
+        Users with their groups prefetched, so that roles of any number of users are resolved with one group query
+        '''
+        return self.get_queryset().prefetch_related('groups')
+
     def _create_user(self, email, password, **extra_fields):
         '''
         Create and save a user with the given email, and
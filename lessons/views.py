@@ -1,5 +1,6 @@
 from django.shortcuts import render
-from .forms import LogInForm, NewRequestForm, NewChildForm, SignUpForm, PasswordForm, UserForm, CreateUser, TermEditForm
+from .forms import LogInForm, NewRequestForm, NewChildForm, SignUpForm, PasswordForm, UserForm, CreateUser, TermEditForm, \
+    BankStatementUploadForm, TimetableProposalForm, ExportFilterForm
 from django.contrib import messages
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
@@ -7,33 +8,41 @@ from .decorators import login_prohibited, allowed_groups
 from django.contrib.auth.hashers import check_password
 from django.contrib.auth.models import Group
 from .views_functions import *
+from .reference_data import get_school_terms
+from .lesson_timeline import get_lesson_timeline_page, decode_lesson_cursor
+from .statement_import import import_bank_statement, get_statement_format
+from .student_dashboard import get_student_dashboard, invalidate_student_dashboard
+from .timetable_solver import propose_timetable, apply_timetable_proposal, DEFAULT_DAY_START, DEFAULT_DAY_END
+from .exports import EXPORTS, stream_csv
+from .lesson_calendar import read_calendar_token, get_calendar_bookings, get_calendar_etag, \
+    render_lesson_calendar
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, Http404, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+import io
 
 
 @login_required
 @allowed_groups(['Student'])
 def student_page(request):
-    user_requests = get_and_format_requests_for_display(request.user)
-    bookings = get_and_format_bookings_for_display(request.user)
-    invoices = get_invoice_list(request)
-    transactions = get_transaction_list(request)
-    balance = get_student_balance(request)
-    return render(request, 'student_page.html', {'user_requests': user_requests[:5],
-                                                 'invoices': invoices[:5],
-                                                 'transactions': transactions[:5],
-                                                 'bookings': bookings[:5],
-                                                 'balance': balance})
+    dashboard = get_student_dashboard(request.user)
+    return render(request, 'student_page.html', {'user_requests': dashboard.requests,
+                                                 'invoices': dashboard.invoices,
+                                                 'transactions': dashboard.transactions,
+                                                 'bookings': dashboard.bookings,
+                                                 'balance': dashboard.balance})
 
 
 @login_required
 @allowed_groups(['Admin', 'Director'])
 def admin_page(request):
-    transactions = BankTransaction.objects.order_by('-date')
-    requests = get_and_format_requests_for_admin_display()
-    bookings = get_and_format_bookings_for_admin_display()
-    terms = SchoolTerm.objects.all()
+    transactions = BankTransaction.objects.select_related('student__user').order_by('-date')
+    requests = get_and_format_unfulfilled_requests_for_admin_display(count=5)
+    bookings = get_and_format_bookings_for_admin_display(count=5)
+    terms = get_school_terms()
     return render(request, 'admin_page.html', {'transactions': transactions[:5],
-                                               'requests': requests['unfulfilled'][:5],
-                                               'bookings': bookings[:5], 'terms': terms[:5]})
+                                               'requests': requests,
+                                               'bookings': bookings, 'terms': terms[:5]})
 
 
 @login_required
@@ -71,12 +80,14 @@ def request_view(request):
             return redirect_to_request_list(user, relation_id)
 
         elif request.POST.get('update', None) and update_request_object_from_request(request):
+            # Requests are updated in place, so their changes are not signalled
+            invalidate_student_dashboard(user_request.user_id)
             return redirect_to_request_list(user, relation_id)
 
         elif request.POST.get('return', None):
             return redirect_to_request_list(user, relation_id)
 
-    full_name = get_full_name_by_relation_id(user_request.user, relation_id)
+    full_name = get_full_name(get_client(user_request))
     readonly = user.is_admin_or_director() or user_request.fulfilled
 
     form = get_request_view_form(request_id)
@@ -143,7 +154,8 @@ def children_list(request):
 def child_page(request):
     relation_id = get_relation_id_from_request(request)
 
-    if not child_exists(relation_id) or not user_is_parent(request, relation_id):
+    child = get_child_of_user(request.user, relation_id)
+    if child is None:
         return redirect('children_list')
 
     if request.method == 'GET':
@@ -159,7 +171,7 @@ def child_page(request):
         if request.GET.get('return', None):
             return redirect('children_list')
 
-    child = get_child_idname(relation_id)
+    child = get_child_idname(child)
     user_requests = get_and_format_requests_for_display(request.user, relation_id)
     bookings = get_and_format_bookings_for_display(request.user, relation_id)
     balance = get_student_balance(request)
@@ -190,7 +202,8 @@ def new_child_view(request):
 def child_view(request):
     relation_id = get_relation_id_from_request(request)
 
-    if not child_exists(relation_id) or not user_is_parent(request, relation_id):
+    child = get_child_of_user(request.user, relation_id)
+    if child is None:
         return redirect('children_list')
 
     if request.method == 'POST':
@@ -218,10 +231,11 @@ def child_view(request):
 def child_request_list(request):
     relation_id = get_relation_id_from_request(request)
 
-    if not child_exists(relation_id) or not user_is_parent(request, relation_id):
+    child = get_child_of_user(request.user, relation_id)
+    if child is None:
         return redirect('children_list')
 
-    child = get_child_idname(relation_id)
+    child = get_child_idname(child)
     child_requests = get_and_format_requests_for_display(request.user, relation_id)
 
     balance = get_student_balance(request)
@@ -233,10 +247,11 @@ def child_request_list(request):
 def child_booking_list(request):
     relation_id = get_relation_id_from_request(request)
 
-    if not child_exists(relation_id) or not user_is_parent(request, relation_id):
+    child = get_child_of_user(request.user, relation_id)
+    if child is None:
         return redirect('children_list')
 
-    child = get_child_idname(relation_id)
+    child = get_child_idname(child)
     child_bookings = get_booking_objects(request.user, relation_id)
 
     balance = get_student_balance(request)
@@ -246,10 +261,12 @@ def child_booking_list(request):
 @login_required
 @allowed_groups(['Admin', 'Director'])
 def lesson_list_admin(request):
-    bookings = Booking.objects.all()
-    lessons = generate_lessons_from_bookings(bookings)
+    bookings = Booking.objects.select_related('user', 'child')
+    after = decode_lesson_cursor(request.GET.get('after', None))
+    lessons, next_cursor = get_lesson_timeline_page(bookings, after=after)
     lesson_falls_in_holiday = check_if_lessons_not_in_termtime(lessons)
-    return render(request, 'lesson_list.html', {'lessons': lessons, 'lesson_falls_in_holiday': lesson_falls_in_holiday})
+    return render(request, 'lesson_list.html', {'lessons': lessons, 'lesson_falls_in_holiday': lesson_falls_in_holiday,
+                                                'next_cursor': next_cursor})
 
 
 @login_required
@@ -261,7 +278,9 @@ def lesson_list_student(request):
     lessons = generate_lessons_from_bookings(bookings)
     lesson_falls_in_holiday = check_if_lessons_not_in_termtime(lessons)
     balance = get_student_balance(request)
-    return render(request, 'lesson_list.html', {'lessons': lessons, 'lesson_falls_in_holiday': lesson_falls_in_holiday, 'balance': balance})
+    calendar_url = get_calendar_url(request, relation_id)
+    return render(request, 'lesson_list.html', {'lessons': lessons, 'lesson_falls_in_holiday': lesson_falls_in_holiday, 'balance': balance,
+                                                'calendar_url': calendar_url})
 
 
 @login_required
@@ -269,18 +288,46 @@ def lesson_list_student(request):
 def lesson_list_child(request):
     relation_id = get_relation_id_from_request(request)
 
-    if not child_exists(relation_id) or not user_is_parent(request, relation_id):
+    child = get_child_of_user(request.user, relation_id)
+    if child is None:
         return redirect('children_list')
 
-    child = get_child_idname(relation_id)
+    child = get_child_idname(child)
     child_bookings = get_booking_objects(request.user, relation_id)
 
     lessons = generate_lessons_from_bookings(child_bookings)
     lesson_falls_in_holiday = check_if_lessons_not_in_termtime(lessons)
 
     balance = get_student_balance(request)
+    calendar_url = get_calendar_url(request, relation_id)
     return render(request, 'child_lesson_list.html',
-                  {'lessons': lessons, 'child': child, 'lesson_falls_in_holiday': lesson_falls_in_holiday, 'balance': balance})
+                  {'lessons': lessons, 'child': child, 'lesson_falls_in_holiday': lesson_falls_in_holiday, 'balance': balance,
+                   'calendar_url': calendar_url})
+
+
+def lesson_calendar_feed(request, token):
+    '''
+    Serves the lessons of a student or child as an iCalendar feed. Calendar clients cannot log in, so the feed
+    is identified by a signed token, and answered with 304 Not Modified while its bookings and terms are unchanged.
+    '''
+    client = read_calendar_token(token)
+    if client is None:
+        raise Http404('Unknown calendar')
+    user_id, relation_id = client
+
+    bookings = get_calendar_bookings(user_id, relation_id)
+    etag = get_calendar_etag(bookings)
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return response
+
+    student_name = get_full_names_by_relation_ids([(user_id, relation_id)])[(user_id, relation_id)]
+    if student_name is None:
+        raise Http404('Unknown calendar')
+
+    response = HttpResponse(render_lesson_calendar(bookings, student_name), content_type='text/calendar; charset=utf-8')
+    response['ETag'] = etag
+    return response
 
 
 @login_prohibited
@@ -401,11 +448,35 @@ def transaction_admin_view(request):
     return render(request, 'transaction_admin_view.html', {'form': form})
 
 
+@login_required
+@allowed_groups(["Admin", "Director"])
+def transaction_import_view(request):
+    result = None
+    if request.method == 'POST':
+        form = BankStatementUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            statement = form.cleaned_data.get('statement')
+            lines = io.TextIOWrapper(statement.file, encoding='utf-8-sig', newline='')
+            try:
+                result = import_bank_statement(lines, get_statement_format(statement.name))
+            except UnicodeDecodeError:
+                # The statement is decoded while it is parsed, before anything is written
+                form.add_error('statement', 'The bank statement must be a UTF-8 encoded CSV or OFX file.')
+            else:
+                messages.add_message(request, messages.SUCCESS, f"{result.imported} transactions imported!")
+                form = BankStatementUploadForm()
+    else:
+        form = BankStatementUploadForm()
+
+    return render(request, 'transaction_import_view.html', {'form': form, 'result': result})
+
+
 @login_required
 @allowed_groups(["Admin", "Director"])
 def transaction_list_admin(request):
-    transactions = BankTransaction.objects.order_by('-date')
-    return render(request, 'transaction_list.html', {'transactions': transactions})
+    transactions = BankTransaction.objects.select_related('student__user').order_by('-date')
+    return render(request, 'transaction_list.html', {'transactions': transactions, 'export_form': ExportFilterForm(),
+                                                     'export_name': 'transactions'})
 
 
 @login_required
@@ -419,8 +490,9 @@ def transaction_list_student(request):
 @login_required
 @allowed_groups(["Admin", "Director"])
 def invoice_list_admin(request):
-    invoices = Invoice.objects.all().order_by('-invoice_number')
-    return render(request, 'invoice_list.html', {'invoices': invoices})
+    invoices = Invoice.objects.select_related('student__user').order_by('-invoice_number')
+    return render(request, 'invoice_list.html', {'invoices': invoices, 'export_form': ExportFilterForm(),
+                                                 'export_name': 'invoices'})
 
 
 @login_required
@@ -434,24 +506,84 @@ def invoice_list_student(request):
 @login_required
 @allowed_groups(["Admin", "Director"])
 def balance_list_admin(request):
-    students = Student.objects.all()
+    students = Student.objects.select_related('user', 'ledger').order_by('-ledger__outstanding', 'id')
     return render(request, 'balance_list.html', {'students': students})
 
 
 @login_required
 @allowed_groups(["Admin", "Director"])
 def admin_booking_list(request):
-    bookings = get_and_format_bookings_for_admin_display()
-    return render(request, 'admin_booking_list.html', {'bookings': bookings})
+    filter_form = get_booking_filter_form(request)
+    bookings = filter_bookings_for_admin_display(filter_form.cleaned_data)
+    bookings_page = get_formatted_page(bookings, request.GET.get('page'), format_bookings_for_display)
+
+    return render(request, 'admin_booking_list.html', {'bookings': bookings_page.object_list,
+                                                       'bookings_page': bookings_page,
+                                                       'filter_form': filter_form,
+                                                       'query_string': get_query_string_without(request, 'page'),
+                                                       'export_form': ExportFilterForm(), 'export_name': 'bookings'})
+
+
+@login_required
+@allowed_groups(["Admin", "Director"])
+def export_csv(request, export_name):
+    '''
+    Streams a table as a CSV file, row by row, so that exports of any size use constant memory
+    '''
+    export = EXPORTS.get(export_name)
+    if export is None:
+        raise Http404('Unknown export')
+
+    filter_form = get_export_filter_form(request)
+    rows = export.get_rows(filter_form.cleaned_data.get('date_from'), filter_form.cleaned_data.get('date_to'))
+    response = StreamingHttpResponse(stream_csv(export.header, rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{export_name}.csv"'
+    return response
 
 
 @login_required
 @allowed_groups(["Admin", "Director"])
 def admin_request_list(request):
-    requests = get_and_format_requests_for_admin_display()
+    filter_form = get_request_filter_form(request)
+    requests = filter_requests_for_admin_display(filter_form.cleaned_data)
+    fulfilled_page = get_formatted_page(requests.filter(fulfilled=True), request.GET.get('fulfilled_page'),
+                                        format_requests_for_display)
+    unfulfilled_page = get_formatted_page(requests.filter(fulfilled=False), request.GET.get('unfulfilled_page'),
+                                          format_requests_for_display)
+
+    return render(request, 'admin_request_list.html', {'fulfilled_requests': fulfilled_page.object_list,
+                                                       'unfulfilled_requests': unfulfilled_page.object_list,
+                                                       'fulfilled_page': fulfilled_page,
+                                                       'unfulfilled_page': unfulfilled_page,
+                                                       'filter_form': filter_form,
+                                                       'fulfilled_query_string': get_query_string_without(request, 'fulfilled_page'),
+                                                       'unfulfilled_query_string': get_query_string_without(request, 'unfulfilled_page')})
+
+
+@login_required
+@allowed_groups(["Admin", "Director"])
+def propose_timetable_view(request):
+    proposal = None
+    if request.method == 'POST':
+        form = TimetableProposalForm(request.POST)
+        if form.is_valid():
+            proposal = propose_timetable(form.cleaned_data.get('teachers'), form.cleaned_data.get('term'),
+                                         form.cleaned_data.get('day_start'), form.cleaned_data.get('day_end'))
+            if request.POST.get('apply', None):
+                try:
+                    bookings = apply_timetable_proposal(proposal, form.cleaned_data.get('hourly_cost'))
+                except ValidationError as error:
+                    for assignment, assignment_messages in error.message_dict.items():
+                        for message in assignment_messages:
+                            messages.add_message(request, messages.ERROR, f'{assignment}: {message}')
+                else:
+                    messages.add_message(request, messages.SUCCESS, f"{len(bookings)} requests fulfilled!")
+                    return redirect('admin_request_list')
+    else:
+        form = TimetableProposalForm(initial={'term': get_upcoming_term(), 'day_start': DEFAULT_DAY_START,
+                                              'day_end': DEFAULT_DAY_END})
 
-    return render(request, 'admin_request_list.html', {'fulfilled_requests': requests['fulfilled'],
-                                                       'unfulfilled_requests': requests['unfulfilled']})
+    return render(request, 'propose_timetable_view.html', {'form': form, 'proposal': proposal})
 
 
 @login_required
@@ -502,7 +634,7 @@ def booking_view(request):
         elif request.POST.get('return', None):
             return redirect_with_queries(redirect_page, relation_id=relation_id)
 
-    full_name = get_full_name_by_relation_id(booking.user, relation_id)
+    full_name = get_full_name(get_client(booking))
     readonly = not user.is_admin_or_director()
 
     form = get_booking_form(booking_id)
@@ -518,7 +650,7 @@ def booking_view(request):
 @login_required
 @allowed_groups(["Student"])
 def student_term_view(request):
-    terms = SchoolTerm.objects.all()
+    terms = get_school_terms()
     balance = get_student_balance(request)
     return render(request, 'student_term_view.html', {'terms': terms, 'balance':balance})
 
@@ -527,7 +659,7 @@ def student_term_view(request):
 @login_required
 @allowed_groups(["Admin", "Director"])
 def admin_term_view(request):
-    terms = SchoolTerm.objects.all()
+    terms = get_school_terms()
     return render(request, 'admin_term_view.html', {'terms': terms})
 
 
@@ -621,7 +753,7 @@ def admin_user_list(request):
         elif request.POST.get('create_administrator') == '':
             return redirect("create_admin_user")
 
-    users = User.objects.order_by("groups")
+    users = User.objects.with_groups().order_by("groups")
     user_to_display = []
     for user in users:
         if user.is_admin_or_director():
@@ -1,15 +1,25 @@
 import decimal
 import urllib
 from django.utils import timezone
-from .models import User, Request, Invoice, Student, Child, Booking, DayOfTheWeek, SchoolTerm, BankTransaction
-from .forms import RequestEditForm, FulfilRequestForm, BookingEditForm, ChildEditForm, TransactionSubmitForm, InvoiceEditForm
+from .models import User, Request, Invoice, Student, Child, Booking, DayOfTheWeek, SchoolTerm, BankTransaction, \
+    StudentLedger
+from .forms import RequestEditForm, FulfilRequestForm, BookingEditForm, ChildEditForm, TransactionSubmitForm, InvoiceEditForm, \
+    RequestFilterForm, BookingFilterForm, ExportFilterForm
 from .utils import *
+from .term_index import get_term_index
+from .lesson_calendar import get_calendar_token
 from django.core.exceptions import ObjectDoesNotExist
+from django.core.paginator import Paginator
+from django.db.models import Q, F, Sum
+from django.db import transaction
 from django.conf import settings
 from django.contrib.auth import authenticate
 from django.shortcuts import redirect
+from django.urls import reverse
 import datetime
 
+ADMIN_LIST_PAGE_SIZE = 25
+
 def redirect_with_queries(url, **queries):
     '''
     A regular html redirect but with optional added queries
@@ -44,9 +54,7 @@ def get_invoice_object(invoice_id):
     '''
     Get the invoice with the given id
     '''
-    if Invoice.objects.filter(invoice_number=invoice_id).exists():
-        return Invoice.objects.get(invoice_number=invoice_id)
-    return None
+    return Invoice.objects.select_related('student__user').filter(invoice_number=invoice_id).first()
 
 def get_invoice_object_from_request(request):
     '''
@@ -59,7 +67,7 @@ def get_request_object(request_id):
     Get the request with the given id
     '''
     if Request.objects.filter(id=request_id).exists:
-        return Request.objects.get(id=request_id)
+        return Request.objects.select_related('user', 'child').get(id=request_id)
     return None
 
 def get_booking_object(booking_id):
@@ -67,16 +75,20 @@ def get_booking_object(booking_id):
     Get the booking with the given id
     '''
     if Booking.objects.filter(id=booking_id).exists:
-        return Booking.objects.get(id=booking_id)
+        return Booking.objects.select_related('user', 'child').get(id=booking_id)
     return None
 
 def get_child_object(relation_id):
     '''
-    Get the child with the given id
+    Get the child with the given id, or None if there is no such child
     '''
-    if Child.objects.filter(id=relation_id).exists:
-        return Child.objects.get(id=relation_id)
-    return None
+    return Child.objects.filter(id=relation_id).first()
+
+def get_child_of_user(user, relation_id):
+    '''
+    Get the child with the given id if the user is their parent, otherwise None, in a single query
+    '''
+    return Child.objects.filter(id=relation_id, parent=user).first()
     
 def get_student_balance(request):
     '''
@@ -154,7 +166,7 @@ def get_request_objects(user, relation_id = -1):
     '''
     Get all requests associated with a user or child ordered by descending date
     '''
-    return Request.objects.filter(user=user, relation_id=relation_id).order_by('-date')
+    return Request.objects.filter(user=user, relation_id=relation_id).select_related('user', 'child').order_by('-date')
 
 def delete_request_object_from_request(request):
     '''
@@ -178,7 +190,8 @@ def get_booking_objects(user, relation_id = -1):
     '''
     Get an ordered list of bookings, ordered by ascending start date
     '''
-    return Booking.objects.filter(user=user, relation_id=relation_id).order_by('-start_date')
+    return Booking.objects.filter(user=user, relation_id=relation_id).select_related('day_of_the_week', 'user', 'child') \
+        .order_by('-start_date')
 
 def get_full_name(student):
     '''
@@ -197,11 +210,58 @@ def get_full_name_by_relation_id(user, relation_id):
     else:
         return get_full_name(user)
 
-def get_child_idname(relation_id):
+def get_full_names_by_relation_ids(user_relation_ids):
+    '''
+    Get the full names of the clients with the given (user id, relation id) pairs,
+    using at most one query for children and one query for users
+    '''
+    user_relation_ids = {(int(user_id), int(relation_id)) for user_id, relation_id in user_relation_ids}
+    child_ids = {relation_id for user_id, relation_id in user_relation_ids if is_child(relation_id)}
+    user_ids = {user_id for user_id, relation_id in user_relation_ids if not is_child(relation_id)}
+
+    children = {}
+    if child_ids:
+        children = Child.objects.only('first_name', 'last_name').in_bulk(child_ids)
+    users = {}
+    if user_ids:
+        users = User.objects.only('first_name', 'last_name').in_bulk(user_ids)
+
+    full_names = {}
+    for user_id, relation_id in user_relation_ids:
+        if is_child(relation_id):
+            full_names[(user_id, relation_id)] = get_full_name(children.get(relation_id))
+        else:
+            full_names[(user_id, relation_id)] = get_full_name(users.get(user_id))
+    return full_names
+
+def get_client(obj):
+    '''
+    Get the client of a request or booking, the child it is for or otherwise its user
+    '''
+    return obj.child if obj.child_id else obj.user
+
+def get_full_names_for_clients(objects):
+    '''
+    Get the full names of the clients of a list of requests or bookings, keyed by (user id, relation id).
+    Clients fetched along with the objects by select_related('user', 'child') are read from the join,
+    and the others are queried in one batch.
+    '''
+    full_names = {}
+    unresolved = []
+    for obj in objects:
+        key = (obj.user_id, int(obj.relation_id))
+        client_field = obj._meta.get_field('child' if is_child(obj.relation_id) else 'user')
+        if client_field.is_cached(obj) and (obj.child_id is not None or not is_child(obj.relation_id)):
+            full_names[key] = get_full_name(get_client(obj))
+        else:
+            unresolved.append(key)
+    full_names.update(get_full_names_by_relation_ids(unresolved))
+    return full_names
+
+def get_child_idname(child):
     '''
     Return a pair of id and the full name of a child
     '''
-    child = get_child_object(relation_id)
     if child:
         return {'id':child.id, 'name':get_full_name(child)}
 
@@ -215,25 +275,21 @@ def get_children_idname(user):
     '''
     Returns a collection of id and child pairs
     '''
-    children = get_children(user)
-    children_idname = []
-    for child in children:
-        children_idname.append(get_child_idname(child.id))
-    return children_idname
+    return [get_child_idname(child) for child in get_children(user)]
 
 def delete_child(user, relation_id):
     '''
-    Delete a child and all bookings associated with the child
+    Delete a child, and with it all requests and bookings of the child. Nothing is deleted if the user is not the
+    parent of the child.
     '''
-    get_request_objects(user, relation_id).delete()
+    child = get_child_of_user(user, relation_id)
+    if child is None:
+        return None
 
-    #Delete and refund all bookings associated with a child
-    bookings = get_booking_objects(user, relation_id)
-    for booking in bookings:
-        refund_booking_if_valid(booking)
-    bookings.delete()
-        
-    return get_child_object(relation_id).delete()
+    #Refund all bookings of the child, which are then deleted along with the child
+    with transaction.atomic():
+        refund_bookings(child.booking_set.all())
+        return child.delete()
 
 def update_child_object_from_request(request):
     '''
@@ -246,10 +302,14 @@ def update_child_object_from_request(request):
     if form.is_valid():
         return form.save()
 
-def format_request_for_display(request: Request):
+def format_request_for_display(request: Request, student_names=None):
     '''
-    Format a booking so that they can be displayed in a html table
+    Format a request so that they can be displayed in a html table.
+    Student names are looked up in student_names if given, otherwise they are queried.
     '''
+    if student_names is None:
+        student_names = get_full_names_for_clients([request])
+
     request.interval_between_lessons = Request.IntervalBetweenLessons.choices[
         Request.IntervalBetweenLessons.values.index(request.interval_between_lessons)
     ][1]
@@ -257,96 +317,192 @@ def format_request_for_display(request: Request):
         request.LessonDuration.values.index(request.duration_of_lessons)
     ][1]
     request.date = request.date.date()
-    request.student_name = get_full_name_by_relation_id(request.user, request.relation_id)
+    request.student_name = student_names[(request.user_id, int(request.relation_id))]
     
     return request
 
+def format_requests_for_display(requests):
+    '''
+    Format a list of requests so that they can be displayed in a html table, resolving all student names at once
+    '''
+    requests = list(requests)
+    student_names = get_full_names_for_clients(requests)
+    return [format_request_for_display(request, student_names) for request in requests]
+
 def get_and_format_requests_for_display(user, relation_id=-1):
     '''
     Return a dictionary of all requests for a user that have been formatted
     '''
-    requests = get_request_objects(user, relation_id)
-    formatted_requests = []
-    
-    for request in requests:
-        formatted_requests.append(format_request_for_display(request))
-    
-    return formatted_requests
+    return format_requests_for_display(get_request_objects(user, relation_id))
 
-def get_and_format_requests_for_admin_display():
+def get_and_format_unfulfilled_requests_for_admin_display(count=None):
     '''
-    Return a dictionary of all fulfilled and unfulfilled requests that have been formatted
+    Return a list of the most recent unfulfilled requests that have been formatted
     '''
-    requests = Request.objects.all().order_by("-date")
-    formatted_request_set = {'fulfilled': [], 'unfulfilled': []}
-    
-    for request in requests:
-        request = format_request_for_display(request)
-        
-        if request.fulfilled:
-            formatted_request_set['fulfilled'].append(request)
-        else:
-            formatted_request_set['unfulfilled'].append(request)
-            
-    return formatted_request_set
+    requests = Request.objects.filter(fulfilled=False).select_related('user', 'child').order_by("-date")[:count]
+    return format_requests_for_display(requests)
+
+def get_query_string_without(request, *keys):
+    '''
+    Returns the query string of a request with the given parameters removed
+    '''
+    queries = request.GET.copy()
+    for key in keys:
+        queries.pop(key, None)
+    return queries.urlencode()
+
+def get_start_of_day(date):
+    '''
+    Returns the aware datetime at the start of a given date
+    '''
+    return timezone.make_aware(datetime.datetime.combine(date, datetime.time.min))
+
+def filter_by_student(queryset, student):
+    '''
+    Filters requests or bookings by the name or email of the user that made them, or the name of their child
+    '''
+    return queryset.filter(
+        Q(user__email__icontains=student) |
+        Q(user__first_name__icontains=student) |
+        Q(user__last_name__icontains=student) |
+        Q(child__first_name__icontains=student) |
+        Q(child__last_name__icontains=student)
+    )
+
+def filter_requests_for_admin_display(filters):
+    '''
+    Return the requests matching cleaned request filter form data, ordered by descending date
+    '''
+    requests = Request.objects.select_related('user', 'child').order_by("-date")
+
+    if filters.get('fulfilled') == 'true':
+        requests = requests.filter(fulfilled=True)
+    elif filters.get('fulfilled') == 'false':
+        requests = requests.filter(fulfilled=False)
+
+    if filters.get('date_from'):
+        requests = requests.filter(date__gte=get_start_of_day(filters['date_from']))
+    if filters.get('date_to'):
+        requests = requests.filter(date__lt=get_start_of_day(filters['date_to'] + datetime.timedelta(days=1)))
+    if filters.get('student'):
+        requests = filter_by_student(requests, filters['student'])
 
-def format_booking_for_display(booking: Booking):
+    return requests
+
+def filter_bookings_for_admin_display(filters):
+    '''
+    Return the bookings matching cleaned booking filter form data, ordered by descending start date
     '''
-    Format a booking so that they can be displayed in a html table
+    bookings = Booking.objects.select_related('day_of_the_week', 'user', 'child').order_by("-start_date")
+
+    if filters.get('date_from'):
+        bookings = bookings.filter(start_date__gte=filters['date_from'])
+    if filters.get('date_to'):
+        bookings = bookings.filter(start_date__lte=filters['date_to'])
+    if filters.get('student'):
+        bookings = filter_by_student(bookings, filters['student'])
+    if filters.get('teacher'):
+        bookings = bookings.filter(teacher__icontains=filters['teacher'])
+
+    return bookings
+
+def get_request_filter_form(request):
+    '''
+    Generates the bound form used to filter requests on admin pages
+    '''
+    form = RequestFilterForm(data=request.GET)
+    form.is_valid()
+    return form
+
+def get_booking_filter_form(request):
     '''
+    Generates the bound form used to filter bookings on admin pages
+    '''
+    form = BookingFilterForm(data=request.GET)
+    form.is_valid()
+    return form
+
+def get_export_filter_form(request):
+    '''
+    Generates the bound form used to filter the rows of an export by date
+    '''
+    form = ExportFilterForm(data=request.GET)
+    form.is_valid()
+    return form
+
+def get_formatted_page(queryset, page_number, format_function, page_size=ADMIN_LIST_PAGE_SIZE):
+    '''
+    Slices a page out of a queryset in the database and formats only the objects of that page
+    '''
+    page = Paginator(queryset, page_size).get_page(page_number)
+    page.object_list = format_function(page.object_list)
+    return page
+
+def format_booking_for_display(booking: Booking, student_names=None):
+    '''
+    Format a booking so that they can be displayed in a html table.
+    Student names are looked up in student_names if given, otherwise they are queried.
+    '''
+    if student_names is None:
+        student_names = get_full_names_for_clients([booking])
+
     booking.interval_between_lessons = Booking.IntervalBetweenLessons.choices[
         Booking.IntervalBetweenLessons.values.index(booking.interval_between_lessons)
     ][1]
     booking.duration_of_lessons = Booking.LessonDuration.choices[
         Booking.LessonDuration.values.index(booking.duration_of_lessons)
     ][1]
-    booking.student_name = get_full_name_by_relation_id(booking.user, booking.relation_id)
+    booking.student_name = student_names[(booking.user_id, int(booking.relation_id))]
     
     return booking
 
+def format_bookings_for_display(bookings):
+    '''
+    Format a list of bookings so that they can be displayed in a html table, resolving all student names at once
+    '''
+    bookings = list(bookings)
+    student_names = get_full_names_for_clients(bookings)
+    return [format_booking_for_display(booking, student_names) for booking in bookings]
+
 def get_and_format_bookings_for_display(user, relation_id=-1):
     '''
     Return a list of bookings for a user that have been formatted to display in a table
     '''
+    return format_bookings_for_display(get_booking_objects(user, relation_id))
 
-    bookings = get_booking_objects(user, relation_id)
-    formatted_bookings = []
-    
-    for booking in bookings:
-        formatted_bookings.append(format_booking_for_display(booking))
-    
-    return formatted_bookings
-
-def get_and_format_bookings_for_admin_display():
+def get_and_format_bookings_for_admin_display(count=None):
     '''
-    Return a list of all bookings that have been formatted to display in a table
+    Return a list of the bookings with the latest start dates that have been formatted to display in a table
     '''
-    bookings = Booking.objects.all().order_by("-start_date")
-    formatted_bookings = []
+    return format_bookings_for_display(Booking.objects.select_related('day_of_the_week', 'user', 'child').order_by("-start_date")[:count])
 
-    for booking in bookings:
-        formatted_bookings.append(format_booking_for_display(booking))
-    
-    return formatted_bookings
 
+def refund_bookings(bookings):
+    '''
+    Refunds what was paid for the bookings that have not started yet to the balance of their students, with one
+    aggregate query for the refunds, one update of their invoices, one update of their ledgers and one update of each
+    student
+    '''
+    #If booking date has passed, no refund is possible
+    refundable_invoices = Invoice.objects.filter(booking__in=bookings.filter(start_date__gt=timezone.now().date()))
+
+    with transaction.atomic():
+        refunds = {totals['student_id']: totals for totals in refundable_invoices.order_by().values('student_id')
+                   .annotate(invoiced=Sum('full_amount'), paid=Sum('paid_amount'))}
+        refundable_invoices.update(paid_amount=0, full_amount=0, fully_paid=True)
+        # The invoices are updated in place, so their changes are not signalled
+        StudentLedger.add_to_totals({student_id: (-totals['invoiced'], -totals['paid'])
+                                     for student_id, totals in refunds.items()})
+        for student in Student.objects.filter(id__in=refunds):
+            student.balance = F('balance') + refunds[student.id]['paid']
+            # Saving the student rather than updating it refreshes their ledger balance and dashboard
+            student.save(update_fields=['balance'])
 
 def refund_booking_if_valid(booking: Booking):
     '''
     Refunds the user if a booking is deleted
     '''
-    #If booking date has passed, no refund is possible
-    if booking.start_date <= timezone.now().date():
-        return
-
-    invoice = get_invoice_object(booking.invoice_id)
-    student = Student.objects.get(user=booking.user)
-    paid_amount = invoice.paid_amount
-    student.balance += paid_amount
-    invoice.paid_amount = 0
-    invoice.full_amount = 0
-    invoice.fully_paid = True
-    invoice.save()
-    student.save()
+    refund_bookings(Booking.objects.filter(id=booking.id))
 
 def update_booking(request):
     '''
@@ -370,8 +526,9 @@ def delete_booking(request):
     Delete a given booking
     '''
     booking = get_booking_object_from_request(request)
-    refund_booking_if_valid(booking)
-    return booking.delete()
+    with transaction.atomic():
+        refund_booking_if_valid(booking)
+        return booking.delete()
 
 def get_booking_form(booking_id):
     '''
@@ -462,15 +619,14 @@ def get_upcoming_term():
     '''
     Gets the upcoming term from today
     '''
-    return SchoolTerm.objects.all().filter(end_date__gt=datetime.date.today()) \
-        .filter(start_date__gte=datetime.date.today()).order_by('start_date').first()
+    return get_term_index().find_next_term(datetime.date.today())
 
 
 def find_term_from_date_allow_none(date):
     '''
     Finds term associated with date, but allows a None return when no term can be associated with the day.
     '''
-    return SchoolTerm.objects.all().filter(end_date__gte=date).filter(start_date__lte=date).first()
+    return get_term_index().find_term(date)
 
 def get_fulfil_request_form(request):
     '''
@@ -540,7 +696,7 @@ def get_invoice_list(request):
     try:
         r_user = request.user
         r_student = Student.objects.get(user=r_user)
-        invoices = Invoice.objects.all().filter(student=r_student).order_by('-invoice_number')
+        invoices = Invoice.objects.select_related('student__user').filter(student=r_student).order_by('-invoice_number')
         return invoices
     except ObjectDoesNotExist:
         return Invoice.objects.none()
@@ -553,7 +709,7 @@ def get_transaction_list(request):
     try:
         r_user = request.user
         r_student = Student.objects.get(user=r_user)
-        transactions = BankTransaction.objects.order_by('-date').filter(student=r_student)
+        transactions = BankTransaction.objects.select_related('student__user').order_by('-date').filter(student=r_student)
         return transactions
     except ObjectDoesNotExist:
         return BankTransaction.objects.none()
@@ -578,49 +734,70 @@ def redirect_to_request_list(user, relation_id):
     else:
         return redirect('request_list')
 
+def get_first_future_lesson_index(booking, now):
+    '''
+    Computes the index of the first lesson of a booking that is not in the past, without iterating over past lessons
+    '''
+    first_lesson_datetime = datetime.datetime.combine(booking.start_date, booking.time_of_the_day)
+    if first_lesson_datetime >= now:
+        return 0
+
+    interval = datetime.timedelta(days=booking.interval_between_lessons)
+    # Ceiling division: number of whole intervals needed to reach now
+    return min(-((first_lesson_datetime - now) // interval), booking.number_of_lessons)
+
+def get_future_lesson_datetimes(booking, now):
+    '''
+    Computes the datetimes of all lessons of a booking that are not in the past
+    '''
+    first_lesson_datetime = datetime.datetime.combine(booking.start_date, booking.time_of_the_day)
+    interval = datetime.timedelta(days=booking.interval_between_lessons)
+    first_index = get_first_future_lesson_index(booking, now)
+
+    return [first_lesson_datetime + interval * offset for offset in range(first_index, booking.number_of_lessons)]
+
 def generate_lessons_from_bookings(bookings):
     '''
     Dynamically generates lessons from a list of bookings
     '''
+    now = datetime.datetime.today()
     lesson_list = []
 
-    for booking in bookings:
-        term = booking.term_id
-        date = booking.start_date
-        lesson_datetime = datetime.datetime.combine(date, booking.time_of_the_day)
-        duration = Booking.LessonDuration.choices[
-                Booking.LessonDuration.values.index(booking.duration_of_lessons)
-            ]
-
-        for lesson_num in range(booking.number_of_lessons):
-            #Lessons in past are not generated
-            if lesson_datetime >= datetime.datetime.today():
-                lesson = Lesson(
-                    booking,
-                    lesson_datetime,
-                    get_full_name_by_relation_id(booking.user, booking.relation_id),
-                    booking.teacher,
-                    str(booking.duration_of_lessons) + " mins",
-                    booking.further_information
-                )
-
-                lesson_list.append(lesson)
-
-            lesson_datetime += datetime.timedelta(days=booking.interval_between_lessons)
+    booking_lesson_datetimes = [(booking, get_future_lesson_datetimes(booking, now)) for booking in bookings]
+    student_names = get_full_names_for_clients(
+        booking for booking, lesson_datetimes in booking_lesson_datetimes if lesson_datetimes
+    )
+
+    for booking, lesson_datetimes in booking_lesson_datetimes:
+        if not lesson_datetimes:
+            continue
+
+        #Lesson details are shared by every lesson of a booking, so they are resolved once
+        student_name = student_names[(booking.user_id, int(booking.relation_id))]
+        duration = str(booking.duration_of_lessons) + " mins"
+
+        lesson_list.extend(
+            Lesson(booking, lesson_datetime, student_name, booking.teacher, duration, booking.further_information)
+            for lesson_datetime in lesson_datetimes
+        )
 
     lesson_list.sort(key=lambda x: x.date_time, reverse = True)
 
     return lesson_list
 
+def get_calendar_url(request, relation_id):
+    '''
+    Returns the absolute URL of the calendar feed of the lessons of the user or child
+    '''
+    token = get_calendar_token(request.user.id, relation_id)
+    return request.build_absolute_uri(reverse('lesson_calendar_feed', kwargs={'token': token}))
+
 def check_if_lessons_not_in_termtime(lessons):
     '''
     Check if a list of lessons all fall within term time
     '''
-    for lesson in lessons:
-        if find_term_from_date_allow_none(lesson.date_time) == None:
-            return True
-
-    return False
+    lesson_terms = get_term_index().classify_dates(lesson.date_time for lesson in lessons)
+    return None in lesson_terms
 
 def user_authorised_to_see_invoice(request, invoice_id):
     '''
@@ -632,16 +809,3 @@ def user_authorised_to_see_invoice(request, invoice_id):
     student_object = get_student(request)
 
     return invoice_object.student == student_object
-
-def child_exists(relation_id):
-    '''
-    Checks if a child with given relation id exists
-    '''
-    return Child.objects.filter(id=relation_id).exists()
-
-def user_is_parent(request, relation_id):
-    '''
-    Checks if the user sending the request is the parent of the given relation id
-    '''
-    child = get_child_object(relation_id)
-    return request.user == child.parent
\ No newline at end of file
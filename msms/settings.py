@@ -45,12 +45,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'lessons.query_budgets.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'lessons.request_profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'msms.urls'
@@ -143,3 +145,43 @@ MESSAGE_TAGS={
 
 # User model for authentication.
 AUTH_USER_MODEL = 'lessons.User'
+
+# Seconds to cache each student's dashboard for, 0 disables the cache
+STUDENT_DASHBOARD_CACHE_TIMEOUT = 0
+
+# Rendered menus and term tables are cached in files shared by every process on the server, so that a change of
+# the terms invalidates them for all of them. The 'fragments' cache keeps them in the memory of each process
+# instead, which is only safe with a single process.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragments',
+    },
+    'fragments_file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'fragment_cache',
+    },
+}
+FRAGMENT_CACHE_ALIAS = 'fragments_file'
+
+# Seconds to cache the school terms and days of the week for. The default cache is kept in the memory of each
+# process, so a change made by another process is only seen once they expire. With a cache shared by every process,
+# changes are seen straight away.
+REFERENCE_DATA_TIMEOUT = 60
+
+# Seconds to cache the rendered fragments of templates for, 0 disables the cache
+FRAGMENT_CACHE_TIMEOUT = 0
+
+# Check the number of queries of every page against its budget in lessons/query_budgets.py. Recording the queries
+# of every request has a cost, so it is only done during development by default.
+QUERY_BUDGETS_ENABLED = DEBUG
+# Raise an error when a page runs more queries than its budget, instead of logging it
+QUERY_BUDGETS_RAISE = DEBUG
+
+# Share of requests to profile, 0 to only profile those of admins and directors asking for it with ?profile=1
+# or the X-Profile header. Each profile is written to the output directory as a collapsed stack file.
+PROFILING_SAMPLE_RATE = 0
+PROFILING_OUTPUT_DIR = BASE_DIR / 'profiles'
@@ -37,11 +37,13 @@ urlpatterns = [
     path('lessons/admin', views.lesson_list_admin, name='lesson_list_admin'),
     path('lessons/student', views.lesson_list_student, name='lesson_list_student'),
     path('lessons/child', views.lesson_list_child, name='lesson_list_child'),
+    path('lessons/calendar/<str:token>.ics', views.lesson_calendar_feed, name='lesson_calendar_feed'),
     path('log_in/', views.log_in, name='log_in'),
     path('sign_up/', views.sign_up, name='sign_up'),
     path('test_view/', views.test_redirect_view, name='redirect'),
     path('transactions/admin', views.transaction_admin_view, name='transaction_admin_view'),
     path('transactions/admin/submit', views.transaction_admin_view, name='transaction_admin_view'),
+    path('transactions/admin/import', views.transaction_import_view, name='transaction_import_view'),
     path('transactions/admin/view', views.transaction_list_admin, name='transaction_list_admin'),
     path('transactions/student', views.transaction_list_student, name='transaction_list_student'),
     path('balance/admin', views.balance_list_admin, name='balance_list_admin'),
@@ -50,7 +52,9 @@ urlpatterns = [
     path('invoice/view', views.invoice_view, name='invoice_view'),
     path('admin_request_list/', views.admin_request_list, name='admin_request_list'),
     path('admin_booking_list/', views.admin_booking_list, name='admin_booking_list'),
+    path('exports/<str:export_name>.csv', views.export_csv, name='export_csv'),
     path('fulfil_request/', views.fulfil_request_view, name='fulfil_request'),
+    path('admin_request_list/propose_timetable', views.propose_timetable_view, name='propose_timetable_view'),
     path('profile/', views.profile, name='profile'),
     path('student_page/terms', views.student_term_view, name='student_term_view'),
     path('admin_term_view', views.admin_term_view, name='admin_term_view'),